@@ -0,0 +1,82 @@
+"""
+Benchmarks for django-rdf at scale.
+
+A benchmark run installs the core ontologies (timing syncvb), creates a synthetic 
+ontology and fills it with generated data (timing the ingest rate), runs a fixed 
+workload of query compilations and executions, and finally deletes the synthetic 
+ontology and data again. The results are returned as a dict, which the rdfbench 
+management command writes out as JSON, so that runs can be compared between 
+releases. 
+
+Benchmarks write to the configured database. Run them against a scratch 
+database, not a production one. 
+"""
+
+import platform, time
+
+from django.conf import settings
+from django.core.management import call_command
+
+from rdf.benchmark import data, workload
+
+
+def run(concepts=20, predicates=40, depth=3, resources=10000, statements=100000, 
+    rows=100000, repeat=20, seed=0):
+    """
+    Runs the benchmarks with the given parameters, and returns the results. 
+    """
+    parameters = dict(concepts=concepts, predicates=predicates, depth=depth, 
+        resources=resources, statements=statements, rows=rows, repeat=repeat, 
+        seed=seed)
+    results = {}
+    
+    started = time.time()
+    call_command('syncvb', verbosity=0)
+    results['syncvb'] = dict(seconds=time.time() - started)
+    
+    started = time.time()
+    o = data.ontology(concepts, predicates, depth)
+    results['ontology'] = dict(seconds=time.time() - started)
+    try:
+        for name, n, seconds in data.populate(o, resources, statements, rows, seed):
+            results['ingest.%s' % name] = dict(rows=n, seconds=seconds, 
+                per_second=n / seconds if seconds else None)
+        results.update(workload.run(o, repeat))
+    finally:
+        data.cleanup(o)
+    return dict(
+        parameters=parameters, 
+        environment=dict(
+            engine=settings.DATABASE_ENGINE, 
+            python=platform.python_version(), 
+            time=time.strftime('%Y-%m-%dT%H:%M:%S')), 
+        results=results)
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
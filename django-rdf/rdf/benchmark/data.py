@@ -0,0 +1,208 @@
+"""
+Synthetic ontology and data for the benchmarks.
+
+The ontology lives in its own namespace, and consists of a number of concepts 
+arranged in inheritance chains of a given depth, with predicates between 
+consecutive concepts (resource predicates) and from each concept to xs:string 
+(literal predicates). The data consists of typed resources, generic statements 
+relating them through the resource predicates, and literal values stored as rows 
+of the String model through the literal predicates. 
+
+The data is inserted with raw SQL in large batches, bypassing the model signals, 
+so that millions of rows can be generated in reasonable time. 
+"""
+
+from __future__ import with_statement
+from datetime import datetime
+import random, time
+
+from django.db import connection, transaction
+
+from rdf.models import Cardinality, Concept, Namespace, Predicate, Resource, \
+    Statement, String, bulk_changes
+from rdf.shortcuts import create, get
+
+
+CODE = 'bench'
+URI = 'http://example.com/rdf/bench#'
+
+BATCH_SIZE = 10000
+
+
+class SyntheticOntology(object):
+    
+    def __init__(self, namespace, concepts, resource_predicates, literal_predicates):
+        self.namespace = namespace
+        self.concepts = concepts
+        self.resource_predicates = resource_predicates
+        self.literal_predicates = literal_predicates
+        
+    def using(self):
+        """
+        Returns the RDQL using clause for the ontology.
+        """
+        return u'using %s for "%s", rdf for "%s"' % (
+            self.namespace.code, self.namespace.uri, Namespace.objects.RDF.uri)
+
+
+def ontology(concepts=20, predicates=40, depth=3):
+    """
+    Creates the synthetic ontology. Half of the predicates relate resources, the 
+    other half are literal. Every `depth` consecutive concepts form a chain of 
+    inheritance. 
+    """
+    with bulk_changes():
+        NS = create(Namespace, CODE, URI)
+        STRING = get(Namespace, 'xs')['string']
+        many_many = Cardinality.objects.get(domain='*', range='*') # IGNORE:E1101
+        C = [create(Concept, NS, 'C%s' % i) for i in range(concepts)]
+        for i in range(concepts):
+            if i % depth:
+                C[i].bases.add(C[i - 1]) # IGNORE:E1101
+        R, L = [], []
+        for i in range(predicates):
+            if i % 2:
+                L.append(create(Predicate, NS, 'L%s' % (i // 2), 
+                    domain=C[i // 2 % concepts], range=STRING, cardinality=many_many))
+            else:
+                R.append(create(Predicate, NS, 'P%s' % (i // 2), 
+                    domain=C[i // 2 % concepts], range=C[(i // 2 + 1) % concepts], 
+                    cardinality=many_many))
+    return SyntheticOntology(NS, C, R, L)
+
+
+def populate(o, resources=10000, statements=100000, rows=100000, seed=0):
+    """
+    Generates the data, and returns (name, rows, seconds) for each table filled.
+    """
+    rnd = random.Random(seed)
+    timings = []
+    now = datetime.now()
+    
+    started = time.time()
+    _insert(Resource, ('namespace', 'name', 'type', 'issued'), 
+        [(o.namespace.id, u'r%s' % i, o.concepts[i % len(o.concepts)].id, now) \
+            for i in xrange(resources)])
+    ids = _ids(Resource, 'type', [c.id for c in o.concepts])
+    timings.append(('resources', resources, time.time() - started))
+    
+    # Resources of each concept, by concept index: 
+    typed = [ids[i::len(o.concepts)] for i in range(len(o.concepts))]
+    index = dict([(c.id, i) for i, c in enumerate(o.concepts)])
+    
+    def _statement(predicate, object=None):
+        return (rnd.choice(typed[index[predicate.domain_id]]), predicate.id, object, now)
+    
+    started = time.time()
+    _insert(Statement, ('subject', 'predicate', 'object_resource', 'issued'), 
+        (_statement(p, rnd.choice(typed[index[p.range_id]])) \
+            for p in (rnd.choice(o.resource_predicates) for _ in xrange(statements))))
+    timings.append(('statements', statements, time.time() - started))
+    
+    started = time.time()
+    _insert(Statement, ('subject', 'predicate', 'object_resource', 'issued'), 
+        (_statement(rnd.choice(o.literal_predicates)) for _ in xrange(rows)))
+    _insert(String, ('statement', 'value', 'language'), 
+        ((s, u'value %s' % s, 'en-US') for s in \
+            _ids(Statement, 'predicate', [p.id for p in o.literal_predicates])))
+    timings.append(('literals', rows, time.time() - started))
+    return timings
+
+
+def cleanup(o):
+    """
+    Deletes the data and the synthetic ontology.
+    """
+    predicates = [p.id for p in o.resource_predicates + o.literal_predicates]
+    cursor = connection.cursor() # IGNORE:E1101
+    cursor.execute('DELETE FROM %s WHERE %s IN (SELECT %s FROM %s WHERE %s IN (%s))' % (
+        _table(String), _column(String, 'statement'), _column(Statement, 'id'), 
+        _table(Statement), _column(Statement, 'predicate'), 
+        ', '.join(['%s'] * len(predicates))), predicates)
+    _delete(Statement, 'predicate', predicates)
+    _delete(Resource, 'type', [c.id for c in o.concepts])
+    with bulk_changes():
+        for p in o.resource_predicates + o.literal_predicates:
+            resource = p.resource
+            p.delete()
+            resource.delete()
+        for c in o.concepts:
+            resource = c.resource
+            c.delete()
+            resource.delete()
+        resource = o.namespace.resource
+        o.namespace.delete()
+        resource.delete()
+    
+    
+def _column(Model, name):
+    return connection.ops.quote_name(Model._meta.get_field(name).column) # IGNORE:W0212
+
+
+def _table(Model):
+    return connection.ops.quote_name(Model._meta.db_table) # IGNORE:W0212
+
+
+def _insert(Model, fields, rows):
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (_table(Model), 
+        ', '.join([_column(Model, f) for f in fields]), ', '.join(['%s'] * len(fields)))
+    cursor = connection.cursor() # IGNORE:E1101
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if BATCH_SIZE <= len(batch):
+            cursor.executemany(sql, batch)
+            transaction.commit_unless_managed()
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        transaction.commit_unless_managed()
+        
+        
+def _ids(Model, field, values):
+    """
+    Returns the primary keys of the rows with the field in the values, in order.
+    """
+    cursor = connection.cursor() # IGNORE:E1101
+    cursor.execute('SELECT %s FROM %s WHERE %s IN (%s) ORDER BY %s' % (
+        _column(Model, 'id'), _table(Model), _column(Model, field), 
+        ', '.join(['%s'] * len(values)), _column(Model, 'id')), values)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _delete(Model, field, values):
+    if not values:
+        return
+    cursor = connection.cursor() # IGNORE:E1101
+    cursor.execute('DELETE FROM %s WHERE %s IN (%s)' % (
+        _table(Model), _column(Model, field), ', '.join(['%s'] * len(values))), values)
+    transaction.commit_unless_managed()
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
@@ -0,0 +1,124 @@
+"""
+The fixed benchmark workload.
+
+The workload compiles and executes a set of RDQL queries against the synthetic 
+ontology (see rdf.benchmark.data), each a given number of times:
+
+    single  - the literal values of one predicate, for one concept
+    join    - resources related by one predicate
+    chain   - resources related through two predicates
+    path    - a property path through two predicates
+
+Compilation bypasses the compiled query cache. Execution uses fresh query sets, 
+so every run executes the SQL unless the result cache is enabled. 
+"""
+
+import time
+
+from rdf.instrumentation import Aggregator, register, unregister
+from rdf.query.compiler import Compiler
+from rdf.query.query import SPARQLQuerySet
+
+
+def queries(o):
+    """
+    Returns (name, RDQL) pairs for the workload over the synthetic ontology.
+    """
+    C0, C1, C2 = [c.code for c in o.concepts[:3]]
+    P0, P1 = [p.code for p in o.resource_predicates[:2]]
+    L0 = o.literal_predicates[0].code
+    using = o.using()
+    return [
+        ('single', u'select a.%s from %s a %s' % (L0, C0, using)),
+        ('join', u'select a.rdf:about, b.rdf:about from %s a, %s b where a %s b %s' % (
+            C0, C1, P0, using)),
+        ('chain', u'select a.rdf:about, c.rdf:about from %s a, %s b, %s c '
+            u'where a %s b and b %s c %s' % (C0, C1, C2, P0, P1, using)),
+        ('path', u'select a.%s.%s.rdf:about from %s a %s' % (P0, P1, C0, using)),
+    ]
+
+
+def summary(seconds):
+    """
+    Returns the number of samples, and the mean, nearest-rank percentiles, minimum 
+    and maximum in milliseconds. 
+    """
+    ms = sorted([1000 * s for s in seconds])
+    rank = lambda p: ms[max(0, -(-len(ms) * p // 100) - 1)]
+    return dict(n=len(ms), mean=sum(ms) / len(ms), 
+        p50=rank(50), p95=rank(95), p99=rank(99), min=ms[0], max=ms[-1])
+
+
+def run(o, repeat=20, limit=100):
+    """
+    Runs the workload, and returns a dict of results keyed by measurement name.
+    """
+    results = {}
+    aggregator = register(Aggregator())
+    try:
+        for name, rdql in queries(o):
+            compiling = []
+            for _ in range(repeat):
+                started = time.time()
+                Compiler().compile(rdql)
+                compiling.append(time.time() - started)
+            results['compile.%s' % name] = summary(compiling)
+            executing, rows = [], 0
+            for _ in range(repeat):
+                qs = SPARQLQuerySet().rdql(rdql)[:limit]
+                started = time.time()
+                rows = len(list(qs))
+                executing.append(time.time() - started)
+            results['execute.%s' % name] = summary(executing)
+            results['execute.%s' % name]['rows'] = rows
+            results['execute.%s' % name]['per_second'] = len(executing) / sum(executing)
+            counting = []
+            for _ in range(repeat):
+                qs = SPARQLQuerySet().rdql(rdql)
+                started = time.time()
+                qs.count()
+                counting.append(time.time() - started)
+            results['count.%s' % name] = summary(counting)
+        results['stages'] = _stages(aggregator)
+    finally:
+        unregister(aggregator)
+    return results
+
+
+def _stages(aggregator):
+    """
+    Returns the summaries of the pipeline stages over the whole workload.
+    """
+    stages = {}
+    for (_, stage), durations in aggregator.durations.items():
+        stages.setdefault(stage, []).extend(durations)
+    return dict([(stage, summary(durations)) for stage, durations in stages.items()])
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
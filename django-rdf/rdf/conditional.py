@@ -0,0 +1,89 @@
+"""
+HTTP conditional GET support for views that render RDQL query sets.
+
+The entity tag of a response is the fingerprint of the query set it renders,
+which combines the compiled SQL with the data versions of the tables involved
+(see rdf.query.cache). A request carrying a matching If-None-Match header gets
+a 304 response without the query being executed. Full responses also carry a
+Last-Modified header, the last time the data version of any of the tables read
+by the query was bumped. Deleting rows bumps the versions like saving them
+does, so deletions move Last-Modified forward too. Takes no database query.
+
+Data versions are only tracked when enabled in the project settings, either
+implicitly by the result cache or explicitly:
+
+    RDF_CONDITIONAL_GET = True
+
+Without version tracking the responses are returned unchanged.
+"""
+
+import rfc822
+
+from django.http import HttpResponseNotModified
+
+from rdf.query import cache
+
+
+def etag(qs):
+    return '"%s"' % qs.fingerprint()
+
+
+def last_modified(qs):
+    """
+    Returns the time the data read by the query set last changed, in seconds 
+    since the epoch, as tracked by the data versions of its tables.
+    """
+    return cache.modified(qs.compiled().tables)
+
+
+def _if_none_match(request):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return [_.strip() for _ in header.split(',')]
+
+
+def conditional(request, qs, render):
+    """
+    Returns a 304 response if the request's If-None-Match header matches the
+    entity tag of the query set, else calls `render` for the response and adds
+    the ETag and Last-Modified headers to it.
+    """
+    if not cache.tracking():
+        return render()
+    tag = etag(qs)
+    if tag in _if_none_match(request) or '*' in _if_none_match(request):
+        response = HttpResponseNotModified()
+        response['ETag'] = tag
+        return response
+    response = render()
+    response['ETag'] = tag
+    response['Last-Modified'] = rfc822.formatdate(last_modified(qs))
+    return response
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
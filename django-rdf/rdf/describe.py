@@ -0,0 +1,296 @@
+"""
+Resource descriptions, consisting of every triple about a resource. 
+
+A description covers the generic statements about the resource, with their 
+literal and resource objects, and the columns of the resource's mapped model 
+that are exposed through mirrored predicates. Describing a list of resources 
+takes a fixed number of queries, whatever the number of predicates involved: 
+
+    - the types of the resources, and the mirrored predicates of mapped types
+    - one per mapped model, and one per model referenced by mapped columns
+    - the statements, their predicates and their ranges
+    - one per literal model, one for resource objects and one per mapped model 
+      used as a statement range (see rdf.managers.prefetch_objects)
+    - the resources and namespaces that make up the URIs in the descriptions
+
+Descriptions are cached per resource, for the number of seconds set in the 
+project settings:
+
+    RDF_DESCRIBE_CACHE_TIMEOUT = 300
+
+The timeout defaults to settings.RDF_QUERY_CACHE_TIMEOUT. A cached description 
+is discarded when the resource, a statement about it, a literal object of such a 
+statement or the mapped model instance of the resource is saved or deleted. 
+Writes that bypass the Django models are not detected, and neither are changes 
+to the URIs of other resources referenced by the description.
+"""
+
+from threading import local
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.fields.related import ForeignKey
+
+from rdf.managers import prefetch_objects
+from rdf.models import Concept, Literal, Namespace, Predicate, Resource, Statement, \
+    bulk_active
+from rdf.query import cache as query_cache
+
+
+_KEY = 'rdf.describe.%s'
+
+_pending = local() # Resources changed by the current thread within bulk_changes
+
+_CHUNK_SIZE = 500 # Keeps IN clauses below the SQLite limit on query parameters
+
+
+class Property(object): # IGNORE:R0903
+    """
+    A predicate and object in a description. The object is either a resource, 
+    given by its URI, or a literal value. Both are None for statements without 
+    objects. 
+    """
+    
+    def __init__(self, name, uri, resource=None, literal=None):
+        self.name = name # The mangled predicate code
+        self.uri = uri
+        self.resource = resource
+        self.literal = literal
+        
+
+class Description(object): # IGNORE:R0903
+    
+    def __init__(self, uri):
+        self.uri = uri
+        self.properties = []
+
+
+def timeout():
+    return getattr(settings, 'RDF_DESCRIBE_CACHE_TIMEOUT', query_cache.timeout())
+
+
+def _split(uri):
+    i = max(uri.rfind('#'), uri.rfind('/')) + 1
+    return uri[:i], uri[i:]
+
+
+def locate(uris):
+    """
+    Returns the resources identified by the URIs, in order, with two queries. 
+    URIs that don't identify a resource are skipped.
+    """
+    keys = [_split(u) for u in uris]
+    namespaces = {}
+    for n in Namespace.objects.select_related().filter( # IGNORE:E1101
+        resource__name__in=list(set([ns for ns, _ in keys]))):
+        namespaces[n.resource.name] = n
+    if not namespaces:
+        return []
+    by_pk = dict([(n.pk, n) for n in namespaces.values()])
+    found = {}
+    for r in Resource.objects.filter( # IGNORE:E1101
+        namespace__in=by_pk.keys(), name__in=list(set([name for _, name in keys]))):
+        r._namespace_cache = n = by_pk[r.namespace_id] # IGNORE:W0212
+        found[(n.resource.name, r.name)] = r
+    return [found[k] for k in keys if found.has_key(k)]
+
+
+def describe(resources):
+    """
+    Returns the descriptions of the resources, in order.
+    """
+    t = timeout()
+    descriptions = {}
+    if 0 < t:
+        cached = cache.get_many([_KEY % r.pk for r in resources])
+        for k, d in cached.items():
+            descriptions[k] = d
+    missing = [r for r in resources if not descriptions.has_key(_KEY % r.pk)]
+    for i in range(0, len(missing), _CHUNK_SIZE):
+        chunk = missing[i:i+_CHUNK_SIZE]
+        for r, d in zip(chunk, _describe(chunk)):
+            descriptions[_KEY % r.pk] = d
+            if 0 < t:
+                cache.set(_KEY % r.pk, d, t)
+    return [descriptions[_KEY % r.pk] for r in resources]
+
+
+def _describe(resources):
+    triples = list(_mapped(resources)) + list(_statements(resources))
+    ids = [r.pk for r in resources]
+    for _, p, object_id, _ in triples:
+        ids.append(p.resource_id)
+        if object_id is not None:
+            ids.append(object_id)
+    loaded = _resources(ids)
+    descriptions = dict([(r.pk, Description(loaded[r.pk].uri)) for r in resources])
+    for subject_id, p, object_id, literal in triples:
+        p._resource_cache = loaded[p.resource_id] # IGNORE:W0212
+        descriptions[subject_id].properties.append(Property(
+            p.mangled, p.uri, 
+            loaded[object_id].uri if object_id is not None else None,
+            literal))
+    return [descriptions[r.pk] for r in resources]
+
+
+def _statements(resources):
+    """
+    Generates (subject, predicate, object resource, literal) for the generic 
+    statements about the resources.
+    """
+    statements = Statement.objects.filter( # IGNORE:E1101
+        subject__in=[r.pk for r in resources]).order_by('id')
+    for s in prefetch_objects(statements):
+        p = s.predicate
+        if s.object_resource_id is not None:
+            yield s.subject_id, p, s.object_resource_id, None
+        elif not hasattr(s, '_Statement__object'):
+            continue # The literal object is missing
+        elif s.object is None:
+            yield s.subject_id, p, None, None
+        else:
+            yield s.subject_id, p, None, s.object.value # IGNORE:E1103
+
+
+def _mapped(resources):
+    """
+    Generates (subject, predicate, object resource, literal) for the mapped model 
+    columns of the resources.
+    """
+    types = Concept.objects.in_bulk( # IGNORE:E1101
+        list(set([r.type_id for r in resources if r.type_id is not None])))
+    mapped = dict([(c.pk, c.Model) for c in types.values() if not c.generic])
+    if not mapped:
+        return
+    predicates = {}
+    for p in Predicate.objects.filter( # IGNORE:E1101
+        domain__in=mapped.keys(), field_name__isnull=False, is_span=False):
+        predicates.setdefault(p.domain_id, []).append(p)
+    groups = {}
+    for r in resources:
+        if predicates.has_key(r.type_id):
+            groups.setdefault(mapped[r.type_id], []).append(r)
+    for Model, members in groups.items():
+        type_ids = dict([(r.pk, r.type_id) for r in members])
+        columns, references = [], {}
+        for o in Model.objects.filter(resource__in=type_ids.keys()): # IGNORE:E1101
+            for p in predicates[type_ids[o.resource_id]]:
+                f = p.field
+                if 'resource' == f.name:
+                    continue
+                v = getattr(o, f.attname)
+                columns.append((o.resource_id, p, f, v))
+                if isinstance(f, ForeignKey) and v is not None:
+                    references.setdefault(f.rel.to, set()).add(v)
+        referenced = {}
+        for Target, pks in references.items():
+            if Target is not Resource:
+                referenced[Target] = Target._default_manager.in_bulk(list(pks)) # IGNORE:W0212
+        for subject_id, p, f, v in columns:
+            if not isinstance(f, ForeignKey) or v is None:
+                yield subject_id, p, None, v
+            elif f.rel.to is Resource:
+                yield subject_id, p, v, None
+            else:
+                target = referenced[f.rel.to].get(v)
+                if target is None:
+                    continue
+                if hasattr(target, 'resource_id'):
+                    yield subject_id, p, target.resource_id, None
+                else:
+                    yield subject_id, p, None, unicode(target)
+
+
+def _resources(ids):
+    """
+    Returns the resources with the primary keys given, by primary key, with their 
+    namespaces loaded.
+    """
+    resources = {}
+    ids = list(set(ids))
+    for i in range(0, len(ids), _CHUNK_SIZE):
+        resources.update(Resource.objects.in_bulk(ids[i:i+_CHUNK_SIZE])) # IGNORE:E1101
+    namespace_ids = list(set([r.namespace_id for r in resources.values() 
+        if r.namespace_id is not None]))
+    namespaces = {}
+    if namespace_ids:
+        for n in Namespace.objects.select_related().filter(pk__in=namespace_ids): # IGNORE:E1101
+            namespaces[n.pk] = n
+    for r in resources.values():
+        r._namespace_cache = namespaces.get(r.namespace_id) # IGNORE:W0212
+    return resources
+
+
+def invalidate(resource_id):
+    cache.delete(_KEY % resource_id)
+
+
+def _affected(instance):
+    """
+    Returns the primary key of the resource whose description is affected by a 
+    change to the instance, or None.
+    """
+    if isinstance(instance, Resource):
+        return instance.pk
+    elif isinstance(instance, Statement):
+        return instance.subject_id
+    elif isinstance(instance, Literal):
+        statement = getattr(instance, '_statement_cache', None)
+        if statement is None:
+            try:
+                statement = Statement.objects.get(pk=instance.statement_id) # IGNORE:E1101
+            except Statement.DoesNotExist: # IGNORE:E1101
+                return None # Deleted along with the statement, which invalidated 
+        return statement.subject_id
+    return getattr(instance, 'resource_id', None)
+
+
+def changed(sender, instance): # IGNORE:W0613
+    """
+    Discards the cached descriptions affected by a change to the instance. Within
+    rdf.models.bulk_changes the descriptions are discarded when the outermost 
+    context exits, once per resource.
+    """
+    if 0 >= timeout():
+        return
+    resource_id = _affected(instance)
+    if resource_id is None:
+        return
+    if bulk_active():
+        _pending.__dict__.setdefault('ids', set()).add(resource_id)
+    else:
+        invalidate(resource_id)
+
+
+def bulk_changed(changes): # IGNORE:W0613
+    for resource_id in _pending.__dict__.pop('ids', ()):
+        invalidate(resource_id)
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
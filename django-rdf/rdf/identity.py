@@ -0,0 +1,165 @@
+"""
+An opt-in identity map for the ontology models.
+
+While an identity map is active, ontology instances reached through foreign keys
+(the namespace of a resource, the resource of a concept, etc.) are loaded once
+per primary key and shared, and derived properties such as Predicate.code or
+Concept.ontology are computed once per instance. Rendering a page of results
+touches the same few ontology objects many times over, and with an active map
+repeated access no longer queries the database.
+
+The map is thread-local. It is activated either for a block of code,
+
+    with identity_map():
+        ...
+
+or for every request, by adding the middleware to the project settings:
+
+    MIDDLEWARE_CLASSES = (
+        ...
+        'rdf.identity.IdentityMapMiddleware',
+    )
+
+Only instances loaded through the foreign keys of the ontology models are
+shared. Instances returned by querysets are not added to the map, so a queryset
+may return a different object than the map holds for the same row.
+
+Outside an active map the models behave exactly as before. The map does not
+track changes; instances saved while it is active are not refreshed.
+"""
+
+from __future__ import with_statement
+from contextlib import contextmanager
+from threading import local
+
+
+_local = local()
+
+
+def _current():
+    return getattr(_local, 'map', None)
+
+
+def activate():
+    """
+    Activates a fresh identity map for the current thread, unless one is already
+    active. Returns True if a map was activated.
+    """
+    if _current() is not None:
+        return False
+    _local.map = {}
+    return True
+
+
+def deactivate():
+    """
+    Discards the identity map of the current thread, if any.
+    """
+    _local.map = None
+
+
+@contextmanager
+def identity_map():
+    """
+    Activates an identity map for the duration of the context. Nested contexts
+    share the map of the outermost context.
+    """
+    activated = activate()
+    try:
+        yield
+    finally:
+        if activated:
+            deactivate()
+
+
+def fetch(Model, pk):
+    """
+    Returns the instance of the model with the primary key, loading it at most
+    once while an identity map is active.
+    """
+    map = _current()
+    if map is None:
+        return Model._default_manager.get(pk=pk) # IGNORE:W0212
+    key = (Model, pk)
+    if not map.has_key(key):
+        map[key] = Model._default_manager.get(pk=pk) # IGNORE:W0212
+    return map[key]
+
+
+def related(instance, name):
+    """
+    Dereferences the foreign key `name` of the instance, through the identity map
+    if one is active. Equivalent to getattr(instance, name) otherwise.
+    """
+    if _current() is None:
+        return getattr(instance, name)
+    cache = '_%s_cache' % name
+    if not hasattr(instance, cache):
+        field = instance._meta.get_field(name) # IGNORE:W0212
+        pk = getattr(instance, field.attname)
+        setattr(instance, cache, None if pk is None else fetch(field.rel.to, pk))
+    return getattr(instance, cache)
+
+
+def memoized(method):
+    """
+    Decorator for derived properties. While an identity map is active the value
+    is computed once per model, primary key and property, and is shared by every
+    instance with that primary key.
+    """
+    def wrapper(self):
+        map = _current()
+        if map is None or self.pk is None:
+            return method(self)
+        key = (self.__class__, self.pk, method.__name__)
+        if not map.has_key(key):
+            map[key] = method(self)
+        return map[key]
+    wrapper.__name__, wrapper.__doc__ = method.__name__, method.__doc__
+    return wrapper
+
+
+class IdentityMapMiddleware(object):
+    """
+    Activates an identity map for the duration of each request.
+    """
+
+    def process_request(self, request): # IGNORE:W0613
+        activate()
+
+    def process_response(self, request, response): # IGNORE:W0613
+        deactivate()
+        return response
+
+    def process_exception(self, request, exception): # IGNORE:W0613
+        deactivate()
+
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
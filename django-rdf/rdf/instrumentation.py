@@ -0,0 +1,290 @@
+"""
+Instrumentation hooks for the RDQL compile and execute pipeline.
+
+The pipeline is divided into stages, each of which is reported to the registered 
+instruments when it starts and when it ends:
+
+    lex, parse          - the RDQL text is tokenized and parsed 
+    bind, span,         - the resolver binds the AST to the ontology and 
+    generalize            synthesizes clauses for paths and generic terms
+    generate            - SQL is generated from the resolved AST
+    execute             - the SQL query is executed
+    first row           - from the start of execution until the first rows arrive 
+    fetch               - the rows are fetched
+    cache hit           - the rows or the count are found in the result cache, 
+                          instead of being executed and fetched
+    render              - a view renders the results, including the execution 
+                          stages this triggers
+
+Instruments receive a Measurement, which carries the stage, the fingerprint of 
+the RDQL query (see fingerprint) and its text where known, and once the stage 
+has ended its duration, the number of rows involved and the number of database 
+queries issued by the stage. Database queries are only counted when 
+settings.DEBUG is true. 
+
+Instruments are registered in code, 
+
+    register(Aggregator())
+
+or listed in the project settings, and registered on first use:
+
+    RDF_INSTRUMENTS = ('rdf.instrumentation.Aggregator',)
+
+Without any registered instruments the stages are timed but not reported. 
+"""
+
+from __future__ import with_statement
+from contextlib import contextmanager
+from threading import local
+import md5, re, time
+
+from django.conf import settings
+from django.db import connection
+
+from rdf.shortcuts import lru
+
+
+class Instrument(object):
+    """
+    Base class for instruments. Subclasses override either or both callbacks.
+    """
+    
+    def start(self, measurement): # IGNORE:W0613
+        pass
+    
+    def end(self, measurement): # IGNORE:W0613
+        pass
+
+
+class Measurement(object):
+    
+    def __init__(self, stage, fingerprint=None, sql=None, started=None, rdql=None):
+        self.stage = stage
+        self.fingerprint = fingerprint
+        self.rdql = rdql
+        self.sql = sql
+        self.started = time.time() if started is None else started
+        self.seconds = None
+        self.rows = None
+        self.queries = None
+        self._queries = len(connection.queries)
+        
+    def end(self, seconds=None):
+        self.seconds = time.time() - self.started if seconds is None else seconds
+        if settings.DEBUG:
+            self.queries = len(connection.queries) - self._queries
+            
+
+_instruments = None
+
+_local = local()
+
+
+def instruments():
+    """
+    Returns the registered instruments, registering those listed in 
+    settings.RDF_INSTRUMENTS on first use.
+    """
+    global _instruments
+    if _instruments is None:
+        from rdf.shortcuts import import_class
+        _instruments = [import_class(_)() \
+            for _ in getattr(settings, 'RDF_INSTRUMENTS', ())]
+    return _instruments
+
+
+def register(instrument):
+    if not instrument in instruments():
+        instruments().append(instrument)
+    return instrument
+
+
+def unregister(instrument):
+    if instrument in instruments():
+        instruments().remove(instrument)
+
+
+_CONSTANT = re.compile(
+    r'''(\bfor\s+)?(['"][^'"]*['"])|(?<![\w:])\d+(\.\d+)?''', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+_NORMALIZED_SIZE = 1000 # Fingerprints kept, the least recently used are discarded
+
+_normalized = lru(_NORMALIZED_SIZE) # Fingerprint -> normalized RDQL
+
+
+def normalize(rdql):
+    """
+    Returns the RDQL text with its constants replaced by ?, and whitespace 
+    collapsed. Namespace URIs in the using clause are kept. 
+    """
+    rdql = _CONSTANT.sub(lambda m: m.group(1) and m.group(0) or u'?', rdql)
+    return _WHITESPACE.sub(u' ', rdql).strip()
+
+
+def constants(rdql):
+    """
+    Returns the constants replaced by normalize, in order of appearance.
+    """
+    return [m.group(2)[1:-1] if m.group(2) else m.group(0) \
+        for m in _CONSTANT.finditer(rdql) if not m.group(1)]
+
+
+def fingerprint(rdql):
+    """
+    Returns a digest of the normalized RDQL text. Queries that differ only in 
+    their constants and layout share a fingerprint. 
+    """
+    n = normalize(rdql)
+    f = md5.new(n.encode('utf-8')).hexdigest()
+    _normalized[f] = n
+    return f
+
+
+def normalized(fingerprint):
+    """
+    Returns the normalized RDQL text for the fingerprint, or None. Only the most 
+    recently fingerprinted queries are remembered.
+    """
+    return _normalized.get(fingerprint)
+
+
+def current():
+    """
+    Returns the fingerprint and the RDQL text of the query being processed by the 
+    current thread, or (None, None).
+    """
+    return getattr(_local, 'query', None) or (None, None)
+
+
+@contextmanager
+def query(fingerprint, rdql=None):
+    """
+    Attributes the stages within the context to the query with the fingerprint. 
+    """
+    previous = getattr(_local, 'query', None)
+    _local.query = (fingerprint, rdql)
+    try:
+        yield
+    finally:
+        _local.query = previous
+
+
+def _measurement(name, fingerprint, sql, started, rdql):
+    if fingerprint is None:
+        fingerprint, rdql = current()
+    return Measurement(name, fingerprint, sql, started, rdql)
+
+
+@contextmanager
+def stage(name, fingerprint=None, sql=None, rdql=None):
+    """
+    Measures the stage for the duration of the context, and reports it to the 
+    registered instruments. Yields the Measurement, so that the rows can be set. 
+    The fingerprint and RDQL text default to the current ones. 
+    """
+    m = _measurement(name, fingerprint, sql, None, rdql)
+    for i in instruments():
+        i.start(m)
+    try:
+        yield m
+    finally:
+        m.end()
+        for i in instruments():
+            i.end(m)
+
+
+def record(name, started, seconds=None, fingerprint=None, sql=None, rows=None, 
+    rdql=None):
+    """
+    Reports a stage that was measured by the caller. The duration defaults to the 
+    time elapsed since `started`. 
+    """
+    m = _measurement(name, fingerprint, sql, started, rdql)
+    m.rows = rows
+    for i in instruments():
+        i.start(m)
+    m.end(seconds)
+    for i in instruments():
+        i.end(m)
+    return m
+
+
+class Aggregator(Instrument):
+    """
+    Keeps the most recent durations of each stage for each fingerprint, and 
+    reports their percentiles. 
+    """
+    
+    PERCENTILES = (50, 95, 99)
+    
+    def __init__(self, samples=1000):
+        self.samples = samples
+        self.durations = {} # (fingerprint, stage) -> seconds, most recent last
+        self.rows = {} # (fingerprint, stage) -> total rows
+        
+    def end(self, measurement):
+        key = (measurement.fingerprint, measurement.stage)
+        durations = self.durations.setdefault(key, [])
+        durations.append(measurement.seconds)
+        if self.samples < len(durations):
+            del durations[0]
+        if not measurement.rows is None:
+            self.rows[key] = self.rows.get(key, 0) + measurement.rows
+            
+    def percentiles(self, fingerprint, stage, percentiles=PERCENTILES):
+        """
+        Returns the nearest-rank percentiles of the stage durations in seconds, 
+        or None if the stage hasn't been measured for the fingerprint. 
+        """
+        durations = sorted(self.durations.get((fingerprint, stage), ()))
+        if not durations:
+            return None
+        return tuple([durations[max(0, -(-len(durations) * p // 100) - 1)] \
+            for p in percentiles])
+        
+    def report(self):
+        """
+        Returns lines with the percentiles of each stage, by fingerprint.
+        """
+        lines = []
+        for f in sorted(set([f for f, _ in self.durations])):
+            lines.append(u'%s %s' % (f, normalized(f) or u''))
+            for key in sorted([k for k in self.durations if f == k[0]]):
+                lines.append(u'  %-12s n=%-6s %s' % (key[1], len(self.durations[key]), 
+                    u' '.join([u'p%s=%.2fms' % (p, 1000 * s) for p, s in \
+                        zip(self.PERCENTILES, self.percentiles(*key))])))
+        return lines
+    
+    def reset(self):
+        self.durations.clear()
+        self.rows.clear()
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
@@ -1,7 +1,6 @@
 from rdf.models import \
-    Namespace, Predicate, Resource, Concept, Cardinality, CARDINALITIES, _SpanSegment
+    Namespace, Predicate, Resource, Concept, Cardinality, CARDINALITIES
 from rdf.shortcuts import get, get_or_create
-from django.db.models.fields import AutoField
 
 
 def pre():
@@ -315,107 +314,6 @@ def _compiler_support(literal):
         description=description)
 
 
-def predicate_spans():
-    """
-    Generates spanning predicates for all concepts.
-    """
-    
-    def concept(c):
-        for p in Predicate.objects.filter(domain=c):
-            if invalid_segment(p):
-                continue
-            if p.literal:
-                continue
-            for q in egress(p):
-                if invalid_segment(q):
-                    continue
-                if q.literal:
-                    span(p, q)
-                    continue
-                for r in egress(q):
-                    if invalid_segment(r):
-                        continue
-                    if r.literal:
-                        span(p, q, r)
-        
-    def invalid_segment(p):
-        return p.span \
-            or p.Range in (Resource, Concept, Predicate) \
-            or (p.literal and type(p.field) is AutoField)
-        
-    def egress(p):
-        for _ in Predicate.objects.filter(domain=p.range):
-            yield _
-            
-    def span(*predicates):
-        """
-        Creates a spanning predicate across the parameter predicates. The span 
-        is not assigned to an ontology.
-        """
-        domain, range_ = predicates[0].domain, predicates[-1].range
-        resource, _ = Resource.objects.get_or_create(
-            namespace=_span_namespace(domain), 
-            name=_span_name(*predicates), 
-            type=Predicate.objects.type)
-        span, _ = Predicate.objects.get_or_create(
-            resource=resource, 
-            domain=domain, 
-            range=range_, 
-            cardinality=_span_cardinality(*predicates),
-            title=predicates[len(predicates)-1].title, 
-            description=predicates[len(predicates)-1].description)
-        for p, i in zip(predicates, range(0, len(predicates))):
-            _SpanSegment.objects.get_or_create(span=span, predicate=p, ordinal=i)
-        return span 
-        
-    for c in Concept.objects.filter(literal=False):
-        concept(c)
-
-def _span_namespace(concept):
-    code = concept.namespace.code+'-spans'
-    try:
-        namespace = Namespace.objects.get(code=code)
-    except Namespace.DoesNotExist:
-        uri = concept.namespace.uri
-        if '#' == uri[-1]:
-            uri = uri[:-1] + '-spans' + '#'
-        elif '/' == uri[-1]: 
-            uri = uri[:-1] + '-spans' + '/'
-        resource = Resource.objects.create(name=uri)
-        description = 'Synthesized spanning predicates for %s' % code
-        namespace = Namespace.objects.create(
-            code=code, resource=resource, 
-            title=concept.namespace.title + ' (spans)',
-            description=description)
-    return namespace
-
-def _span_name(*predicates):
-    segments = []
-    for p in predicates:
-        segments.append(u'_'.join((p.namespace.code, p.name))) 
-    return u'__'.join(segments)
-
-def _span_cardinality(*predicates):
-    begin, end = predicates[0], predicates[-1]
-    domain, range = begin.cardinality.domain, end.cardinality.range
-    for p in predicates:
-        if '*' != range and _greater_cardinality(range, p.cardinality.range):
-            range = p.cardinality.range 
-        if '*' != domain and _greater_cardinality(domain, p.cardinality.domain):
-            domain = p.cardinality.domain
-    return Cardinality.objects.get(domain=domain, range=range)
-            
-def _greater_cardinality(a, b):
-    if '1' == a:
-        return b in ('?', '+', '*')
-    elif '?' == a:
-        return b in ('+', '*')
-    elif '+' == a:
-        return '*' == b
-    else:
-        return False
-    
-    
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.
 # 
@@ -19,9 +19,10 @@ from django.db.models import AutoField, BooleanField, CharField, DateField, \
     DateTimeField, DecimalField, FloatField, IntegerField, TextField, TimeField, \
     get_apps, get_models
 from django.db.models.fields.related import RelatedField
+from django.dispatch import dispatcher
 from django.template import Context, loader
 
-from rdf.models import Cardinality, Concept, Namespace, Resource
+from rdf.models import Cardinality, Concept, Namespace, Resource, bulk_post_save
 from rdf.shortcuts import get, get_or_create
 
 
@@ -100,21 +101,37 @@ class Command(BaseCommand):
                 traceback.print_tb(exc[2])
             
             
-XS, DRDFS = get((Namespace, 'xs'), (Namespace, 'drdfs')) 
-    
-_LITERAL_TYPE_MAP = {
-    AutoField: XS['decimal'],
-    BooleanField: XS['boolean'],
-    CharField: XS['string'],
-    DateField: XS['date'], 
-    DateTimeField: XS['time'],
-    DecimalField: XS['decimal'], 
-    FloatField: XS['float'],  
-    IntegerField: XS['decimal'], 
-    TextField: XS['string'], 
-    TimeField: XS['time'],
+# Names of the XML Schema concepts that literal fields are mirrored to. The 
+# concepts themselves are looked up on first use, see _literal_type:
+_LITERAL_TYPE_NAMES = {
+    AutoField: 'decimal',
+    BooleanField: 'boolean',
+    CharField: 'string',
+    DateField: 'date', 
+    DateTimeField: 'time',
+    DecimalField: 'decimal', 
+    FloatField: 'float',  
+    IntegerField: 'decimal', 
+    TextField: 'string', 
+    TimeField: 'time',
 }
 
+_literal_types = {}
+
+
+def _literal_type(field):
+    name = _LITERAL_TYPE_NAMES[type(field)]
+    if not _literal_types.has_key(name):
+        _literal_types[name] = Concept.objects.get(
+            resource__namespace__code='xs', resource__name=name)
+    return _literal_types[name]
+
+
+def _reset_literal_types():
+    _literal_types.clear()
+
+dispatcher.connect(_reset_literal_types, signal=bulk_post_save)
+
 
 class FragmentData(object):
     
@@ -197,7 +214,7 @@ class FragmentData(object):
             literal=False)
         
 def _literal_range_values(Model, field): # IGNORE:W0613
-    range = _LITERAL_TYPE_MAP[type(field)]
+    range = _literal_type(field)
     cardinality = Cardinality.objects.get(
         domain=('1' if field.unique else '+'), # 1 and +, not ? and *
         range=('?' if field.null else '1'))
@@ -0,0 +1,94 @@
+"""
+This command runs the benchmarks in rdf.benchmark, and writes the results as JSON 
+to standard output or to a file:
+
+    manage.py rdfbench --statements=1000000 --rows=1000000 --output=bench.json
+
+The benchmarks write to the configured database, so the command asks for 
+confirmation unless --noinput is given. 
+"""
+
+import optparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import simplejson
+
+from rdf import benchmark
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        optparse.make_option('--noinput', action='store_false', dest='interactive', 
+            default=True, help='Do not ask for confirmation'),
+        optparse.make_option('--concepts', action='store', dest='concepts', 
+            type='int', default=20, help='Concepts in the synthetic ontology'),
+        optparse.make_option('--predicates', action='store', dest='predicates', 
+            type='int', default=40, help='Predicates in the synthetic ontology'),
+        optparse.make_option('--depth', action='store', dest='depth', 
+            type='int', default=3, help='Depth of the concept hierarchy'),
+        optparse.make_option('--resources', action='store', dest='resources', 
+            type='int', default=10000, help='Resources to generate'),
+        optparse.make_option('--statements', action='store', dest='statements', 
+            type='int', default=100000, help='Generic statements to generate'),
+        optparse.make_option('--rows', action='store', dest='rows', 
+            type='int', default=100000, help='Literal rows to generate'),
+        optparse.make_option('--repeat', action='store', dest='repeat', 
+            type='int', default=20, help='Repetitions of each workload query'),
+        optparse.make_option('--seed', action='store', dest='seed', 
+            type='int', default=0, help='Seed for the data generator'),
+        optparse.make_option('--output', action='store', dest='output', 
+            help='File to write the results to, instead of standard output'),
+    )
+
+    help = 'Benchmarks query compilation and execution on synthetic data.'
+    args = ''
+
+    def handle(self, *args, **options): # IGNORE:W0613
+        if options.get('interactive', True):
+            confirm = raw_input(
+'''The benchmarks write to the %s database, and take a while. 
+Type 'yes' to continue, or 'no' to cancel: ''' % settings.DATABASE_NAME)
+            if 'yes' != confirm:
+                print 'Benchmarks cancelled.'
+                return
+        results = benchmark.run(**dict([(k, options[k]) for k in ( # IGNORE:W0142
+            'concepts', 'predicates', 'depth', 'resources', 'statements', 'rows', 
+            'repeat', 'seed')]))
+        output = simplejson.dumps(results, sort_keys=True, indent=2)
+        if options.get('output'):
+            f = open(options['output'], 'w')
+            f.write(output)
+            f.close()
+        else:
+            print output
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
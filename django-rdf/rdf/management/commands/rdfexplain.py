@@ -0,0 +1,75 @@
+"""
+This command prints the explanation of an RDQL query: the resolved AST, the 
+generated SQL, the backend's query plan and the compiler stage timings. The query 
+isn't executed. 
+
+    manage.py rdfexplain "select c.rdf:about from rdfs:Class c using ..."
+"""
+
+import optparse, sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rdf.query.query import SPARQLQuerySet
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        optparse.make_option('--limit', action='store', dest='limit', type='int', 
+            help='Slices the query, as in qs[offset:offset+limit]'),
+        optparse.make_option('--offset', action='store', dest='offset', type='int', 
+            default=0, help='Slices the query, as in qs[offset:offset+limit]'),
+        optparse.make_option('--allow-cartesian', action='store_true', 
+            dest='allow_cartesian', default=False,
+            help='Accept queries whose variables are not all joined'),
+        optparse.make_option('--grouped', action='store_true', 
+            dest='grouped', default=False,
+            help='Group the results by subject'),
+    )
+
+    help = 'Explains how an RDQL query is compiled and executed.'
+    args = '"rdql"'
+
+    def handle(self, *args, **options):
+        if 1 != len(args):
+            raise CommandError('Enter exactly one RDQL query.')
+        qs = SPARQLQuerySet().rdql(
+            args[0].decode(sys.stdin.encoding or 'utf-8'), 
+            allow_cartesian=options.get('allow_cartesian', False),
+            grouped=options.get('grouped', False))
+        limit, offset = options.get('limit'), options.get('offset') or 0
+        if not limit is None:
+            qs = qs[offset:offset + limit]
+        elif offset:
+            qs = qs[offset:]
+        print unicode(qs.explain()).encode(sys.stdout.encoding or 'utf-8')
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
@@ -0,0 +1,112 @@
+"""
+This command brings the tables of a database created by an earlier release of
+Django-RDF up to date. It adds the columns that syncdb doesn't add to existing
+tables, and fills them in from the data already in the database:
+
+    rdf_predicate.is_span   - true for predicates with span segments
+
+The command can be run any number of times; columns that exist are left alone.
+Run syncdb afterwards to create any new tables.
+
+    manage.py rdfupgrade
+    manage.py syncdb
+"""
+
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from rdf.models import Predicate, _SpanSegment
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--verbosity', action='store', dest='verbosity', default='1',
+            type='choice', choices=['0', '1', '2'],
+            help='Verbosity level; 0=minimal output, 1=normal output, 2=all output'),
+    )
+
+    help = 'Adds the columns introduced since an earlier release to the RDF tables.'
+
+    def handle(self, *args, **options): # IGNORE:W0613
+        verbosity = int(options.get('verbosity', 1))
+        if _has_column(Predicate, 'is_span'):
+            if 1 < verbosity:
+                print 'rdf_predicate.is_span is up to date'
+            return
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        try:
+            _add_is_span()
+            transaction.commit()
+        except:
+            transaction.rollback()
+            transaction.leave_transaction_management()
+            raise
+        transaction.leave_transaction_management()
+        if 0 < verbosity:
+            print 'Added rdf_predicate.is_span'
+
+
+def _has_column(Model, name):
+    qn = connection.ops.quote_name
+    cursor = connection.cursor() # IGNORE:E1101
+    try:
+        cursor.execute('SELECT %s FROM %s WHERE 1 = 0' % (
+            qn(Model._meta.get_field(name).column), qn(Model._meta.db_table))) # IGNORE:W0212
+    except Exception: # Backends raise their own DatabaseError
+        transaction.rollback_unless_managed()
+        return False
+    return True
+
+
+def _add_is_span():
+    """
+    Adds the is_span column and its index, and flags the predicates that have
+    span segments.
+    """
+    qn = connection.ops.quote_name
+    field = Predicate._meta.get_field('is_span') # IGNORE:W0212
+    table = Predicate._meta.db_table # IGNORE:W0212
+    default = settings.DATABASE_ENGINE.startswith('postgresql') and 'false' or '0'
+    cursor = connection.cursor() # IGNORE:E1101
+    cursor.execute('ALTER TABLE %s ADD COLUMN %s %s NOT NULL DEFAULT %s' % (
+        qn(table), qn(field.column), field.db_type(), default))
+    cursor.execute('CREATE INDEX %s ON %s (%s)' % (
+        qn('%s_%s' % (table, field.column)), qn(table), qn(field.column)))
+    segments = _SpanSegment._meta # IGNORE:W0212
+    cursor.execute('UPDATE %s SET %s = %%s WHERE %s IN (SELECT %s FROM %s)' % (
+        qn(table), qn(field.column), qn(Predicate._meta.pk.column), # IGNORE:W0212
+        qn(segments.get_field('span').column), qn(segments.db_table)), [True])
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
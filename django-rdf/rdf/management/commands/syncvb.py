@@ -1,3 +1,4 @@
+from __future__ import with_statement
 import os, sys, traceback
 from optparse import make_option
 
@@ -10,6 +11,7 @@ from django.db import connection, transaction
 from django.db.models import get_app, get_apps
 
 from rdf import magic
+from rdf.models import bulk_changes
 
 
 try:
@@ -61,22 +63,23 @@ formats. Add the following lines at the bottom of your settings.py to fix this:
         transaction.enter_transaction_management()
         transaction.managed(True)
         try: 
-            # Make sure the RDF core app is handled before everything else
-            rdf = get_app('rdf')
-            if 1 > len(labels) or 'magic' in labels:
-                magic.pre()
-                paths = [os.path.join(os.path.dirname(rdf.__file__), 'ontology')]
-                self._handle_fragments(labels, paths) # IGNORE:W0142
-                magic.post()
-            # Next mirror Django models to create additional fragments
-            call_command('mirror', verbosity=self.verbosity)
-            # Now handle the remaining ontology fragments, included the mirrored ones
-            labels = [l for l in labels if 'rdf' != l]
-            paths = [os.path.join(os.path.dirname(app.__file__), 'ontology') \
-                for app in get_apps() if not app is rdf]
-            self._handle_fragments(labels, paths) 
-            magic.compiler_support()
-            magic.predicate_spans() 
+            # Signals for the new ontology elements are coalesced and sent once
+            with bulk_changes():
+                # Make sure the RDF core app is handled before everything else
+                rdf = get_app('rdf')
+                if 1 > len(labels) or 'magic' in labels:
+                    magic.pre()
+                    paths = [os.path.join(os.path.dirname(rdf.__file__), 'ontology')]
+                    self._handle_fragments(labels, paths) # IGNORE:W0142
+                    magic.post()
+                # Next mirror Django models to create additional fragments
+                call_command('mirror', verbosity=self.verbosity)
+                # Now handle the remaining ontology fragments, included the mirrored ones
+                labels = [l for l in labels if 'rdf' != l]
+                paths = [os.path.join(os.path.dirname(app.__file__), 'ontology') \
+                    for app in get_apps() if not app is rdf]
+                self._handle_fragments(labels, paths) 
+                magic.compiler_support()
             # Done - clean up and exit
             if self.count[0] > 0:
                 sequence_sql = connection.ops.sequence_reset_sql(self.style, self.models)
@@ -8,6 +8,7 @@ from rdf.query.query import SPARQLQuerySet
 _WHITESPACE = re.compile('\s+')
 _DEFAULT_OFFSET = 0
 _DEFAULT_LIMIT = 100 
+_CHUNK_SIZE = 500 # Keeps IN clauses below the SQLite limit on query parameters
 
 
 class RDFManager(Manager):
@@ -160,22 +161,36 @@ class ConceptManager(RDFManager):
         return self.__type
     type = property(__gettype)
     
-    def values_for_concept(self, concept, predicates=None, mangle=False):
+    def values_for_concept(self, concept, predicates=None, mangle=False, grouped=False, 
+        optional=None):
+        """
+        Returns a query set with the values of the predicates for every resource 
+        of the concept. The `optional` predicates are selected too, but don't 
+        exclude the resources they don't apply to. By default, the mandatory 
+        literals of the concept are selected, and its optional literals are 
+        selected as optional predicates.
+        """
         if predicates is None:
             predicates = concept.mandatory_literals
-        rdql = self._rdql(domain=concept, predicates=predicates)
-        return self.get_query_set().rdql(rdql, mangle=mangle).filter()
+            if optional is None:
+                optional = concept.optional_literals
+        rdql = self._rdql(domain=concept, predicates=predicates, optional=optional)
+        return self.get_query_set().rdql(rdql, mangle=mangle, grouped=grouped).filter()
     
     def values_for_predicates(self, *predicates, **kwargs):
         mangle = kwargs['mangle'] if kwargs.has_key('mangle') else False
-        rdql = self._rdql(domain=kwargs['domain'], predicates=predicates)
-        return self.get_query_set().rdql(rdql, mangle=mangle).filter()
+        grouped = kwargs['grouped'] if kwargs.has_key('grouped') else False
+        optional = kwargs['optional'] if kwargs.has_key('optional') else None
+        rdql = self._rdql(domain=kwargs['domain'], predicates=predicates, optional=optional)
+        return self.get_query_set().rdql(rdql, mangle=mangle, grouped=grouped).filter()
         
-    def _rdql(self, domain, predicates):
+    def _rdql(self, domain, predicates, optional=None):
+        predicates, optional = list(predicates), list(optional or ())
         namespaces = {domain.namespace.code: domain.namespace}
-        for p in predicates:
+        for p in predicates + optional:
             namespaces[p.namespace.code] = p.namespace
-        select = 'select %s ' % u', '.join(['c.' + p.code for p in predicates])
+        select = 'select %s ' % u', '.join(['c.' + p.code for p in predicates] + 
+            ['optional c.' + p.code for p in optional])
         tables = 'from %s c ' % domain.code
         using =  'using ' + u', '.join(
             ['%s for "%s"' % (n.code, n.uri) for _, n in namespaces.items()])
@@ -298,8 +313,120 @@ class PredicateManager(RDFManager):
         return kwargs
 
 
+class StatementQuerySet(SPARQLQuerySet):
+
+    def __init__(self, *args, **kwargs):
+        super(StatementQuerySet, self).__init__(*args, **kwargs) # IGNORE:W0142
+        self._prefetch_objects = False
+
+    def prefetch_objects(self):
+        """
+        Returns a copy of the query set that resolves the objects of the
+        statements in bulk, as they are fetched. Statement.object then needs no
+        further queries.
+        """
+        c = self._clone()
+        c._prefetch_objects = True
+        return c
+
+    def iterator(self):
+        statements = super(StatementQuerySet, self).iterator()
+        return prefetch_objects(statements) \
+            if self._prefetch_objects else \
+            statements
+
+    def _clone(self, cls=None, **kwargs):
+        c = super(StatementQuerySet, self)._clone(cls, **kwargs) # IGNORE:W0142
+        c._prefetch_objects = self._prefetch_objects
+        return c
+
+
+def prefetch_objects(statements):
+    """
+    Generates the statements, with their predicates and objects resolved.
+
+    The statements are processed in chunks. The predicates of a chunk and their
+    ranges are fetched with one query each, and the objects with one IN query 
+    per range model:
+
+        Resource           - object_resource, by primary key
+        literal models     - by statement
+        mapped models      - by resource
+
+    A statement whose object is missing is left alone, and raises on access
+    just as before.
+    """
+    chunk = []
+    for s in statements:
+        chunk.append(s)
+        if _CHUNK_SIZE == len(chunk):
+            for prefetched in _prefetch_chunk(chunk):
+                yield prefetched
+            chunk = []
+    for prefetched in _prefetch_chunk(chunk):
+        yield prefetched
+
+
+def _prefetch_chunk(statements):
+    from rdf.models import Concept, Predicate, Resource
+    if not statements:
+        return statements
+    predicates = Predicate.objects.in_bulk( # IGNORE:E1101
+        list(set([s.predicate_id for s in statements])))
+    # Predicate.range is nullable, which select_related() doesn't follow:
+    ranges = Concept.objects.in_bulk( # IGNORE:E1101
+        list(set([p.range_id for p in predicates.values() if p.range_id])))
+    for p in predicates.values():
+        p._range_cache = ranges.get(p.range_id) # IGNORE:W0212
+    groups = {}
+    for s in statements:
+        p = predicates[s.predicate_id]
+        s._predicate_cache = p # IGNORE:W0212
+        Range = p.Range
+        if not Range:
+            s._Statement__object = None # IGNORE:W0212
+        else:
+            groups.setdefault(Range, []).append(s)
+    for Range, members in groups.items():
+        if Resource == Range:
+            keys = [s.object_resource_id for s in members if s.object_resource_id]
+            objects = Range.objects.in_bulk(keys) # IGNORE:E1101
+            for s in members:
+                if s.object_resource_id is None:
+                    s._Statement__object = None # IGNORE:W0212
+                elif objects.has_key(s.object_resource_id):
+                    s._object_resource_cache = \
+                        s._Statement__object = objects[s.object_resource_id] # IGNORE:W0212
+            continue
+        # Literal objects reference their statement, mapped objects are 
+        # referenced through object_resource:
+        by_resource = [s for s in members if s.object_resource_id]
+        by_statement = [s for s in members if not s.object_resource_id]
+        if by_resource:
+            found = dict([(o.resource_id, o) for o in Range.objects.filter( # IGNORE:E1101
+                resource__in=[s.object_resource_id for s in by_resource])])
+            for s in by_resource:
+                if found.has_key(s.object_resource_id):
+                    s._Statement__object = found[s.object_resource_id] # IGNORE:W0212
+        if by_statement:
+            found = dict([(o.statement_id, o) for o in Range.objects.filter( # IGNORE:E1101
+                statement__in=[s.pk for s in by_statement])])
+            for s in by_statement:
+                if found.has_key(s.pk):
+                    o = found[s.pk]
+                    o._statement_cache = s # IGNORE:W0212
+                    s._Statement__object = o # IGNORE:W0212
+    return statements
+
+
 class StatementManager(RDFManager):
 
+    def get_query_set(self):
+        return StatementQuerySet(self.model)
+
+    def prefetch_objects(self):
+        return self.get_query_set().prefetch_objects()
+
     def __gettype(self):
         if not hasattr(self, '_StatementManager__type'):
             from rdf.models import Namespace, Concept
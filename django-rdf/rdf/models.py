@@ -22,20 +22,98 @@ Names are globally unique or unique within a namespace. Codes are less restricte
 
 from contextlib import contextmanager
 from datetime import date, datetime
+from threading import local
 
+from django.db import connection, transaction
 from django.db.models import Manager, Model, BooleanField, CharField, DateField, \
     DateTimeField, DecimalField, EmailField, FloatField, IntegerField, TextField, \
-    ManyToManyField, Q, get_model, get_models
+    ManyToManyField, Q, get_models, signals
 from django.db.models.fields.related import ForeignKey
 from django.dispatch import dispatcher
 
 from rdf.managers import \
     NamespaceManager, OntologyManager, PredicateManager, ResourceManager, \
     StatementManager, ConceptManager
-from rdf.shortcuts import import_class
+from rdf.identity import memoized, related
+from rdf.shortcuts import import_class, import_field, reset_imports
 from django.db.models.query import EmptyQuerySet
 
 
+# Sent once when the outermost bulk_changes context exits, with a `changes` 
+# keyword argument mapping each affected model to the primary keys saved or
+# deleted:
+bulk_post_save = object()
+
+# Sent instead of bulk_post_save when the outermost context exits with an
+# exception, with the same `changes` argument. The changes may or may not have
+# been rolled back, so caches should be discarded on either signal:
+bulk_aborted = object()
+
+_bulk = local() # Per thread: the depth of bulk_changes contexts, and the changes
+
+
+def _bulk_state():
+    if not hasattr(_bulk, 'changes'):
+        _bulk.depth, _bulk.changes = 0, {} # Model -> set of primary keys
+    return _bulk
+
+
+def bulk_active():
+    """
+    True if a bulk_changes context is active in the current thread.
+    """
+    return 0 < _bulk_state().depth
+
+
+@contextmanager
+def bulk_changes():
+    """
+    Coalesces the signals sent while saving ontology elements and statements in bulk. 
+    The per-instance post_save signals of Namespace, Concept and Predicate are 
+    suppressed within the context, and when the outermost context exits a single 
+    bulk_post_save signal is sent instead. If the context exits with an exception
+    bulk_aborted is sent instead of bulk_post_save.
+
+    The context is per thread, so changes saved by other threads are signalled as
+    usual.
+    """
+    state = _bulk_state()
+    state.depth += 1
+    try:
+        yield
+    except:
+        state.depth -= 1
+        if not state.depth:
+            changes, state.changes = state.changes, {}
+            dispatcher.send(signal=bulk_aborted, changes=changes)
+        raise
+    state.depth -= 1
+    if not state.depth:
+        changes, state.changes = state.changes, {}
+        if changes:
+            dispatcher.send(signal=bulk_post_save, changes=changes)
+
+
+def _post_save(instance):
+    """
+    Sends the post_save signal of the instance's model, unless the change is 
+    being coalesced by bulk_changes.
+    """
+    if not bulk_active():
+        dispatcher.send(signal=instance.post_save, sender=instance.__class__, instance=instance)
+
+
+def _record(sender, instance): # IGNORE:W0613
+    """
+    Records the instance saved or deleted within bulk_changes.
+    """
+    if bulk_active():
+        _bulk.changes.setdefault(instance.__class__, set()).add(instance.pk)
+
+dispatcher.connect(_record, signal=signals.post_save)
+dispatcher.connect(_record, signal=signals.post_delete)
+
+
 class Resource(Model): 
 
     namespace = ForeignKey(
@@ -61,26 +139,33 @@ class Resource(Model):
         return self.code
 
     def __eq__(self, other):
-        return type(self) == type(other) \
-            and self.namespace == other.namespace \
-            and self.name == other.name
+        if type(self) != type(other) or self.name != other.name:
+            return False
+        # Compare the keys, if available, to avoid fetching the namespaces:
+        if self.namespace_id is not None and other.namespace_id is not None: # IGNORE:E1101
+            return self.namespace_id == other.namespace_id # IGNORE:E1101
+        return self.namespace == other.namespace
 
     def __hash__(self):
-        return hash(unicode(self).lower())
+        return hash(self.name.lower()) # IGNORE:E1101
 
+    @memoized
     def _geturi(self):
-        return u''.join((self.namespace.uri, self.name)) if self.namespace else self.name # IGNORE:E1101
+        namespace = related(self, 'namespace')
+        return u''.join((namespace.uri, self.name)) if namespace else self.name # IGNORE:E1101
     uri = property(_geturi)
 
     def get_absolute_url(self):
         return self.uri
 
+    @memoized
     def __getcode(self):
-        return u':'.join((self.namespace.code, self.name)) if self.namespace else self.name # IGNORE:E1101
+        namespace = related(self, 'namespace')
+        return u':'.join((namespace.code, self.name)) if namespace else self.name # IGNORE:E1101
     code = property(__getcode)
 
     def __getmangled(self):
-        prefix = self.namespace.mangled # IGNORE:E1101
+        prefix = related(self, 'namespace').mangled # IGNORE:E1101
         suffix = self.name
         return u'%s__%s' % (prefix, suffix)
     mangled = property(__getmangled)
@@ -149,14 +234,15 @@ class Namespace(Model):
 
     def save(self):
         super(self.__class__, self).save()
-        dispatcher.send(signal=self.post_save, sender=self.__class__, instance=self)
+        _post_save(self)
 
     def __getname(self):
-        return self.resource.name # IGNORE:E1101
+        return related(self, 'resource').name # IGNORE:E1101
     name = property(__getname)
 
+    @memoized
     def __geturi(self):
-        return self.resource.uri # IGNORE:E1101
+        return related(self, 'resource').uri # IGNORE:E1101
     uri = property(__geturi)
 
     def get_absolute_url(self):
@@ -228,12 +314,13 @@ class Ontology(Model):
     def __unicode__(self):
         return self.namespace.code
     
+    @memoized
     def __getnamespace(self):
-        return Namespace.objects.get(resource=self.resource)
+        return Namespace.objects.get(resource=self.resource_id) # IGNORE:E1101
     namespace = property(__getnamespace)
     
     def __getname(self):
-        return self.resource.name
+        return related(self, 'resource').name
     name = property(__getname)
     
     def __getcode(self):
@@ -241,7 +328,7 @@ class Ontology(Model):
     code = property(__getcode)
     
     def __geturi(self):
-        return self.resource.name # IGNORE:E1101
+        return related(self, 'resource').name # IGNORE:E1101
     uri = property(__geturi)
     
     def __getconcepts(self):
@@ -309,28 +396,29 @@ class Concept(Model):
             'type must be associated with a real model, not %s' % self.model_name
         # Save, signal and... done:
         super(self.__class__, self).save()
-        dispatcher.send(signal=self.post_save, sender=self.__class__, instance=self)
+        _post_save(self)
 
     def __getnamespace(self):
         """
         Returns the namespace this concept belongs to. 
         """
-        return self.resource.namespace # IGNORE:E1101
+        return related(related(self, 'resource'), 'namespace') # IGNORE:E1101
     namespace = property(__getnamespace)
 
     def __getname(self):
         """
         Returns the local name of the concept, without the containing namespace.
         """
-        return self.resource.name
+        return related(self, 'resource').name
     name = property(__getname)
 
+    @memoized
     def __getontology(self):
         """
         Returns the ontology this concept belongs to. 
         """
         try:
-            return Ontology.objects.get(resource=self.namespace.resource) # IGNORE:E1101
+            return Ontology.objects.get(resource=self.namespace.resource_id) # IGNORE:E1101
         except Ontology.DoesNotExist: # IGNORE:E1101
             return None
     ontology = property(__getontology)
@@ -356,6 +444,14 @@ class Concept(Model):
         return self.Model is Resource or self.literal
     generic = property(__isgeneric)
     
+    def __getdbtable(self):
+        """
+        Returns the name of the database table storing the resources of this 
+        concept.
+        """
+        return self.Model._meta.db_table # IGNORE:W0212
+    db_table = property(__getdbtable)
+    
     def __getpkcolumn(self):
         """
         Returns the name of the database column containing the primary key for 
@@ -364,6 +460,7 @@ class Concept(Model):
         return self.Model._meta.pk.attname # IGNORE:W0212
     pk_column = property(__getpkcolumn)
 
+    @memoized
     def __getcode(self):
         """
         Returns the qualified name of the concept instance, consisting of the 
@@ -373,14 +470,14 @@ class Concept(Model):
     code = property(__getcode)
     
     def __getmangled(self):
-        return self.resource.mangled # IGNORE:E1101
+        return related(self, 'resource').mangled # IGNORE:E1101
     mangled = property(__getmangled)
 
     def __geturi(self):
         """
         Returns the URI for the concept instance.
         """
-        return self.resource.uri # IGNORE:E1101
+        return related(self, 'resource').uri # IGNORE:E1101
     uri = property(__geturi)
 
     def get_absolute_url(self):
@@ -456,6 +553,17 @@ class Concept(Model):
         return getattr(self, '_optional_predicates')
     optional_predicates = property(__get_optional_predicates)
     
+    def __get_optional_literals(self):
+        """
+        Returns all predicates with the concept instance as the domain and a 
+        literal range, that may be omitted from resources of that concept.
+        """
+        if not hasattr(self, '_optional_literals'):
+            setattr(self, '_optional_literals', 
+                    self.get_predicates(mandatory=False, literal=True))
+        return getattr(self, '_optional_literals')
+    optional_literals = property(__get_optional_literals)
+    
     def __get_reverse_predicates(self):
         if not hasattr(self, '_reverse_predicates'):
             setattr(self, '_reverse_predicates', 
@@ -488,6 +596,48 @@ class Concept(Model):
 from rdf.permissions import update_type_permissions
 dispatcher.connect(update_type_permissions, sender=Concept, signal=Concept.post_save)
 
+from rdf.query.query import reset_compiled
+from rdf.query.resolve import reset_paths
+dispatcher.connect(reset_paths, sender=Concept, signal=Concept.post_save)
+dispatcher.connect(reset_paths, sender=Concept, signal=signals.post_delete)
+dispatcher.connect(reset_compiled, sender=Concept, signal=Concept.post_save)
+dispatcher.connect(reset_compiled, sender=Concept, signal=signals.post_delete)
+
+
+class _ResettingDescriptor(object):
+    """
+    Wraps the descriptor of the bases relation between concepts, so that changes 
+    made through the related managers, or by assigning the relation, discard the 
+    predicate graph and the compiled queries. Django sends no signal when the 
+    rows of a many-to-many relation are added or removed.
+    """
+    
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        
+    def __get__(self, instance, owner):
+        manager = self.descriptor.__get__(instance, owner)
+        if not instance is None:
+            for name in ('add', 'remove', 'clear'):
+                setattr(manager, name, _resetting(getattr(manager, name)))
+        return manager
+    
+    def __set__(self, instance, value):
+        self.descriptor.__set__(instance, value)
+        reset_paths()
+        reset_compiled()
+
+
+def _resetting(method):
+    def reset(*args, **kwargs):
+        method(*args, **kwargs) # IGNORE:W0142
+        reset_paths()
+        reset_compiled()
+    return reset
+
+Concept.bases = _ResettingDescriptor(Concept.__dict__['bases'])
+Concept.derived = _ResettingDescriptor(Concept.__dict__['derived'])
+
 
 CARDINALITIES = (
     ('1',  'Predicate is applied to every resource'),
@@ -553,6 +703,9 @@ class Predicate(Model):
     # Absolute name, e.g. <Model name>.<field name>
     field_name = CharField(max_length=63, null=True, blank=True, db_index=True) 
 
+    # True iff the predicate is a span, maintained by the _SpanSegment model
+    is_span = BooleanField(default=False, editable=False, db_index=True)
+
     title = CharField(max_length=63, db_index=True)
     description = TextField()
 
@@ -579,21 +732,22 @@ class Predicate(Model):
 
     def save(self):
         super(self.__class__, self).save()
-        dispatcher.send(signal=self.post_save, sender=self.__class__, instance=self)
+        _post_save(self)
     
     def __getnamespace(self):
         """
         Returns the namespace of this predicate.
         """
-        return self.resource.namespace # IGNORE:E1101
+        return related(related(self, 'resource'), 'namespace') # IGNORE:E1101
     namespace = property(__getnamespace)
 
+    @memoized
     def __getontology(self):
         """
         Returns the ontology the predicate belongs to.
         """
         try:
-            return Ontology.objects.get(resource=self.namespace.resource) # IGNORE:E1101
+            return Ontology.objects.get(resource=self.namespace.resource_id) # IGNORE:E1101
         except Ontology.DoesNotExist: # IGNORE:E1101
             return None
     ontology = property(__getontology)
@@ -603,30 +757,32 @@ class Predicate(Model):
     internal = property(__getinternal)
 
     def __getname(self):
-        return self.resource.name
+        return related(self, 'resource').name
     name = property(__getname)
 
+    @memoized
     def __getcode(self):
         """
         Returns the code of the predicate, consisting of the namespace code and 
         the predicate name.
         """
-        return u':'.join((self.namespace.code, self.resource.name))
+        return u':'.join((self.namespace.code, self.name))
     code = property(__getcode)
 
+    @memoized
     def __getmangled(self):
         """
         Returns the mangled predicate code, suitable for using as a python 
         object attribute name with hasattr, getattr, setattr.
         """
-        return self.resource.mangled # IGNORE:E1101
+        return related(self, 'resource').mangled # IGNORE:E1101
     mangled = property(__getmangled)
 
     def __geturi(self):
         """
         Returns the full URI for the predicate.
         """
-        return self.resource.uri # IGNORE:E1101
+        return related(self, 'resource').uri # IGNORE:E1101
     uri = property(__geturi)
 
     def get_absolute_url(self):
@@ -685,18 +841,21 @@ class Predicate(Model):
         True if and only if the predicate instance is a span consisting of multiple 
         atomic predicates.
         """
-        return 0 < _SpanSegment.objects.filter(span=self).count()
+        return self.is_span
     span = property(__isspan)
     
     def __getsegments(self):
         """
-        Returns a query set containing the predicate segments of this span, or an 
-        empty query set if this instance is not a span.
+        Returns a tuple containing the predicate segments of this span, in order, 
+        or an empty tuple if this instance is not a span. The segments are loaded 
+        once per span and cached until the span's segments change.
         """
-        if not hasattr(self, '_segments'):
-            setattr(self, '_segments', 
-                _SpanSegment.objects.filter(span=self).order_by('ordinal'))
-        return getattr(self, '_segments')
+        if not self.is_span:
+            return ()
+        if not _segments.has_key(self.pk):
+            _segments[self.pk] = tuple([s.predicate for s in _SpanSegment.objects.\
+                filter(span=self).order_by('ordinal').select_related()])
+        return _segments[self.pk]
     segments = property(__getsegments)
     
     def __getfield(self):
@@ -713,12 +872,22 @@ class Predicate(Model):
             else:
                 f = Statement._meta.get_field('object_resource') # IGNORE:E1101
         else:
-            _ = self.field_name.split('.') # IGNORE:E1101
-            app_label, model_name, field_name = _[-4].lower(), _[-2], _[-1]
-            f = get_model(app_label, model_name)._meta.get_field(field_name) # IGNORE:W0212
+            f = import_field(self.field_name)
         return f
     field = property(__getfield)
     
+    def __getdbtable(self):
+        """
+        Returns the name of the database table containing the field that stores 
+        the objects of statements using this predicate.
+        """
+        if self.field_name is None:
+            Model = self.range.Model if self.literal is True else Statement # IGNORE:E1101
+        else:
+            Model = import_class(self.field_name[:self.field_name.rindex('.')]) # IGNORE:E1101
+        return Model._meta.db_table # IGNORE:W0212
+    db_table = property(__getdbtable)
+    
     def __getdbcolumn(self):
         """
         Returns the name of the underlying database column.
@@ -770,13 +939,30 @@ class Predicate(Model):
     locate_resource = classmethod(locate_resource)
 
 
-from rdf.permissions import update_predicate_permissions
+from rdf.permissions import update_predicate_permissions, update_bulk_permissions
 dispatcher.connect(update_predicate_permissions, sender=Predicate, signal=Predicate.post_save)
+dispatcher.connect(update_bulk_permissions, signal=bulk_post_save)
+
+dispatcher.connect(reset_paths, sender=Predicate, signal=Predicate.post_save)
+dispatcher.connect(reset_paths, sender=Predicate, signal=signals.post_delete)
+dispatcher.connect(reset_paths, signal=bulk_post_save)
+dispatcher.connect(reset_compiled, sender=Predicate, signal=Predicate.post_save)
+dispatcher.connect(reset_compiled, sender=Predicate, signal=signals.post_delete)
+dispatcher.connect(reset_compiled, signal=bulk_post_save)
+
+dispatcher.connect(reset_imports, signal=signals.class_prepared)
+
+
+_segments = {} # Span primary key -> tuple of segment predicates
 
 
 class _SpanSegment(Model):
     """
-    Internal model for tracking the composition of spanning predicates.
+    Internal model for tracking the composition of spanning predicates. Spans 
+    are no longer created (property paths are resolved at compile time), so the 
+    segments are read from legacy databases, where rdfupgrade sets the is_span 
+    flags. Segments saved or deleted directly still keep the flag of their span 
+    up to date.
     """
     
     span = ForeignKey(Predicate, related_name='spans')
@@ -790,10 +976,34 @@ class _SpanSegment(Model):
             raise Exception('Invalid span - contains another span (%s)' % self.predicate)
         else:
             super(_SpanSegment, self).save()
+            self._update_span()
+            
+    def delete(self):
+        super(_SpanSegment, self).delete()
+        self._update_span()
             
     def __unicode__(self):
         return u' '.join((self.span.code, self.predicate.code, unicode(self.ordinal))) # IGNORE:E1101
 
+    def _update_span(self):
+        """
+        Brings the is_span flag of the span up to date, and discards its cached 
+        segments. The flag is updated directly in the database to avoid sending 
+        the predicate signals.
+        """
+        is_span = 0 < _SpanSegment.objects.filter(span=self.span_id).count()
+        qn, opts = connection.ops.quote_name, Predicate._meta # IGNORE:W0212
+        cursor = connection.cursor() # IGNORE:E1101
+        cursor.execute('UPDATE %s SET %s = %%s WHERE %s = %%s' % (qn(opts.db_table), 
+            qn(opts.get_field('is_span').column), qn(opts.pk.column)), 
+            [is_span, self.span_id])
+        transaction.commit_unless_managed()
+        if hasattr(self, '_span_cache'):
+            self.span.is_span = is_span
+        _segments.pop(self.span_id, None)
+        reset_paths()
+        reset_compiled()
+
 
 class Statement(Model):
     """
@@ -990,6 +1200,54 @@ class String(Model, Literal):
         return hash(self.value)
 
 
+class SlowQuery(Model):
+    """
+    Aggregated statistics for RDQL queries that exceeded the slow-query threshold, 
+    one row per query fingerprint. Maintained by rdf.slowlog. 
+    """
+    
+    fingerprint = CharField(max_length=32, unique=True)
+    rdql = TextField() # Normalized, with constants stripped
+    sql = TextField() # From the most recent execution
+    params = TextField() # The constants of the most recent execution
+    
+    calls = IntegerField(default=0)
+    rows = IntegerField(default=0)
+    total_time = FloatField(default=0) # Seconds, including compilation
+    compile_time = FloatField(default=0)
+    execute_time = FloatField(default=0)
+    max_time = FloatField(default=0)
+    
+    first_seen = DateTimeField(default=datetime.now)
+    last_seen = DateTimeField(default=datetime.now, db_index=True)
+    
+    objects = Manager()
+    
+    class Admin: # IGNORE:W0232
+        list_display = ('fingerprint', 'calls', 'total_time', 'max_time', 'rows', 'last_seen')
+        search_fields = ('rdql',)
+        ordering = ('-total_time',)
+        
+    class Meta: # IGNORE:W0232
+        verbose_name = 'Slow query'
+        verbose_name_plural = 'Slow queries'
+        
+    def __unicode__(self):
+        return self.rdql
+
+
+from rdf.describe import changed as description_changed, \
+    bulk_changed as descriptions_bulk_changed
+dispatcher.connect(description_changed, signal=signals.post_save)
+dispatcher.connect(description_changed, signal=signals.post_delete)
+dispatcher.connect(descriptions_bulk_changed, signal=bulk_post_save)
+dispatcher.connect(descriptions_bulk_changed, signal=bulk_aborted)
+
+from rdf.query.cache import bulk_changed as results_bulk_changed
+dispatcher.connect(results_bulk_changed, signal=bulk_post_save)
+dispatcher.connect(results_bulk_changed, signal=bulk_aborted)
+
+
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.
 # 
@@ -1,4 +1,9 @@
+from __future__ import with_statement
+from contextlib import contextmanager
+from threading import local
+
 from django.contrib.auth.models import ContentType, Permission
+from django.db import connection, transaction
 
 
 def _permission_code(instance, suffix):
@@ -11,11 +16,32 @@ def _permission_name(instance, prefix):
 CODES_AND_NAMES = (('r', 'Read'), ('w', 'Write'), ('x', 'Execute'))
 
 
+_content_types = {} # (app label, model name) -> content type
+_deferred = local() # Per thread: the depth of deferred_permissions contexts, and the queue
+
+_CHUNK_SIZE = 500 # Keeps IN clauses below the SQLite limit on query parameters
+
+
+def _deferred_state():
+    if not hasattr(_deferred, 'pending'):
+        _deferred.depth, _deferred.pending = 0, {} # content type id -> {code: name}
+    return _deferred
+
+
+def _content_type(instance):
+    key = (instance._meta.app_label, instance._meta.object_name.lower()) # IGNORE:W0212
+    if not _content_types.has_key(key):
+        _content_types[key] = ContentType.objects.get(app_label=key[0], model=key[1])
+    return _content_types[key]
+
+
 def update_RDF_permissions(instance):
     # Get the Django content type for the Concept model, 
     # then create a permission name that uniquely identifies the type and the action - 
-    ct = ContentType.objects.get(
-        app_label=instance._meta.app_label, model=instance._meta.object_name.lower()) # IGNORE:W0212
+    ct = _content_type(instance)
+    if _deferred_state().depth:
+        _queue(ct, instance.code, instance.title)
+        return
     for code, name in CODES_AND_NAMES:
         _update_RDF_permission(instance, ct, code, name)
 
@@ -28,6 +54,61 @@ def _update_RDF_permission(instance, content_type, code_suffix, name_prefix):
         Permission.objects.create(content_type=content_type, codename=code, name=name) # IGNORE:E1101
 
 
+def _queue(content_type, code, title):
+    codes = _deferred.pending.setdefault(content_type.id, {})
+    for suffix, prefix in CODES_AND_NAMES:
+        codes[u':'.join((code, suffix))] = u' '.join((prefix, title))
+
+
+@contextmanager
+def deferred_permissions():
+    """
+    Defers permission provisioning for the ontology elements saved within the 
+    context, which is useful for bulk loads such as syncvb. The signal handlers 
+    only queue permission codes while the context is active, and the missing 
+    permissions are inserted when the outermost context exits. The queue is 
+    discarded if the context exits with an exception. Each thread has its own 
+    contexts and queue.
+    """
+    state = _deferred_state()
+    state.depth += 1
+    try:
+        yield
+    except:
+        state.depth -= 1
+        if not state.depth:
+            state.pending.clear()
+        raise
+    state.depth -= 1
+    if not state.depth:
+        sync_permissions()
+        
+
+def sync_permissions():
+    """
+    Inserts the permissions queued in the current thread that are not already in 
+    the database. Takes one query per content type to find the existing 
+    permission codes, and one bulk insert for the rest.
+    """
+    pending = _deferred_state().pending
+    rows = []
+    for ct, codes in pending.items():
+        existing = set([_['codename'] for _ in \
+            Permission.objects.filter(content_type__pk=ct).values('codename')]) # IGNORE:E1101
+        for code in set(codes.keys()) - existing:
+            rows.append((codes[code], ct, code))
+    pending.clear()
+    if not rows:
+        return
+    qn, opts = connection.ops.quote_name, Permission._meta # IGNORE:W0212,E1101
+    columns = [qn(opts.get_field(f).column) for f in ('name', 'content_type', 'codename')]
+    sql = 'INSERT INTO %s (%s) VALUES (%%s, %%s, %%s)' \
+        % (qn(opts.db_table), ', '.join(columns))
+    cursor = connection.cursor() # IGNORE:E1101
+    cursor.executemany(sql, rows)
+    transaction.commit_unless_managed()
+
+
 def update_namespace_permissions(instance):
     update_RDF_permissions(instance)
     
@@ -38,6 +119,29 @@ def update_type_permissions(instance):
 
 def update_predicate_permissions(instance):
     update_RDF_permissions(instance)
+    
+
+def update_bulk_permissions(changes):
+    """
+    Provisions permissions for the namespaces, concepts and predicates saved 
+    within rdf.models.bulk_changes. The namespace codes are loaded up front, so 
+    the codes of the concepts and predicates take no query per instance.
+    """
+    from rdf.models import Namespace, Concept, Predicate
+    namespaces = dict([(n['id'], n['code']) for n in \
+        Namespace.objects.values('id', 'code')]) # IGNORE:E1101
+    with deferred_permissions():
+        for Model in (Namespace, Concept, Predicate):
+            pks = list(changes.get(Model, ()))
+            for i in range(0, len(pks), _CHUNK_SIZE):
+                for instance in Model.objects.select_related().filter( # IGNORE:E1101
+                    pk__in=pks[i:i+_CHUNK_SIZE]):
+                    if Model is Namespace:
+                        code = instance.code
+                    else:
+                        resource = instance.resource
+                        code = u':'.join((namespaces[resource.namespace_id], resource.name))
+                    _queue(_content_type(instance), code, instance.title)
 
 
 # Copyright (c) 2008, Stefan B Sigurdsson
@@ -110,6 +110,15 @@ class Constraints(list):
         return str(unicode(self))
 
 
+class Orderings(list):
+    
+    def __unicode__(self):
+        return u'\n'.join(['Orderings:'] + [unicode(o) for o in self])
+
+    def __str__(self):
+        return str(unicode(self))
+
+
 class Reference(object):
     
     def __init__(self):
@@ -200,7 +209,11 @@ class Variable(object):
     
     DEFAULT_NAME = '_'
     
-    def __init__(self, name, concept=None, predicates=None, position=None):
+    def __init__(self, name, concept=None, predicates=None, position=None, optional=False):
+        """
+        Variables synthesized for optional predicates are optional themselves, and 
+        are joined with outer joins.
+        """
         from rdf.models import Concept
         self.name = name
         if isinstance(concept, Concept):
@@ -208,6 +221,7 @@ class Variable(object):
         self._concept = concept
         self.predicates = predicates if not predicates is None else []
         self.position = position
+        self.optional = optional
         
     def _get_concept(self):
         return self._concept
@@ -230,14 +244,37 @@ class Variable(object):
     
 class PredicateRef(Reference):
     
+    AGGREGATES = ('count', 'sum', 'min', 'max', 'avg')
+    
     def __init__(self, 
-        name=None, namespace=None, variable=None, binding=None, position=None):
+        name=None, namespace=None, variable=None, binding=None, position=None, 
+        path=None, optional=False, aggregate=None, closure=None, depth=None):
         """
         Supply either name and namespace, or binding. If a binding is supplied 
         then name and namespace parameters will be ignored.
+        
+        A reference to a dotted property path such as x.n:a.n:b.n:c carries the 
+        references to its segments in `path`, and is named after the last segment.
+        
+        An optional predicate doesn't restrict the results; its value is NULL for 
+        subjects it doesn't apply to.
+        
+        The values of an aggregated predicate are folded by one of the AGGREGATES 
+        for each group of results.
+        
+        A transitive predicate in a constraint relates each subject to the objects 
+        reached by applying the predicate repeatedly: one or more times if the 
+        closure is '+', zero or more times if it is '*', and at most `depth` 
+        times if a depth is given.
         """
         super(self.__class__, self).__init__()
         self._variable = variable
+        self.path = path
+        self.optional = optional
+        assert aggregate is None or aggregate in self.AGGREGATES
+        self.aggregate = aggregate
+        assert closure in (None, '+', '*')
+        self.closure, self.depth = closure, depth
         if binding is None:
             self.name = name
             self.namespace = namespace
@@ -264,7 +301,13 @@ class PredicateRef(Reference):
     code = property(_get_code)
     
     def __unicode__(self):
-        s = u'%s, variable: {%s}' % (self.code, self._variable)
+        code = self.code if self.path is None else \
+            u'.'.join([p.code for p in self.path])
+        if self.aggregate:
+            code = u'%s(%s)' % (self.aggregate, code)
+        if self.closure:
+            code += self.closure + (self.depth and u'{%s}' % self.depth or u'')
+        s = u'%s, variable: {%s}' % (code, self._variable)
         if self.position: 
             s += ', ' + unicode(self.position)
         return s
@@ -273,9 +316,45 @@ class PredicateRef(Reference):
         return str(unicode(self))
 
 
+class Constant(object):
+    """
+    A constant in an RDQL constraint. The value is converted to the type of the 
+    constrained predicate's values when the constraint is bound.
+    """
+    
+    def __init__(self, value, position=None):
+        self.value = value
+        self.position = position
+        
+    def __unicode__(self):
+        if isinstance(self.value, basestring):
+            return u'"%s"' % self.value
+        return unicode(self.value)
+    
+    def __str__(self):
+        return str(unicode(self))
+
+
 class Constraint(object):
     
-    def __init__(self, subject, predicate, object, position=None):
+    # RDQL comparison operators, and the SQL they compile to:
+    OPERATORS = {
+        '=': '=', 
+        '!=': '<>', 
+        '<>': '<>', 
+        '<': '<', 
+        '<=': '<=', 
+        '>': '>', 
+        '>=': '>=', 
+        'like': 'like', 
+        'in': 'in',
+    }
+    
+    def __init__(self, subject, predicate, object, position=None, operator='='):
+        """
+        The object of a constraint using the `in` operator is a list of constants. 
+        Only constants may be compared using operators other than `=`.
+        """
         from rdf.models import Predicate
         self.subject = subject
         if isinstance(predicate, PredicateRef):
@@ -283,12 +362,38 @@ class Constraint(object):
         elif isinstance(predicate, Predicate):
             self.predicate = PredicateRef(binding=predicate)
         assert isinstance(self.predicate, PredicateRef)
+        assert self.OPERATORS.has_key(operator)
         self.object = object
         self.position = position
+        self.operator = operator
                 
+    def __unicode__(self):
+        o = self.object
+        if isinstance(o, list):
+            o = u'(%s)' % u', '.join([unicode(c) for c in o])
+        return u' '.join([unicode(i) for i in \
+            (self.subject, self.predicate, self.operator, o, self.position)])
+    
+    def __str__(self):
+        return str(unicode(self))
+
+
+class Ordering(object):
+    
+    def __init__(self, predicate, descending=False, position=None):
+        """
+        Orders the results by the values of the predicate. The predicate is either 
+        one of the selected predicates, or an optional predicate that is joined 
+        for the ordering alone.
+        """
+        assert isinstance(predicate, PredicateRef)
+        self.predicate = predicate
+        self.descending = descending
+        self.position = position
+        
     def __unicode__(self):
         return u' '.join([unicode(i) for i in \
-            (self.subject, self.predicate, self.object, self.position)])
+            (self.predicate, self.descending and u'desc' or u'asc', self.position)])
     
     def __str__(self):
         return str(unicode(self))
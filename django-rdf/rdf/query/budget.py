@@ -0,0 +1,256 @@
+"""
+Time and row budgets for RDQL query execution.
+
+A budget limits how long a compiled query may run in the database and how many
+rows it may return. The time budget is enforced by the database backend itself,
+so that a runaway query is cancelled rather than left running:
+
+    PostgreSQL - statement_timeout
+    SQLite     - a progress handler that interrupts the query
+    MySQL      - max_execution_time (MySQL 5.7.8 and later)
+
+Other backends run without a time budget. The row budget is enforced while the
+rows are fetched.
+
+Default budgets apply to every query, and are set in the project settings:
+
+    RDF_QUERY_TIMEOUT = 5000    # milliseconds
+    RDF_QUERY_MAX_ROWS = 10000
+
+Both default to None (no budget). Code that needs a different budget, such as a
+view serving user queries, can override the defaults for a block:
+
+    with budget(timeout=1000, max_rows=500):
+        ...
+"""
+
+from __future__ import with_statement
+from contextlib import contextmanager
+from threading import local
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.query import CHUNK_SIZE
+
+from rdf import instrumentation
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class QueryTimeout(BudgetExceeded):
+
+    def __init__(self, timeout, sql):
+        super(self.__class__, self).__init__(
+            'query cancelled after %s ms' % timeout)
+        self.timeout = timeout
+        self.sql = sql
+
+
+class RowLimitExceeded(BudgetExceeded):
+
+    def __init__(self, max_rows, sql):
+        super(self.__class__, self).__init__(
+            'query returned more than %s rows' % max_rows)
+        self.max_rows = max_rows
+        self.sql = sql
+
+
+_local = local()
+
+_SQLITE_PROGRESS_STEPS = 1000 # Virtual machine instructions between deadline checks
+
+
+@contextmanager
+def budget(timeout=None, max_rows=None):
+    """
+    Overrides the default budgets for queries executed by the current thread
+    within the context. None means no budget.
+    """
+    previous = getattr(_local, 'budget', None)
+    _local.budget = (timeout, max_rows)
+    try:
+        yield
+    finally:
+        _local.budget = previous
+
+
+def _current():
+    b = getattr(_local, 'budget', None)
+    if b is None:
+        b = (getattr(settings, 'RDF_QUERY_TIMEOUT', None),
+             getattr(settings, 'RDF_QUERY_MAX_ROWS', None))
+    return b
+
+
+def active():
+    """
+    True if a time or row budget applies to the current thread.
+    """
+    timeout, max_rows = _current()
+    return bool(timeout or max_rows)
+
+
+def fetch(sql, params=(), count_rows=True):
+    """
+    Executes the SQL query with the parameters and returns its rows, within the 
+    current budgets. The row budget is ignored unless `count_rows` is true.
+    """
+    rows = []
+    for chunk in chunks(sql, params, count_rows):
+        rows.extend(chunk)
+    return rows
+
+
+def chunks(sql, params=(), count_rows=True):
+    """
+    Executes the SQL query with the parameters and yields its rows in chunks, as 
+    they are fetched, within the current budgets. The query is executed when the 
+    first chunk is asked for, and the row budget, unless `count_rows` is false, 
+    is enforced as the chunks are fetched. 
+    """
+    timeout, max_rows = _current()
+    if not count_rows:
+        max_rows = None
+    engine = settings.DATABASE_ENGINE
+    if not timeout:
+        execute = _execute
+    elif engine.startswith('postgresql'):
+        execute = _execute_postgresql
+    elif 'sqlite3' == engine:
+        execute = _execute_sqlite
+    elif 'mysql' == engine:
+        execute = _execute_mysql
+    else:
+        execute = _execute
+    cursor = connection.cursor() # IGNORE:E1101
+    try:
+        for chunk in execute(cursor, sql, params, timeout, max_rows):
+            yield chunk
+    finally:
+        cursor.close()
+
+
+def _chunks(cursor, sql, max_rows, started, fetchmany=None):
+    """
+    Yields the rows in chunks as they are fetched. The rows are consumed between 
+    fetches, so only the fetches are timed.
+    """
+    fetchmany = fetchmany or cursor.fetchmany
+    fetching, count, first = 0.0, 0, True
+    while 1:
+        fetched = time.time()
+        chunk = fetchmany(CHUNK_SIZE)
+        fetching += time.time() - fetched
+        if first:
+            instrumentation.record('first row', started, sql=sql, rows=len(chunk))
+            first = False
+        if not chunk:
+            instrumentation.record('fetch', started, seconds=fetching, sql=sql, 
+                rows=count)
+            return
+        count += len(chunk)
+        if max_rows and max_rows < count:
+            raise RowLimitExceeded(max_rows, sql)
+        yield chunk
+
+
+def _execute_sql(cursor, sql, params):
+    """
+    Executes the query, and returns the time execution started.
+    """
+    with instrumentation.stage('execute', sql=sql) as m:
+        cursor.execute(sql, params)
+    return m.started
+
+
+def _execute(cursor, sql, params, timeout, max_rows): # IGNORE:W0613
+    started = _execute_sql(cursor, sql, params)
+    for chunk in _chunks(cursor, sql, max_rows, started):
+        yield chunk
+
+
+def _execute_postgresql(cursor, sql, params, timeout, max_rows):
+    # A failed statement aborts the transaction, which also reverts the SET:
+    cursor.execute('SET statement_timeout = %d' % timeout)
+    try:
+        started = _execute_sql(cursor, sql, params)
+    except Exception, x:
+        if not 'statement timeout' in str(x):
+            raise
+        transaction.rollback_unless_managed()
+        raise QueryTimeout(timeout, sql)
+    cursor.execute('SET statement_timeout = DEFAULT')
+    for chunk in _chunks(cursor, sql, max_rows, started):
+        yield chunk
+
+
+def _execute_sqlite(cursor, sql, params, timeout, max_rows):
+    # SQLite computes rows as they are fetched, so the handler is installed for 
+    # the execution and for each fetch, and the time spent in them is budgeted. 
+    # Queries run while the rows are consumed aren't interrupted:
+    db = connection.connection # IGNORE:E1101
+    remaining = [timeout / 1000.0]
+    def guarded(f, *args):
+        deadline = time.time() + remaining[0]
+        db.set_progress_handler(lambda: deadline < time.time(), _SQLITE_PROGRESS_STEPS)
+        try:
+            try:
+                return f(*args) # IGNORE:W0142
+            except Exception, x:
+                if not 'interrupted' in str(x):
+                    raise
+                raise QueryTimeout(timeout, sql)
+        finally:
+            db.set_progress_handler(None, 0)
+            remaining[0] = deadline - time.time()
+    started = guarded(_execute_sql, cursor, sql, params)
+    for chunk in _chunks(cursor, sql, max_rows, started, 
+        lambda size: guarded(cursor.fetchmany, size)):
+        yield chunk
+
+
+def _execute_mysql(cursor, sql, params, timeout, max_rows):
+    cursor.execute('SET SESSION max_execution_time = %d' % timeout)
+    try:
+        try:
+            started = _execute_sql(cursor, sql, params)
+        except Exception, x:
+            if not 'maximum statement execution time exceeded' in str(x).lower():
+                raise
+            raise QueryTimeout(timeout, sql)
+    finally:
+        cursor.execute('SET SESSION max_execution_time = DEFAULT')
+    for chunk in _chunks(cursor, sql, max_rows, started):
+        yield chunk
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
@@ -0,0 +1,227 @@
+"""
+Result cache for RDQL query sets.
+
+Rows are cached using the Django cache framework, keyed on the generated SQL
+(including the slice) and the current data versions of the tables the query
+touches. Every table has a version counter, which is bumped whenever an
+instance of a model stored in that table is saved or deleted. Bumping a version
+changes the keys of every cached query touching the table, so stale results are
+never returned and simply expire from the cache.
+
+The cache is disabled by default. To enable it, set the number of seconds to
+keep results in the project settings:
+
+    RDF_QUERY_CACHE_TIMEOUT = 300
+
+Only results of up to a thousand rows are cached, as a single value. Larger
+results are streamed from the database every time. The limit is set with:
+
+    RDF_QUERY_CACHE_MAX_ROWS = 1000
+
+Within rdf.models.bulk_changes the versions are bumped once per table, when the
+outermost context exits, rather than once per instance saved.
+
+Writes that bypass the Django models (raw SQL, other processes not using the
+cache) are not detected, and neither are concurrent writes to a table on cache
+backends without atomic increments (see bump).
+"""
+
+import md5, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import signals
+from django.dispatch import dispatcher
+
+
+_VERSION_KEY = 'rdf.query.version.%s'
+_ROWS_KEY = 'rdf.query.rows.%s'
+_COUNT_KEY = 'rdf.query.count.%s'
+_MODIFIED_KEY = 'rdf.query.modified.%s'
+
+# Versions outlive the results they tag, see _initial_version:
+_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def enabled():
+    return 0 < timeout()
+
+
+def tracking():
+    """
+    True if table data versions are being tracked, which is the case when the
+    result cache is enabled or when settings.RDF_CONDITIONAL_GET is true.
+    """
+    return enabled() or getattr(settings, 'RDF_CONDITIONAL_GET', False)
+
+
+def timeout():
+    return getattr(settings, 'RDF_QUERY_CACHE_TIMEOUT', 0)
+
+
+def max_rows():
+    return getattr(settings, 'RDF_QUERY_CACHE_MAX_ROWS', 1000)
+
+
+def _initial_version():
+    """
+    Versions start at the current time in milliseconds rather than at zero, so
+    that a version evicted from the cache is never reissued for the same table.
+    """
+    return int(time.time() * 1000)
+
+
+def versions(tables):
+    """
+    Returns the current data versions of the tables, in the order given.
+    """
+    keys = [_VERSION_KEY % t for t in tables]
+    found = cache.get_many(keys)
+    for k in keys:
+        if not found.has_key(k):
+            # Another process may be initializing or bumping the version:
+            cache.add(k, _initial_version(), _VERSION_TIMEOUT)
+            found[k] = cache.get(k)
+            if found[k] is None:
+                found[k] = _initial_version()
+    return [found[k] for k in keys]
+
+
+def bump(table):
+    """
+    Invalidates every cached result that depends on the table. 
+    
+    The version is incremented atomically where the cache backend supports it
+    (Django 1.1 and later). Otherwise two processes bumping the same table at 
+    once may both set the same version, so results read between the two writes
+    may be cached under the version that follows both. Those results are stale 
+    until they expire, so keep the timeout short on such backends.
+    
+    The time of the change is kept for the table, see modified.
+    """
+    cache.set(_MODIFIED_KEY % table, time.time(), _VERSION_TIMEOUT)
+    key = _VERSION_KEY % table
+    if cache.add(key, _initial_version(), _VERSION_TIMEOUT):
+        return
+    if hasattr(cache, 'incr'):
+        try:
+            cache.incr(key)
+            return
+        except ValueError:
+            pass # Evicted since the add
+    version = cache.get(key)
+    version = _initial_version() if version is None else \
+        max(version + 1, _initial_version())
+    cache.set(key, version, _VERSION_TIMEOUT)
+
+
+def modified(tables):
+    """
+    Returns the latest time, in seconds since the epoch, at which the version of 
+    any of the tables was bumped. Tables whose changes aren't known, because 
+    they haven't changed since the versions were first tracked or because the 
+    time was evicted from the cache, count as changed when first asked about, 
+    so the time returned is never earlier than the last change. 
+    """
+    keys = [_MODIFIED_KEY % t for t in tables]
+    found = cache.get_many(keys)
+    for k in keys:
+        if not found.has_key(k):
+            cache.add(k, time.time(), _VERSION_TIMEOUT)
+            found[k] = cache.get(k) or time.time()
+    return max([0] + found.values())
+
+
+def _key(template, sql, tables, params):
+    tables = sorted(tables)
+    tagged = u'\n'.join([sql] + [repr(p) for p in params] + 
+        [u'%s:%s' % _ for _ in zip(tables, versions(tables))])
+    return template % md5.new(tagged.encode('utf-8')).hexdigest()
+
+
+def rows_key(sql, tables, params=()):
+    """
+    Returns the key of the cached rows for the SQL query and its parameters, 
+    tagged with the current versions of the tables. The key should be computed 
+    once, before the query is executed, and used both to look up and to cache its 
+    rows. A key computed after executing the query may carry a version bumped 
+    meanwhile, and tag rows read before the change with it.
+    """
+    return _key(_ROWS_KEY, sql, tables, params)
+
+
+def count_key(sql, tables, params=()):
+    """
+    Returns the key of the cached count for the SQL count query, see rows_key.
+    """
+    return _key(_COUNT_KEY, sql, tables, params)
+
+
+def get_rows(key):
+    """
+    Returns the cached rows for the key, or None.
+    """
+    return cache.get(key)
+
+
+def set_rows(key, rows):
+    cache.set(key, rows, timeout())
+
+
+def get_count(key):
+    """
+    Returns the cached count for the key, or None.
+    """
+    return cache.get(key)
+
+
+def set_count(key, count):
+    cache.set(key, count, timeout())
+
+
+def _changed(sender, instance): # IGNORE:W0613
+    from rdf.models import bulk_active
+    if tracking() and not bulk_active():
+        bump(instance._meta.db_table) # IGNORE:W0212
+
+
+def bulk_changed(changes):
+    """
+    Bumps the versions of the tables changed within rdf.models.bulk_changes,
+    once per table.
+    """
+    if tracking():
+        for table in sorted(set([M._meta.db_table for M in changes])): # IGNORE:W0212
+            bump(table)
+
+dispatcher.connect(_changed, signal=signals.post_save)
+dispatcher.connect(_changed, signal=signals.post_delete)
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
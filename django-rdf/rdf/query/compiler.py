@@ -5,7 +5,8 @@ Instantiates a ply lexer and parser to generate an abstract syntax tree,
 consisting of collections of namespaces, variables, predicates and constraints. 
 
 The elements of the AST are bound to ontology elements in a separate resolver 
-stage before code is generated by the compiler backend.
+stage, and redundant joins are removed by the optimizer, before code is generated 
+by the compiler backend.
 
 The resolver also maps generic concepts and predicates to the correct database 
 tables. This provides support for querying resources, statements and literals 
@@ -17,35 +18,142 @@ built-in rdf:subject, rdf:predicate and rdf:object predicates. Most of the compi
 complexity is a result of this conversion. 
 """
 
+from __future__ import with_statement
+from contextlib import contextmanager
+
 from generate import generate
+from optimize import optimize
 from resolve import resolve
+from rdf import instrumentation
+
+
+class Aggregate(tuple):
+    """
+    Key of an aggregated column in the results of an RDQL query, such as 
+    Aggregate('avg', price) for avg(x.ns:price). 
+    """
+    
+    def __new__(cls, function, predicate):
+        return tuple.__new__(cls, (function, predicate))
+    
+    function = property(lambda self: self[0])
+    predicate = property(lambda self: self[1])
+    
+    def __unicode__(self):
+        return u'%s(%s)' % (self.function, self.predicate.code)
+    
+    def __str__(self):
+        return str(unicode(self))
 
 
 class Compiler(object):
 
     def __init__(self):
         self.ast, self.errors = None, []
+        self.timings = [] # (stage, seconds) pairs, in compilation order
+        self.fingerprint = None
 
-    def compile(self, rdql):
-        from lex import Lexer
+    def compile(self, rdql, allow_cartesian=False, grouped=False):
+        from lex import Tokens, tokenize
         from yacc import Parser
-        self.ast = Parser().parse(rdql, lexer=Lexer())
-        self.ast = resolve(self.ast) 
-        select, count, self.ast = generate(self.ast)
+        self.timings = []
+        self.fingerprint = instrumentation.fingerprint(rdql)
+        with instrumentation.query(self.fingerprint, rdql):
+            with self._stage('lex'):
+                tokens = tokenize(rdql)
+            with self._stage('parse'):
+                self.ast = Parser().parse(rdql, lexer=Tokens(tokens))
+            self.ast = resolve(self.ast, allow_cartesian, self.timings) 
+            with self._stage('optimize'):
+                self.ast = optimize(self.ast)
+            with self._stage('generate'):
+                select, count, self.ast = generate(self.ast, grouped)
         return select, count
     
+    @contextmanager
+    def _stage(self, name):
+        with instrumentation.stage(name) as m:
+            yield m
+        self.timings.append((name, m.seconds))
+    
     def __getconcepts(self):
         return [c.binding for c in self.ast.concepts]
     concepts = property(__getconcepts)
     
     def __getpredicates(self):
-        return [p.binding for p in self.ast.predicates]
+        """
+        Returns the keys of the columns of the results: the selected predicates, 
+        with Aggregate keys for the aggregated ones.
+        """
+        return [p.aggregate and Aggregate(p.aggregate, p.binding) or p.binding 
+            for p in self.ast.predicates]
     predicates = property(__getpredicates)
     
     def __getmangledpredicates(self):
-        return [p.binding.mangled for p in self.ast.predicates]
+        return [p.aggregate and u'%s__%s' % (p.aggregate, p.binding.mangled) or 
+            p.binding.mangled for p in self.ast.predicates]
     mangled_predicates = property(__getmangledpredicates)
     
+    def __getparams(self):
+        """
+        Returns the query parameters of the select and count SQL: the constants of 
+        the constraints, in placeholder order.
+        """
+        return self.ast.params
+    params = property(__getparams)
+    
+    def __getpaged(self):
+        """
+        Returns the grouped select split around the limit and offset of a page of 
+        subjects, and its parameters, or None if the query isn't grouped.
+        """
+        return getattr(self.ast, 'paged', None)
+    paged = property(__getpaged)
+    
+    def __getmultivalued(self):
+        """
+        Returns a flag for each selected predicate, true if the predicate (or any 
+        segment of its property path) may have more than one object per subject.
+        """
+        flags = []
+        for p in self.ast.predicates:
+            path = getattr(p, '_path', None) or p.binding.segments or (p.binding,)
+            flags.append(True in [s.cardinality.range[:1] in ('*', '+') for s in path])
+        return flags
+    multivalued = property(__getmultivalued)
+    
+    def __getmodels(self):
+        """
+        Returns the models whose tables the compiled query reads.
+        """
+        from rdf.models import Statement
+        models = []
+        for v in self.ast.variables:
+            if not v.concept.binding.Model in models:
+                models.append(v.concept.binding.Model)
+        for p in self.__closures():
+            Model = p.generic and Statement or p.domain.Model
+            if not Model in models:
+                models.append(Model)
+        return models
+    models = property(__getmodels)
+    
+    def __gettables(self):
+        """
+        Returns the names of the database tables the compiled query reads.
+        """
+        tables = set([v.concept.binding.db_table for v in self.ast.variables])
+        tables.update([p.db_table for p in self.__closures()])
+        return sorted(tables)
+    tables = property(__gettables)
+    
+    def __closures(self):
+        """
+        Returns the transitive predicates, whose closures read the tables storing 
+        their statements.
+        """
+        return [c.predicate.binding for c in self.ast.constraints if c.predicate.closure]
+    
 
 
 # Copyright (c) 2008, Stefan B Sigurdsson
@@ -0,0 +1,177 @@
+"""
+Explanations of compiled RDQL queries.
+
+An explanation shows what the compiler did with a query: the resolved AST, 
+including the variables, predicates and constraints synthesized by the resolver 
+for property paths and generic concepts and predicates, the generated SQL, the 
+query plan reported by the database backend, and the time spent in each compiler 
+stage. Explanations are returned by SPARQLQuerySet.explain() and printed by the 
+rdfexplain management command.
+"""
+
+from django.conf import settings
+from django.db import connection
+
+from rdf.query.ast import Variable
+from rdf.query.compiler import Compiler
+
+
+_EXPLAIN = {
+    'mysql': 'EXPLAIN', 
+    'postgresql': 'EXPLAIN', 
+    'postgresql_psycopg2': 'EXPLAIN', 
+    'sqlite3': 'EXPLAIN QUERY PLAN',
+}
+
+
+class Explanation(object):
+    
+    def __init__(self, rdql, ast, select, count, params, plan, timings):
+        self.rdql = rdql
+        self.ast = ast
+        self.select, self.count = select, count
+        self.params = params # Query parameters of the select
+        self.plan = plan # Rows returned by the backend, or None
+        self.timings = timings # (stage, seconds) pairs, in compilation order
+        
+    def __unicode__(self):
+        lines = [u'RDQL:', self.rdql.strip(), u'']
+        lines.extend(describe(self.ast))
+        lines.extend([u'', u'SQL:', self.select, u'', u'Count SQL:', self.count, u''])
+        lines.append(u'Parameters:')
+        lines.extend([u'  %s' % repr(p) for p in self.params])
+        lines.append(u'')
+        lines.append(u'Plan:')
+        if self.plan is None:
+            lines.append(u'(not supported by the %s backend)' % settings.DATABASE_ENGINE)
+        else:
+            lines.extend([u' | '.join([unicode(c) for c in row]) for row in self.plan])
+        lines.extend([u'', u'Timings:'])
+        lines.extend([u'%-12s %8.2f ms' % (stage, 1000 * seconds) \
+            for stage, seconds in self.timings])
+        return u'\n'.join(lines)
+    
+    def __str__(self):
+        return str(unicode(self))
+
+
+def explain(rdql, allow_cartesian=False, limit_offset_sql=None, grouped=False):
+    """
+    Compiles the RDQL query and returns its Explanation. The query isn't executed, 
+    but the backend is asked for its plan. Bypasses the compiled query cache, so 
+    the timings are always those of a full compilation. 
+    """
+    c = Compiler()
+    select, count = c.compile(rdql, allow_cartesian, grouped)
+    params = c.params
+    if not limit_offset_sql is None:
+        select, params = limit_offset_sql(select, params)
+    return Explanation(rdql, c.ast, select, count, params, plan(select, params), 
+        c.timings)
+
+
+def plan(sql, params=()):
+    """
+    Returns the rows of the backend's EXPLAIN output for the SQL query and its 
+    parameters, or None if the backend isn't supported. 
+    """
+    if not _EXPLAIN.has_key(settings.DATABASE_ENGINE):
+        return None
+    cursor = connection.cursor() # IGNORE:E1101
+    try:
+        cursor.execute(u'%s %s' % (_EXPLAIN[settings.DATABASE_ENGINE], sql), params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+    
+
+def describe(ast):
+    """
+    Returns lines describing the resolved AST. Synthesized replacements are shown 
+    after the clauses they replace. 
+    """
+    lines = [u'Variables:']
+    for v in sorted(ast.variables, key=lambda v: v.name):
+        lines.append(u'  %s %s (%s%s)' % (
+            v.concept.binding.code, v.name, v.concept.binding.db_table, 
+            v.optional and u', outer join' or u''))
+    lines.append(u'Predicates:')
+    for p in ast.predicates:
+        lines.extend(_predicate(p))
+    lines.append(u'Constraints:')
+    for c in ast.constraints:
+        lines.append(u'  ' + _constraint(c))
+        for g in getattr(c, '_generalized', ()):
+            lines.append(u'    generalized: ' + _constraint(g))
+    if ast.groupings:
+        lines.append(u'Group:')
+        for p in ast.groupings:
+            lines.extend(_predicate(p))
+    if ast.orderings:
+        lines.append(u'Order:')
+        for o in ast.orderings:
+            _ = _predicate(o.predicate)
+            _[0] += o.descending and u' desc' or u' asc'
+            lines.extend(_)
+    return lines
+
+
+def _predicate(p):
+    name = u'%s.%s' % (p.variable.name, p.code)
+    if p.aggregate:
+        name = u'%s(%s)' % (p.aggregate, name)
+    lines = [u'  %s%s' % (p.optional and u'optional ' or u'', name)]
+    if hasattr(p, '_spanned'):
+        p = p._spanned # IGNORE:W0212
+        lines.append(u'    spanned: %s.%s' % (p.variable.name, p.code))
+    if hasattr(p, '_generalized'):
+        p = p._generalized # IGNORE:W0212
+        lines.append(u'    generalized: %s.%s' % (p.variable.name, p.code))
+    return lines
+
+
+def _constraint(constraint):
+    o = constraint.object
+    if isinstance(o, Variable):
+        o = o.name
+    elif isinstance(o, list):
+        o = u'(%s)' % u', '.join([unicode(c) for c in o])
+    else:
+        o = unicode(o)
+    if '=' != constraint.operator:
+        o = u'%s %s' % (constraint.operator, o)
+    code = constraint.predicate.binding.code
+    if constraint.predicate.closure:
+        code += constraint.predicate.closure
+        if constraint.predicate.depth:
+            code += u'{%s}' % constraint.predicate.depth
+    return u'%s %s %s' % (constraint.subject.name, code, o)
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
@@ -1,16 +1,52 @@
-from ast import Variable
+from datetime import date, datetime, time
 
+from ast import Constant, Constraint, Variable
+from resolve import aggregated, group_keys
 
-def generate(ast):
+
+def generate(ast, grouped=False):
+    """
+    Returns the select and count SQL for the resolved AST, and the AST.
+    
+    The constants of the constraints are query parameters, in `%s` placeholders, 
+    and are hung on the AST as `params`. The select and count take the same 
+    parameters.
+    
+    Grouped queries select the primary key of the subject (the variable of the 
+    first predicate in the select clause) ahead of the predicate columns, and 
+    order the rows by it, so that the rows of each subject are consecutive. 
+    Grouped counts are counts of distinct subjects. The select of a grouped query 
+    is also split around a subquery selecting a page of subjects, and hung on the 
+    AST as `paged`, with its parameters, for slicing query sets by subject in 
+    the database. 
+    
+    The rows are sorted by the order clause in the database, ahead of the limit 
+    and offset, so top-N queries only transfer N rows. Grouped queries are sorted 
+    by the subject last, which keeps the rows of a subject consecutive as long as 
+    the order predicates have a single value per subject.
+    
+    Aggregate queries return a row per group, and are grouped by the group keys 
+    and every other selected predicate that isn't aggregated. Distinct queries 
+    are counted by counting the distinct rows.
+    """
 
     def _select():
-        return u'select ' + u', '.join(
-            [_column(p) for p in ast.predicates])
+        columns = [_column(p) for p in ast.predicates]
+        if grouped:
+            columns.insert(0, _subject())
+        return (ast.distinct and u'select distinct ' or u'select ') + u', '.join(columns)
     
     def _count():
+        if grouped:
+            return u'select count(distinct %s)' % _subject()
         return u'select count(*)'
     
+    def _subject():
+        variable = ast.predicates[0].variable
+        return u'%s.%s' % (variable.name, variable.concept.binding.pk_column)
+    
     def _column(predicate):
+        aggregate = predicate.aggregate
         if hasattr(predicate, '_spanned'):
             predicate = predicate._spanned
         if hasattr(predicate, '_generalized'):
@@ -19,32 +55,109 @@ def generate(ast):
             column = u'%s.%s' % (predicate.variable.name, predicate.binding.db_column)
         else:
             raise Exception('not supported')
+        if aggregate:
+            column = u'%s(%s)' % (aggregate, column)
         return column
     
-    def _tables():
-        return u'from ' + u', '.join(
-            [_table(v) for v in ast.variables])
-        
-    def _table(variable):
-        return u'%s %s' \
-            % (variable.concept.binding.Model._meta.db_table, variable.name) # IGNORE:W0212
-    
-    def _where():
-        if 1 > len(ast.constraints):
-            return u''
+    def _constraints():
         constraints = []
         for c in ast.constraints:
             if hasattr(c, '_generalized'):
                 constraints.extend(c._generalized) # IGNORE:W0212
             else:
                 constraints.append(c)
+        return constraints
+    
+    def _names(constraint):
+        return set([v.name for v in (constraint.subject, constraint.object) 
+            if isinstance(v, Variable)])
+    
+    def _joins():
+        """
+        Plans the joins. Returns the required variables, the outer joins as 
+        (variable, constraints) pairs in join order, and the constraints left for 
+        the where clause. 
+        
+        Optional variables are joined once a constraint connects them to the 
+        variables already joined, on every constraint that involves them and 
+        nothing that isn't joined yet. Constraints on required variables only 
+        stay in the where clause, so that they don't filter out the rows that 
+        the outer joins pad with NULLs. 
+        """
+        required = [v for v in ast.variables if not v.optional]
+        optional = sorted([v for v in ast.variables if v.optional], 
+            key=lambda v: v.name)
+        joined = set([v.name for v in required])
+        remaining, where = [], []
+        for c in _constraints():
+            if _names(c) <= joined:
+                where.append(c)
+            else:
+                remaining.append(c)
+        joins = []
+        while optional:
+            for v in optional:
+                names = joined | set([v.name])
+                on = [c for c in remaining if v.name in _names(c) and _names(c) <= names]
+                if [c for c in on if _names(c) & joined]:
+                    break
+            else:
+                raise Exception('optional variables not joined: %s' \
+                    % u', '.join([v.name for v in optional]))
+            optional.remove(v)
+            joined.add(v.name)
+            remaining = [c for c in remaining if not c in on]
+            joins.append((v, on))
+        return required, joins, where
+    
+    def _closures():
+        """
+        Returns (name, constraint) pairs for the constraints using transitive 
+        predicates. The name is that of the common table expression computing 
+        the closure of the predicate.
+        """
+        closures = []
+        for c in _constraints():
+            if c.predicate.closure:
+                name = u'__'.join([c.subject.name, c.predicate.binding.namespace.code, 
+                    c.predicate.binding.name, c.object.name, 't']).replace('-', '_')
+                closures.append((name, c))
+        return closures
+    
+    def _with():
+        if not closures:
+            return u''
+        return u'with recursive ' + u', '.join(
+            [_closure(name, c) for name, c in closures])
+    
+    def _tables(params):
+        tables = [_table(v) for v in required] + [name for name, _ in closures]
+        if not joins:
+            return u'from ' + u', '.join(tables)
+        # Commas bind looser than joins in MySQL, so the inner joins are explicit:
+        tables = u'from ' + u' cross join '.join(tables)
+        for v, on in joins:
+            tables += u' left outer join %s on %s' % (
+                _table(v), u' and '.join([_where_clause(c, params) for c in on]))
+        return tables
+        
+    def _table(variable):
+        return u'%s %s' % (variable.concept.binding.db_table, variable.name)
+    
+    def _where(params):
+        if 1 > len(where):
+            return u''
         return u'where ' + u' and '.join(
-            [_where_clause(c) for c in constraints])
+            [_where_clause(c, params) for c in where])
         
-    def _where_clause(constraint):
-        operator = '='
+    def _where_clause(constraint, params):
+        if constraint.predicate.closure:
+            name = dict([(c, n) for n, c in closures])[constraint]
+            return u'%s.subject_id = %s and %s.object_id = %s' % (
+                name, _key(constraint.subject), name, _key(constraint.object))
+        operator = Constraint.OPERATORS[constraint.operator]
         left = _where_clause_left(constraint)
-        right = _where_clause_right(constraint)
+        right = _where_clause_right(constraint, params)
         return u' '.join([unicode(i) for i in (left, operator, right)])
 
     def _where_clause_left(constraint):
@@ -55,15 +168,43 @@ def generate(ast):
             column = constraint.predicate.binding.db_column
         return u'.'.join((constraint.subject.name, column))
 
-    def _where_clause_right(constraint):
+    def _where_clause_right(constraint, params):
+        if isinstance(constraint.object, list):
+            params.extend([_parameter(c.value) for c in constraint.object])
+            return u'(%s)' % u', '.join([u'%s'] * len(constraint.object))
+        if isinstance(constraint.object, Constant):
+            params.append(_parameter(constraint.object.value))
+            return u'%s'
         if not isinstance(constraint.object, Variable):
-            return constraint.object # Constant
+            return constraint.object # Synthesized constant, a primary key
         if constraint.object.concept.binding.literal:
             column = 'statement_id'
         else:
             column = constraint.object.concept.binding.pk_column            
         return u'.'.join((constraint.object.name, column))
     
+    def _group():
+        if not aggregated(ast):
+            return u''
+        if grouped:
+            raise Exception('grouped results are not supported for aggregate queries')
+        columns = [_column(p) for p in group_keys(ast)]
+        if not columns:
+            return u''
+        return u'group by ' + u', '.join(columns)
+    
+    def _key(variable):
+        return u'%s.%s' % (variable.name, variable.concept.binding.pk_column)
+    
+    def _order():
+        columns = [_column(o.predicate) + (o.descending and u' desc' or u'') 
+            for o in ast.orderings]
+        if grouped:
+            columns.append(_subject())
+        if not columns:
+            return u''
+        return u'order by ' + u', '.join(columns)
+    
     def _range():
         if hasattr(ast, 'limit'):
             range = u'limit %s' % ast.limit
@@ -73,14 +214,113 @@ def generate(ast):
             range = u''
         return range
     
+    def _page():
+        """
+        Returns the grouped select split around the limit and offset of a page of 
+        subjects, and its parameters, or None if the query isn't grouped. A 
+        subquery selects the subjects on the page, ordered as the records are, so 
+        that only the rows of those subjects are fetched.
+        """
+        if not grouped:
+            return None
+        keys = [u'%s(%s)%s' % (o.descending and u'max' or u'min', _column(o.predicate), 
+            o.descending and u' desc' or u'') for o in ast.orderings]
+        subjects = u' '.join([_ for _ in (u'select %s as rdql_subject' % _subject(), 
+            table_clause, where_clause, u'group by %s' % _subject(), 
+            u'order by ' + u', '.join(keys + [_subject()])) if _])
+        page = u'rdql_page.rdql_subject = %s' % _subject()
+        page = where_clause and u'%s and %s' % (where_clause, page) or u'where ' + page
+        prefix = u' '.join([_ for _ in (with_clause, select_clause, table_clause) if _])
+        prefix += (joins and u' cross join (' or u', (') + subjects + u' '
+        suffix = u') rdql_page ' + u' '.join([_ for _ in 
+            (page, order_clause, range_clause) if _])
+        return prefix, suffix, table_params * 2 + where_params * 2
+    
+    required, joins, where = _joins()
+    closures = _closures()
+    with_clause = _with()
     select_clause = _select()
     count_clause = _count()
-    table_clause = _tables()
-    where_clause = _where()
+    table_params, where_params = [], []
+    table_clause = _tables(table_params)
+    where_clause = _where(where_params)
+    group_clause = _group()
+    order_clause = _order()
     range_clause = _range()
-    select = u'%s %s %s %s' % (select_clause, table_clause, where_clause, range_clause)
-    count = u'%s %s %s %s' % (count_clause, table_clause, where_clause, range_clause)
-    return select.strip(), count.strip(), ast    
+    select = u' '.join([_ for _ in (with_clause, select_clause, table_clause, 
+        where_clause, group_clause, order_clause, range_clause) if _])
+    if not grouped and (aggregated(ast) or ast.distinct):
+        # Aggregate queries return a row per group, distinct ones a row per value:
+        count = u'select count(*) from (%s) rdql_rows' % u' '.join([_ for _ in 
+            (select_clause, table_clause, where_clause, group_clause, range_clause) if _])
+        count = u' '.join([_ for _ in (with_clause, count) if _])
+    else:
+        count = u' '.join([_ for _ in (with_clause, count_clause, table_clause, 
+            where_clause, range_clause) if _])
+    ast.params = table_params + where_params
+    ast.paged = _page()
+    return select, count, ast    
+
+def _closure(name, constraint):
+    """
+    Returns the common table expressions computing the (subject_id, object_id) 
+    pairs related by the transitive predicate of the constraint, the last one 
+    named `name`. 
+    
+    The closure of a '+' predicate starts from the statements using it, and the 
+    closure of a '*' predicate from every possible subject, related to itself. 
+    Closures without a maximum depth rely on union discarding the pairs already 
+    found, which ends the recursion even if the predicate forms cycles. Closures 
+    with a maximum depth count the steps instead, and discard duplicate pairs 
+    in a second expression.
+    """
+    from rdf.models import Resource, Statement
+    predicate, reference = constraint.predicate.binding, constraint.predicate
+    if predicate.generic:
+        table = Statement._meta.db_table # IGNORE:W0212
+        subject = Statement._meta.get_field('subject').column # IGNORE:W0212
+        applies = lambda alias: u'%s.%s = %s' % (
+            alias, Statement._meta.get_field('predicate').column, predicate.id) # IGNORE:W0212
+    else:
+        table = predicate.db_table
+        subject = predicate.domain.pk_column
+        applies = lambda alias: u'%s.%s is not null' % (alias, predicate.db_column)
+    depth = reference.depth
+    recursive = depth and name + u'__r' or name
+    columns = depth and u'subject_id, object_id, depth' or u'subject_id, object_id'
+    if '*' == reference.closure:
+        concept = constraint.subject.concept.binding
+        start = u'select s.%s, s.%s%s from %s s' % (
+            concept.pk_column, concept.pk_column, depth and u', 0' or u'', 
+            concept.db_table)
+        if concept.Model is Resource:
+            start += u' where s.%s = %s' % (
+                Resource._meta.get_field('type').column, concept.id) # IGNORE:W0212
+    else:
+        start = u'select s.%s, s.%s%s from %s s where %s' % (
+            subject, predicate.db_column, depth and u', 1' or u'', table, applies('s'))
+    step = u'select r.subject_id, s.%s%s from %s r, %s s where s.%s = r.object_id ' \
+        u'and %s' % (predicate.db_column, depth and u', r.depth + 1' or u'', 
+            recursive, table, subject, applies('s'))
+    if depth:
+        step += u' and r.depth < %s' % depth
+    expressions = [u'%s(%s) as (%s union %s)' % (recursive, columns, start, step)]
+    if depth:
+        expressions.append(u'%s(subject_id, object_id) as ' \
+            u'(select distinct subject_id, object_id from %s)' % (name, recursive))
+    return u', '.join(expressions)
+
+def _parameter(value):
+    """
+    Returns the query parameter for a constant from an RDQL constraint. Dates and 
+    times are passed as text, as the backends store them.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
 
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.
@@ -1,4 +1,6 @@
 from decimal import Decimal
+import re
+
 from ply import lex
 
 
@@ -9,6 +11,17 @@ tokens = (
     'DOT', 
     'COMMA',
     'ASTERISK', 
+    'PLUS',
+    'LPAREN',
+    'RPAREN',
+    'LBRACE',
+    'RBRACE',
+    'EQ',
+    'NE',
+    'LT',
+    'LE',
+    'GT',
+    'GE',
     'SELECT',
     'FROM',
     'AS', 
@@ -18,6 +31,20 @@ tokens = (
     'FOR',
     'OFFSET', 
     'LIMIT', 
+    'OPTIONAL',
+    'LIKE',
+    'IN',
+    'ORDER',
+    'BY',
+    'ASC',
+    'DESC',
+    'GROUP',
+    'COUNT',
+    'SUM',
+    'MIN',
+    'MAX',
+    'AVG',
+    'DISTINCT',
     'SYMBOL',
     )
 
@@ -31,6 +58,41 @@ reserved = {
     'FOR': 'FOR',
     'OFFSET': 'OFFSET', 
     'LIMIT': 'LIMIT', 
+    'OPTIONAL': 'OPTIONAL',
+    'LIKE': 'LIKE',
+    'IN': 'IN',
+    'DISTINCT': 'DISTINCT',
+}
+
+# Keywords added since the first release of RDQL are only reserved where the 
+# grammar expects them, so that queries using them as names still parse. Each 
+# maps to a test of the text before and after the symbol:
+_ORDER_OR_GROUP_BEFORE = re.compile(r'\b(order|group)\s+$', re.IGNORECASE)
+_ORDER_BY_BEFORE = re.compile(r'\border\s+by\s', re.IGNORECASE)
+_BY_AFTER = re.compile(r'\s+by\b', re.IGNORECASE)
+_DIRECTION_AFTER = re.compile(r'\s*(,|$|(limit|offset)\b)', re.IGNORECASE)
+_CALL_AFTER = re.compile(r'\s*\(')
+
+def _direction(before, after):
+    """
+    ASC and DESC end an order key, which isn't a predicate name (after a dot).
+    """
+    return _ORDER_BY_BEFORE.search(before) and not before.rstrip().endswith('.') \
+        and _DIRECTION_AFTER.match(after)
+
+_call = lambda before, after: _CALL_AFTER.match(after)
+
+contextual = {
+    'ORDER': lambda before, after: _BY_AFTER.match(after),
+    'GROUP': lambda before, after: _BY_AFTER.match(after),
+    'BY': lambda before, after: _ORDER_OR_GROUP_BEFORE.search(before),
+    'ASC': _direction,
+    'DESC': _direction,
+    'COUNT': _call,
+    'SUM': _call,
+    'MIN': _call,
+    'MAX': _call,
+    'AVG': _call,
 }
 
 def t_STRING(t):
@@ -38,14 +100,15 @@ def t_STRING(t):
     t.value = t.value[1:-1]
     return t
 
-def t_INTEGER(t):
-    r'\d+'
-    t.value = int(t.value)
+# Function tokens are matched in order, so decimals must come before integers:
+def t_DECIMAL(t):
+    r'-?\d+\.\d+'
+    t.value = Decimal(t.value)
     return t
 
-def t_DECIMAL(t):
-    r'''\d+(\.\d+)?'''
-    t.value = Decimal(t)
+def t_INTEGER(t):
+    r'-?\d+'
+    t.value = int(t.value)
     return t
 
 t_DOT = r'\.'
@@ -54,9 +117,31 @@ t_COMMA = r','
 
 t_ASTERISK = r'\*'
 
+t_PLUS = r'\+'
+
+t_LPAREN = r'\('
+
+t_RPAREN = r'\)'
+
+t_LBRACE = r'\{'
+
+t_RBRACE = r'\}'
+
+# String tokens are matched longest first:
+t_EQ = r'='
+t_NE = r'!=|<>'
+t_LT = r'<'
+t_LE = r'<='
+t_GT = r'>'
+t_GE = r'>='
+
 def t_SYMBOL(t): 
     r'[\w_][\w\d_:\-\/\?\&]*'
-    t.type = reserved.get(t.value.upper(), 'SYMBOL')
+    keyword = t.value.upper()
+    t.type = reserved.get(keyword, 'SYMBOL')
+    if contextual.has_key(keyword) and contextual[keyword](
+        t.lexer.lexdata[:t.lexpos], t.lexer.lexdata[t.lexer.lexpos:]):
+        t.type = str(keyword)
     return t
 
 def t_newline(t):
@@ -73,6 +158,33 @@ def Lexer():
     return lex.lex()
 
 
+def tokenize(rdql):
+    """
+    Returns the list of tokens in the RDQL text.
+    """
+    lexer = Lexer()
+    lexer.input(rdql)
+    return list(iter(lexer.token, None))
+
+
+class Tokens(object):
+    """
+    Replays a list of tokens to the parser, in place of a lexer.
+    """
+    
+    def __init__(self, tokens):
+        self._tokens = iter(tokens)
+        
+    def input(self, rdql): # IGNORE:W0613
+        pass
+    
+    def token(self):
+        try:
+            return self._tokens.next()
+        except StopIteration:
+            return None
+
+
 
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.
@@ -0,0 +1,159 @@
+"""
+Optimizer for resolved RDQL syntax trees.
+
+Runs between the resolver and the code generator, and removes joins that can't
+change the results:
+
+    - Constraints that repeat another constraint, which the resolver synthesizes
+      when a predicate is both selected and constrained, for example.
+
+    - Variables whose values aren't selected, grouped or ordered by, and whose
+      only constraint joins them to another variable through a foreign key
+      column of a mapped model. The foreign key matches a single row at most,
+      so an outer join to such a variable never changes the results. An inner
+      join doesn't either, provided the range cardinality of the predicate is
+      '1' - that is, the foreign key is never NULL.
+
+Joins through generic predicates are never eliminated. Those go through the
+statements table, where cardinalities aren't enforced, so a subject may have
+any number of objects.
+
+Eliminating a variable may leave another variable eligible, so the pass repeats
+until nothing more can be eliminated.
+"""
+
+from django.db.models.fields.related import ForeignKey
+
+from rdf.query.ast import Constant, Variable
+from rdf.query.resolve import references
+
+
+def optimize(ast):
+    """
+    Removes redundant constraints and joins from the resolved AST. Replaced
+    constraints are updated in place, as are the `_generalized` replacements.
+    """
+    _deduplicate(ast)
+    while 1:
+        variable = _redundant(ast)
+        if variable is None:
+            return ast
+        _remove(ast, lambda c: variable.name in _names(c))
+        del ast.variables[variable.name]
+
+
+def _constraints(ast):
+    """
+    Returns the constraints the code generator sees, with replacements in place
+    of the constraints they replace.
+    """
+    constraints = []
+    for c in ast.constraints:
+        constraints.extend(getattr(c, '_generalized', (c,)))
+    return constraints
+
+
+def _names(constraint):
+    return [v.name for v in (constraint.subject, constraint.object) 
+        if isinstance(v, Variable)]
+
+
+def _remove(ast, condition):
+    for c in list(ast.constraints):
+        if hasattr(c, '_generalized'):
+            c._generalized = tuple([g for g in c._generalized if not condition(g)]) # IGNORE:W0212
+        elif condition(c):
+            ast.constraints.remove(c)
+
+
+def _key(constraint):
+    def _object(o):
+        if isinstance(o, Variable):
+            return o.name
+        if isinstance(o, Constant):
+            return (o.value,)
+        if isinstance(o, list):
+            return tuple([_object(c) for c in o])
+        return o
+    return (constraint.subject.name, constraint.predicate.binding.id,
+        constraint.predicate.closure, constraint.predicate.depth, 
+        constraint.operator, _object(constraint.object))
+
+
+def _deduplicate(ast):
+    seen, duplicates = set(), []
+    for c in _constraints(ast):
+        key = _key(c)
+        if key in seen:
+            duplicates.append(c)
+        seen.add(key)
+    _remove(ast, lambda c: c in duplicates)
+
+
+def _redundant(ast):
+    """
+    Returns a variable that can be eliminated, or None.
+    """
+    referenced = set()
+    for p in references(ast):
+        referenced.add(p.variable.name)
+        if hasattr(p, '_spanned'):
+            p = p._spanned # IGNORE:W0212
+        if hasattr(p, '_generalized'):
+            p = p._generalized # IGNORE:W0212
+        referenced.add(p.variable.name)
+    constraints = {}
+    for c in _constraints(ast):
+        for name in _names(c):
+            constraints.setdefault(name, []).append(c)
+    for v in sorted(ast.variables, key=lambda v: v.name):
+        if v.name in referenced or 1 != len(constraints.get(v.name, ())):
+            continue
+        c = constraints[v.name][0]
+        if [v.name] != _names(c)[1:] or v.concept.binding.literal or c.predicate.closure:
+            continue # Only a foreign key of the subject is known to match one row
+        if not _foreign_key(c.predicate.binding, v.concept.binding):
+            continue
+        if v.optional or '1' == c.predicate.binding.cardinality.range:
+            return v
+    return None
+
+
+def _foreign_key(predicate, concept):
+    """
+    True if the predicate is stored in a foreign key column of a mapped model, 
+    referring to the model of the concept.
+    """
+    if predicate.generic:
+        return False
+    field = predicate.field
+    return isinstance(field, ForeignKey) and field.rel.to is concept.Model
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
@@ -1,7 +1,13 @@
+from __future__ import with_statement
+import md5, time
+
 from django.db import connection
-from django.db.models.query import QuerySet, EmptyResultSet, CHUNK_SIZE
+from django.db.models.query import QuerySet, EmptyResultSet
 
-from rdf.query.compiler import Compiler
+from rdf import instrumentation
+from rdf.query import budget, cache
+from rdf.query.compiler import Aggregate, Compiler # IGNORE:W0611
+from rdf.shortcuts import lru
 
 
 class SPARQLQuerySet(QuerySet):
@@ -11,9 +17,27 @@ class SPARQLQuerySet(QuerySet):
         self._rdql = None
         self._cached_query = None
         self._mangle = False
+        self._allow_cartesian = False
+        self._grouped = False
+        
+    def rdql(self, rdql, mangle=False, allow_cartesian=False, grouped=False):
+        """
+        Sets the RDQL query for the query set. Queries whose variables aren't all 
+        joined by constraints raise DisconnectedJoin when compiled, unless 
+        `allow_cartesian` is true. 
         
-    def rdql(self, rdql, mangle=False):
+        A grouped query set returns one Record per subject (the variable of the 
+        first selected predicate) instead of one dictionary per row, with a list 
+        of values for each predicate that may have more than one. Grouped query 
+        sets are counted and sliced by subject. The limit and offset clauses of 
+        the RDQL text itself still count rows.
+        
+        Queries using aggregates such as count(x.ns:p) or avg(x.ns:p) return a 
+        row per group, with the aggregated values keyed by Aggregate instances.
+        """
         self._rdql, self._mangle = rdql, mangle
+        self._allow_cartesian = allow_cartesian
+        self._grouped = grouped
         return self
     
     def count(self):
@@ -30,34 +54,46 @@ class SPARQLQuerySet(QuerySet):
         c = super(SPARQLQuerySet, self)._clone(cls, **kwargs) # IGNORE:W0142
         c._rdql = self._rdql
         c._mangle = self._mangle
+        c._allow_cartesian = self._allow_cartesian
+        c._grouped = self._grouped
         c._cached_query = self._cached_query
         return c
     
     def _get_sql_clause(self, clause='select'): # IGNORE:W0221
         if self._rdql is None:
             return super(SPARQLQuerySet, self)._get_sql_clause()
-        if self._cached_query is None:
-            q = Query(rdql=self._rdql)
-            q.compile()
-            self._cached_query = q
-        sql = getattr(self._cached_query, clause) # IGNORE:E1101
+        return self._rdql_sql(clause)[0]
+    
+    def _rdql_sql(self, clause='select'):
+        """
+        Returns the SQL of the clause, and its query parameters.
+        """
+        compiled = self.compiled()
+        sql = getattr(compiled, clause) # IGNORE:E1101
         if 'select' == clause:
-            sql = self.limit_offset_sql(sql)
+            return self.limit_offset_sql(sql, compiled.params)
         elif 'count' == clause:
-            pass
+            return sql, compiled.params
         else:
             assert False, 'unrecognized type of SQL clause requested (`%s`)' % clause
-        return sql
     
     def _rdql_count(self):
         try: 
-            sql = self._get_sql_clause(clause='count') # IGNORE:E1101
+            sql, params = self._rdql_sql(clause='count')
         except EmptyResultSet:
             return 0            
-        cursor = connection.cursor() # IGNORE:E1101
-        cursor.execute(sql) # IGNORE:E1101
-        count = cursor.fetchone()[0]
-        cursor.close()
+        count, key = None, None
+        with instrumentation.query(self._cached_query.fingerprint, self._rdql):
+            if cache.enabled():
+                started = time.time()
+                key = cache.count_key(sql, self._cached_query.tables, params)
+                count = cache.get_count(key)
+                if count is not None:
+                    instrumentation.record('cache hit', started, sql=sql)
+            if count is None:
+                count = budget.fetch(sql, params, count_rows=False)[0][0]
+                if key is not None:
+                    cache.set_count(key, count)
         if self._offset:
             count = max(0, count - self._offset)
         if self._limit:
@@ -66,41 +102,205 @@ class SPARQLQuerySet(QuerySet):
 
     def _rdql_iterator(self):
         try:
-            sql = self._get_sql_clause()
+            sql, params = self._rdql_sql()
         except EmptyResultSet:
             raise StopIteration
-        cursor = connection.cursor() # IGNORE:E1101
-        cursor.execute(sql) # IGNORE:E1101
         predicates = self._cached_query.mangled_predicates \
             if self._mangle else self._cached_query.predicates  
-        while 1:
-            rows = cursor.fetchmany(CHUNK_SIZE)
-            if not rows:
-                raise StopIteration
-            for row in rows:
+        if not self._grouped:
+            for row in self._rdql_rows(sql, params):
                 yield dict(zip(predicates, row)) # IGNORE:E1101
-        cursor.close()
+            raise StopIteration
+        records = group(self._rdql_rows(sql, params), predicates, self._cached_query.multivalued)
+        # Pages are selected in the database, an offset alone is skipped here:
+        offset = self._limit is None and self._offset or 0
+        for i, record in enumerate(records):
+            if offset <= i:
+                yield record
+
+    def _rdql_rows(self, sql, params):
+        """
+        Yields the rows for the query, from the result cache if they are cached. 
+        Otherwise the rows are fetched in chunks within the current budget, and 
+        yielded as they arrive. Results of up to cache.max_rows() rows are cached 
+        once they have all been fetched.
+        """
+        fingerprint, key, cached = self._cached_query.fingerprint, None, None
+        if cache.enabled():
+            with instrumentation.query(fingerprint, self._rdql):
+                started = time.time()
+                key = cache.rows_key(sql, self._cached_query.tables, params)
+                rows = cache.get_rows(key)
+                if rows is not None:
+                    instrumentation.record('cache hit', started, sql=sql, rows=len(rows))
+            if rows is not None:
+                for row in rows:
+                    yield row
+                raise StopIteration
+            cached = []
+        chunks = budget.chunks(sql, params)
+        while 1:
+            # Only the fetches are attributed to the query, not the consumption:
+            with instrumentation.query(fingerprint, self._rdql):
+                try:
+                    chunk = chunks.next()
+                except StopIteration:
+                    break
+            if not cached is None:
+                cached.extend(chunk)
+                if cache.max_rows() < len(cached):
+                    cached = None
+            for row in chunk:
+                yield row
+        if not cached is None:
+            cache.set_rows(key, cached)
+
+    def compiled(self):
+        """
+        Returns the compiled query for this query set, compiling it if necessary.
+        """
+        if self._cached_query is None:
+            self._cached_query = compile_query(
+                self._rdql, self._allow_cartesian, self._grouped)
+        return self._cached_query
+
+    def fingerprint(self):
+        """
+        Returns a digest of the SQL for this query set, including the slice and 
+        the query parameters, and the data versions of the tables it reads. The fingerprint changes whenever 
+        the results may have changed, provided rdf.query.cache is tracking data 
+        versions. Compiles the query if necessary but doesn't execute it.
+        """
+        sql, params = self._rdql_sql()
+        if self._grouped:
+            sql += u'\n%s:%s' % (self._offset, self._limit)
+        tables = self._cached_query.tables
+        tagged = u'\n'.join([sql] + [repr(p) for p in params] + 
+            [unicode(v) for v in cache.versions(tables)])
+        return md5.new(tagged.encode('utf-8')).hexdigest()
+
+    def explain(self):
+        """
+        Returns an rdf.query.explain.Explanation of the RDQL query for this query 
+        set, with the resolved AST, the generated SQL including the slice, the 
+        backend's query plan and the compiler stage timings. 
+        """
+        from rdf.query.explain import explain
+        assert not self._rdql is None, 'explain() requires an RDQL query'
+        return explain(self._rdql, self._allow_cartesian, self.limit_offset_sql, 
+            self._grouped)
+
+    def limit_offset_sql(self, sql, params):
+        """
+        Appends the slice to the SQL query, and returns the SQL and its query 
+        parameters. Grouped query sets are sliced by subject, so the slice applies 
+        to the subquery selecting the subjects on the page instead.
+        """
+        if self._limit is None:
+            return sql, params
+        page = connection.ops.limit_offset_sql(self._limit, self._offset)
+        if self._grouped:
+            prefix, suffix, params = self.compiled().paged
+            return prefix + page + suffix, params
+        return sql + ' %s' % page, params
+
+
+_COMPILED_SIZE = 500 # Compiled queries kept, the least recently used are discarded
+
+_compiled = lru(_COMPILED_SIZE) # (RDQL, allow_cartesian, grouped) -> compiled query
+
+
+def compile_query(rdql, allow_cartesian=False, grouped=False):
+    """
+    Returns the compiled query for the RDQL text. Compiled queries are shared, 
+    and cached until the ontology changes or until they are the least recently 
+    used of the cached queries. Queries that only differ in their constants each 
+    take an entry, so the cache is bounded.
+    """
+    key = (rdql, allow_cartesian, grouped)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = _compiled[key] = Query(
+            rdql=rdql, allow_cartesian=allow_cartesian, grouped=grouped).compile()
+    return compiled
+
+
+def reset_compiled():
+    _compiled.clear()
 
-    def limit_offset_sql(self, sql):
-        if not self._limit is None:
-            sql += ' %s' % connection.ops.limit_offset_sql(self._limit, self._offset)
-        return sql
 
 class Query(object):
 
     def __init__(self, **kwargs):
         self.rdql = kwargs['rdql']
+        self.allow_cartesian = kwargs.get('allow_cartesian', False)
+        self.grouped = kwargs.get('grouped', False)
         self.select, self.count = None, None
         self.predicates, self.mangled_predicates = None, None
+        self.multivalued, self.paged = None, None
+        self.params = None
+        self.models, self.tables = None, None
+        self.fingerprint = None
 
     def compile(self):
         c = Compiler()
-        self.select, self.count = c.compile(self.rdql)
+        self.select, self.count = c.compile(self.rdql, self.allow_cartesian, self.grouped)
         self.predicates = c.predicates
         self.mangled_predicates = c.mangled_predicates
+        self.multivalued = c.multivalued
+        self.paged = c.paged
+        self.params = c.params
+        self.models, self.tables = c.models, c.tables
+        self.fingerprint = c.fingerprint
         return self
 
 
+class Record(dict):
+    """
+    The values of the selected predicates for a single subject, as returned by 
+    grouped query sets. Multi-valued predicates map to lists of distinct values, 
+    in the order fetched. The primary key of the subject is kept in `key`.
+    """
+    
+    def __init__(self, key):
+        super(Record, self).__init__()
+        self.key = key
+        
+    def pairs(self):
+        """
+        Returns a (predicate, value) pair for every value of every predicate.
+        """
+        pairs = []
+        for predicate, value in self.items():
+            if isinstance(value, list):
+                pairs.extend([(predicate, v) for v in value])
+            else:
+                pairs.append((predicate, value))
+        return pairs
+
+
+def group(rows, predicates, multivalued):
+    """
+    Folds consecutive rows with the same subject key (in the first column) into 
+    Records. 
+    """
+    record = None
+    for row in rows:
+        key, values = row[0], row[1:]
+        if record is None or record.key != key:
+            if not record is None:
+                yield record
+            record = Record(key)
+            for p, multi, v in zip(predicates, multivalued, values):
+                record[p] = [v] if multi else v
+            continue
+        for p, multi, v in zip(predicates, multivalued, values):
+            if multi and not v in record[p]:
+                record[p].append(v)
+    if not record is None:
+        yield record
+
+
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.
 # 
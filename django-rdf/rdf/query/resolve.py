@@ -12,7 +12,18 @@ altered by adding new constraints using the rdf:type, rdf:subject, rdf:predicate
 and rdf:object predicates, which are bound to specific columns in these two tables.
 '''
 
-from rdf.query.ast import ConceptRef, Constraint, PredicateRef, Variable
+from __future__ import with_statement
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, CharField, DateField, DecimalField, \
+    FloatField, IntegerField, TextField, TimeField
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.fields.related import ForeignKey
+
+from rdf import instrumentation
+from rdf.query.ast import ConceptRef, Constant, Constraint, PredicateRef, Variable
 from rdf.shortcuts import get
 
 
@@ -30,18 +41,109 @@ class NoResolution(ResolverError):
         self.exception = exception
 
 
-def resolve(ast):
+class NoPath(ResolverError):
+    
+    def __init__(self, concept, predicate):
+        super(self.__class__, self).__init__(
+            'no property path leads from %s to %s' \
+            % (unicode(concept), unicode(predicate)))
+        self.concept = concept
+        self.predicate = predicate
+
+
+class TypeMismatch(ResolverError):
+    
+    def __init__(self, clause, reason):
+        super(self.__class__, self).__init__(
+            'invalid clause %s: %s' % (unicode(clause), reason))
+        self.clause = clause
+        
+
+class NotTransitive(ResolverError):
+    
+    def __init__(self, predicate, reason):
+        super(self.__class__, self).__init__(
+            '%s cannot be transitive: %s' % (unicode(predicate), reason))
+        self.predicate = predicate
+        
+
+class NotGrouped(ResolverError):
+    
+    def __init__(self, predicate):
+        super(self.__class__, self).__init__(
+            'cannot order the groups by %s, which is neither aggregated nor a group '
+            'key' % unicode(predicate))
+        self.predicate = predicate
+        
+
+class DisconnectedJoin(ResolverError):
+    
+    def __init__(self, components):
+        super(self.__class__, self).__init__(
+            'no constraint joins the variables %s; the query would return their '
+            'cartesian product' % u' and '.join(
+                [u'{%s}' % u', '.join(c) for c in components]))
+        self.components = components
+
+
+def resolve(ast, allow_cartesian=False, timings=None):
     """
     First bind concept and predicate references to correspondoing ontology elements.
     
     Then synthesize (and bind) new RDQL clauses for generic concepts and predicates. 
+    
+    Queries whose variables aren't all joined by constraints are rejected unless 
+    `allow_cartesian` is true. If a `timings` list is given, a (stage, seconds) 
+    pair is appended to it for each resolver stage. 
     """ 
-    ast = _bind(ast)
-    ast = _span(ast)
-    ast = _generalize(ast)
+    ast = _timed(timings, 'bind', _bind, ast)
+    if not allow_cartesian:
+        _check_connected(ast)
+    ast = _timed(timings, 'span', _span, ast)
+    ast = _timed(timings, 'generalize', _generalize, ast)
     return ast  
+
+
+def _timed(timings, name, stage, ast):
+    with instrumentation.stage(name) as m:
+        ast = stage(ast)
+    if not timings is None:
+        timings.append((name, m.seconds))
+    return ast
         
         
+def references(ast):
+    """
+    Returns the selected predicates, followed by the predicates that are only 
+    referenced by the order clause.
+    """
+    references = list(ast.predicates)
+    for p in list(ast.groupings) + [o.predicate for o in ast.orderings]:
+        if not p in references:
+            references.append(p)
+    return references
+
+
+def aggregated(ast):
+    """
+    True if the query aggregates the values of any predicate. 
+    """
+    return 0 < len([p for p in references(ast) if p.aggregate])
+
+
+def group_keys(ast):
+    """
+    Returns the predicates that the results of an aggregate query are grouped by: 
+    the keys of the group clause, followed by every other selected predicate that 
+    isn't aggregated.
+    """
+    keys = list(ast.groupings)
+    for p in ast.predicates:
+        if not p.aggregate and not p in keys:
+            keys.append(p)
+    return keys
+
+
 def _bind(ast):
     """
     Binds concept and predicate references to corresponding ontology elements.
@@ -72,7 +174,7 @@ def _bind(ast):
         except Concept.DoesNotExist, x: # IGNORE:E1101
             raise NoResolution(reference, x)
         
-    def _predicate(reference):
+    def _predicate(reference, concept_name=None):
         """
         Make sure concepts are bound before attempting to bind predicates.
         
@@ -85,14 +187,19 @@ def _bind(ast):
         Airport a. 
         
         Hence, we need to first check for ns:Airport_code, then look for ns:code. 
+        
+        The segments of a property path have no variable of their own, so the 
+        caller supplies the name of the concept the segment starts from.
         """
         if not reference.binding is None:
             return
         if reference.namespace is None:
             reference.namespace = ast.namespaces['_']
+        if concept_name is None:
+            concept_name = reference.variable.concept.name
         try:
             try:  
-                name = u'_'.join((reference.variable.concept.name, reference.name))
+                name = u'_'.join((concept_name, reference.name))
                 reference.binding = Predicate.objects.get(
                     resource__name=name, 
                     resource__namespace=reference.namespace.binding)
@@ -103,11 +210,33 @@ def _bind(ast):
         except Predicate.DoesNotExist, x: # IGNORE:E1101
             raise NoResolution(reference, x)
         
+    def _path(reference):
+        """
+        Binds the segments of a dotted property path, each one starting from the 
+        range of the previous segment, then hands the bound segments to the path 
+        resolver to fill in any gaps between them.
+        """
+        if not reference.binding is None:
+            return
+        start = reference.variable.concept.binding
+        concept, segments = start, []
+        for s in reference.path:
+            _predicate(s, concept.name)
+            segments.append(s.binding)
+            if not s.binding.range is None:
+                concept = s.binding.range
+        reference.binding = segments[-1]
+        reference._path = resolve_path(start, segments)
+
     def _constraint(reference):
         _variable(reference.subject)
         reference.predicate.variable = reference.subject
         _predicate(reference.predicate)
-        if reference.predicate.binding.range.literal:
+        if reference.predicate.closure:
+            _transitive(reference.predicate)
+        if _constant(reference.object):
+            _typed(reference)
+        elif reference.predicate.binding.range.literal:
             pass
         elif isinstance(reference.object, ConceptRef):
             _concept(reference.object)
@@ -118,77 +247,194 @@ def _bind(ast):
         _namespace(n)
     for v in ast.variables:
         _variable(v)
-    for p in ast.predicates:
-        _predicate(p)
+    for p in references(ast):
+        if p.path is None:
+            _predicate(p)
+        else:
+            _path(p)
     for p in ast.constraints:
         _constraint(p)
+    if aggregated(ast):
+        _check_grouped(ast)
     return ast
 
 
-def _span(ast):
+# Backends supporting WITH RECURSIVE:
+_RECURSIVE_ENGINES = ('sqlite3', 'postgresql', 'postgresql_psycopg2')
+
+
+def _transitive(reference):
+    """
+    Checks that the objects of the predicate are resources of the kind the 
+    predicate applies to, so that it can be applied to them in turn.
     """
-    Replaces spanning predicates with the span segments.
+    predicate = reference.binding
+    if not settings.DATABASE_ENGINE in _RECURSIVE_ENGINES:
+        raise NotTransitive(reference, 
+            'the %s backend does not support recursive queries' % settings.DATABASE_ENGINE)
+    if predicate.span:
+        raise NotTransitive(reference, 'spanning predicates are not supported')
+    if predicate.range is None or predicate.range.literal:
+        raise NotTransitive(reference, 'the objects are literals')
+    if not predicate.generic and not predicate.domain.Model is predicate.range.Model:
+        raise NotTransitive(reference, 'the objects are stored in another table')
+
+
+_NUMERIC = (IntegerField, DecimalField, FloatField)
+
+
+def _check_grouped(ast):
+    """
+    Checks that sums and averages apply to numbers, and that aggregate queries 
+    are only ordered by aggregates and group keys.
+    """
+    for p in references(ast):
+        if p.aggregate in ('sum', 'avg'):
+            try:
+                numeric = isinstance(p.binding.field, _NUMERIC)
+            except FieldDoesNotExist:
+                numeric = False
+            if not numeric:
+                raise TypeMismatch(p, '%s only applies to numbers' % p.aggregate)
+    keys = group_keys(ast)
+    for o in ast.orderings:
+        if not o.predicate.aggregate and not o.predicate in keys:
+            raise NotGrouped(o.predicate)
+
+
+def _constant(object):
+    return isinstance(object, (Constant, list))
+
+
+def _typed(constraint):
+    """
+    Converts the constants of the constraint to the type of the values of the 
+    constrained predicate, and checks that the operator applies to them. 
+    """
+    try:
+        field = constraint.predicate.binding.field
+    except FieldDoesNotExist:
+        raise TypeMismatch(constraint, 'the values of %s are not comparable' \
+            % constraint.predicate.binding.code)
+    text = isinstance(field, (CharField, TextField))
+    if 'like' == constraint.operator and not text:
+        raise TypeMismatch(constraint, 'like only applies to text')
+    constants = constraint.object if isinstance(constraint.object, list) \
+        else [constraint.object]
+    numeric = isinstance(field, (IntegerField, ForeignKey, DecimalField, FloatField))
+    temporal = isinstance(field, (DateField, TimeField)) # Includes DateTimeField
+    for c in constants:
+        value = c.value
+        mismatch = TypeMismatch(constraint, '%s is not a valid %s value' \
+            % (unicode(c), type(field).__name__))
+        if isinstance(value, basestring):
+            if numeric:
+                raise mismatch
+        elif text or temporal:
+            raise mismatch
+        try:
+            if isinstance(field, BooleanField):
+                value = {'true': True, 'false': False, 1: True, 0: False}[
+                    value.lower() if isinstance(value, basestring) else value]
+            elif isinstance(field, (IntegerField, ForeignKey)):
+                if value != int(value):
+                    raise mismatch
+                value = int(value)
+            elif isinstance(field, DecimalField):
+                value = Decimal(str(value))
+            elif isinstance(field, FloatField):
+                value = float(value)
+            elif temporal:
+                value = field.to_python(value)
+        except TypeMismatch:
+            raise
+        except Exception: # IGNORE:W0703
+            raise mismatch
+        c.value = value
+
+
+def _check_connected(ast):
+    """
+    Raises DisconnectedJoin unless the constraints between variables join every 
+    variable of the query into a single component.
+    """
+    parent = {}
+    for v in ast.variables:
+        parent[v.name] = v.name
+        
+    def _root(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
     
-    Every spanning predicate in the select clause needs to be replaced with the final
-    segment in the span, and variables and constraints added to connect. 
+    for c in ast.constraints:
+        if isinstance(c.subject, Variable) and isinstance(c.object, Variable):
+            parent[_root(c.subject.name)] = _root(c.object.name)
+    components = {}
+    for name in parent:
+        components.setdefault(_root(name), []).append(name)
+    if 1 < len(components):
+        raise DisconnectedJoin(sorted([sorted(c) for c in components.values()]))
+
+
+def _span(ast):
+    """
+    Replaces spanning predicates and property paths with their segments.
     
-    Then, every constraint with a spanning predicate needs to be similarly replaced.
+    Every spanning predicate and property path in the select clause needs to be 
+    replaced with the final segment, and variables and constraints added to connect. 
+    The segments of a property path are worked out when the path is bound. The 
+    segments of a spanning predicate are stored with the span.
     
     Connecting variables are generated using a naming convention that combines the 
-    name of the original variable, the name of the spanning predicate, and the 
-    ordinal of the span segment. For example, if x.n:span might be replaced with 
+    name of the original variable, the codes of the segments leading up to the 
+    variable, and the ordinal of the segment. For example, x.n:a0.n:a1.n:a2 might 
+    be replaced with
     
-        x__n__span__1.n:a2
+        x__n__a0__n__a1__1.n:a2
         
     and the constraints
     
-        x n:a0 x__n__span__0
-        x__n__span__0 n:a1 x__n__span__1
+        x n:a0 x__n__a0__0
+        x__n__a0__0 n:a1 x__n__a0__n__a1__1
         
-    where n:span = n:a0 | n:a1 | n:a2.
-    
-    The replacements are hung onto the replaced constraints and predicates using a 
-    '_spanned' attribute.
+    The replacements are hung onto the replaced predicates using a '_spanned' 
+    attribute.
     """
-    def _segment_variable(span, segment, i):
-        _ = u'__'.join(
-            (span.variable.name, span.binding.namespace.mangled, 
-             span.binding.name, str(i)))
-        return Variable(name=_, concept=segment.predicate.range)
+    def _segment_variable(start, span, path, i):
+        _ = [start.name]
+        for p in path[:i+1]:
+            _.extend((p.namespace.code, p.name))
+        _.append(str(i))
+        return Variable(name=u'__'.join(_).replace('-', '_'), concept=path[i].range, 
+            optional=span.optional)
     
-    def _segments(start, span, segments, length, end=None):
+    def _segments(start, span, path):
         variables, constraints = [], []
         previous = start
-        for s, i in zip(segments, range(0, length)):
-            if s.predicate.literal:
-                continue
-            if i < length - 1 and not end is None:
-                _ = end
-            else:
-                _ = _segment_variable(span, s, i)
+        for i, s in enumerate(path[:-1]):
+            _ = _segment_variable(start, span, path, i)
             variables.append(_)
-            constraints.append(
-                Constraint(subject=previous, predicate=s.predicate, object=_))
+            constraints.append(Constraint(
+                subject=previous, 
+                predicate=PredicateRef(binding=s, variable=previous), 
+                object=_))
             previous = _
         span._spanned = PredicateRef(
-            binding=segments[len(segments)-1].predicate, 
-            variable=variables[len(variables)-1])
+            binding=path[-1], variable=previous, optional=span.optional)
         return variables, constraints        
     
     variables, constraints = [], []
-    for p in ast.predicates:
-        length = p.binding.segments.count()
-        if 0 < length:
-            vv, cc = _segments(p.variable, p, p.binding.segments, length)
+    for p in references(ast):
+        if hasattr(p, '_path'):
+            path = p._path
+        else:
+            path = p.binding.segments
+        if 1 < len(path):
+            vv, cc = _segments(p.variable, p, path)
             variables.extend(vv)
             constraints.extend(cc)
-    for c in ast.constraints:
-        p = c.predicate
-        length = p.binding.segments.count()
-        if 0 < length:
-            vv, cc = _segments(c.subject, p, p.binding.segments, length, c.object)
-            variables.extend(vv)
-            c._spanned = cc
     ast.variables.add(*variables)
     ast.constraints.extend(constraints)
     return ast
@@ -247,6 +493,14 @@ def _generalize(ast):
             subject=reference, predicate=pref, object=reference.concept.binding.id)
         return (ccon,)
     
+    def _value(range):
+        """
+        Returns the predicate for the value column of the literal range.
+        """
+        # Must match identical construction in magic._compiler_support:
+        opname = '_%s%svalue' % (range.namespace.code, range.name)
+        return Predicate.objects.get(resource__name=opname, resource__namespace=DRDFS)
+    
     def _predicate(reference):
         """
         Code generation for a generic predicate needs to use the RDF model tables. 
@@ -274,31 +528,27 @@ def _generalize(ast):
             reference.binding.name,             # z
         ]
         svar = Variable(
-            name=u'__'.join(prefix + ['s']).replace('-', '_'), concept=STATEMENT)
+            name=u'__'.join(prefix + ['s']).replace('-', '_'), concept=STATEMENT, 
+            optional=reference.optional)
         scon = Constraint(subject=svar, predicate=SUBJECT, object=reference.variable)
         pcon = Constraint(
             subject=svar, predicate=PREDICATE, object=reference.binding.id)
         ovar = Variable(
             name=u'__'.join(prefix + ['o']).replace('-', '_'), 
-            concept=reference.binding.range)
+            concept=reference.binding.range, optional=reference.optional)
         ocon = Constraint(subject=svar, predicate=OBJECT, object=ovar)
         if reference.binding.literal:
             if not reference.binding == ABOUT:
-                # Must match identical construction in magic._compiler_support:
-                opname = '_%s%svalue' \
-                    % (reference.binding.range.namespace.code, 
-                       reference.binding.range.name)
-                opname.replace('-', '_')
-                opred = Predicate.objects.get(
-                    resource__name=opname, resource__namespace=DRDFS)
-                opref = PredicateRef(binding=opred, variable=ovar)
+                opref = PredicateRef(binding=_value(reference.binding.range), 
+                    variable=ovar, optional=reference.optional)
             else:
                 opref = reference # rdf:about is a special case...
         else:
             # Using rdf:about to indicate the URI of the resource. 
             # This is kind of broken in that the query will actually return the local 
             # name of the resource instead of the URI.
-            opref = PredicateRef(binding=ABOUT, variable=ovar)
+            opref = PredicateRef(
+                binding=ABOUT, variable=ovar, optional=reference.optional)
         assert not opref is None
         reference._generalized = opref
         variables.extend((svar, ovar))
@@ -313,22 +563,42 @@ def _generalize(ast):
             reference.predicate.binding.namespace.code,   # y
             reference.predicate.binding.name,             # z
         ]
+        # Constraints synthesized for the segments of optional paths are optional:
+        optional = reference.subject.optional or \
+            getattr(reference.object, 'optional', False)
         svar = Variable(
-            name=u'__'.join(prefix + ['s']).replace('-', '_'), concept=STATEMENT)
+            name=u'__'.join(prefix + ['s']).replace('-', '_'), concept=STATEMENT, 
+            optional=optional)
         scon = Constraint(
             subject=svar, predicate=SUBJECT, object=reference.predicate.variable)
         pcon = Constraint(
             subject=svar, predicate=PREDICATE, object=reference.predicate.binding.id)
-        ocon = Constraint(subject=svar, predicate=OBJECT, object=reference.object)
         variables.append(svar)
-        reference._generalized = (scon, pcon, ocon)
+        range = reference.predicate.binding.range
+        if _constant(reference.object) and range.literal:
+            # Constants are compared with the value column of the literal table, 
+            # where the value indexes are:
+            ovar = Variable(
+                name=u'__'.join(prefix + ['o']).replace('-', '_'), concept=range, 
+                optional=optional)
+            ocon = Constraint(subject=svar, predicate=OBJECT, object=ovar)
+            vcon = Constraint(
+                subject=ovar, 
+                predicate=PredicateRef(binding=_value(range), variable=ovar), 
+                object=reference.object, operator=reference.operator)
+            variables.append(ovar)
+            reference._generalized = (scon, pcon, ocon, vcon)
+        else:
+            ocon = Constraint(subject=svar, predicate=OBJECT, object=reference.object, 
+                operator=reference.operator)
+            reference._generalized = (scon, pcon, ocon)
         return variables
 
     variables, constraints = [], []
     for v in ast.variables:
         if v.concept.binding.generic:
             constraints.extend(_variable(v))
-    for p in ast.predicates:
+    for p in references(ast):
         if hasattr(p, '_spanned'):
             p = p._spanned
         if p.binding.generic:
@@ -336,13 +606,149 @@ def _generalize(ast):
             variables.extend(vv)
             constraints.extend(cc)
     for c in ast.constraints:
-        if c.predicate.binding.generic:
+        if c.predicate.binding.generic and not c.predicate.closure:
             variables.extend(_constraint(c))
     ast.variables.add(*variables) # IGNORE:W0142
     ast.constraints.extend(constraints)
     return ast
     
 
+class _PredicateGraph(object):
+    """
+    In-memory view of the domain/range graph formed by the predicates that link 
+    one concept to another. Loaded from the database once, then consulted for 
+    every property path the compiler resolves.
+    """
+    
+    def __init__(self):
+        from rdf.models import Concept, Predicate
+        self._concepts = dict([(c.id, c) for c in Concept.objects.all()])
+        self._egress, self._ancestors = {}, {}
+        self._bases = self._load_bases(Concept)
+        for p in Predicate.objects.filter(range__isnull=False):
+            range_ = self._concepts[p.range_id]
+            if p.is_span or range_.literal or range_.model_name in (
+                'rdf.models.Concept', 'rdf.models.Predicate'):
+                continue
+            self._egress.setdefault(p.domain_id, []).append(p)
+        # Predicates with rdfs:Resource for a domain apply to every concept:
+        self._universal = Concept.objects.get(
+            resource__namespace__code='rdfs', resource__name='Resource').id
+    
+    def _load_bases(self, Concept):
+        """
+        Returns a map from concept identifiers to the identifiers of their bases, 
+        read from the table of the bases relation in a single query.
+        """
+        field = Concept._meta.get_field('bases') # IGNORE:W0212
+        qn = connection.ops.quote_name
+        cursor = connection.cursor() # IGNORE:E1101
+        cursor.execute('SELECT %s, %s FROM %s' % (qn(field.m2m_column_name()), 
+            qn(field.m2m_reverse_name()), qn(field.m2m_db_table())))
+        bases = {}
+        for derived, base in cursor.fetchall():
+            bases.setdefault(derived, []).append(base)
+        return bases
+    
+    def concept(self, pk):
+        return self._concepts[pk]
+    
+    def applies(self, predicate, concept):
+        """
+        True if and only if the predicate can be applied to resources of the concept, 
+        either directly or through one of its bases.
+        """
+        return predicate.domain_id == self._universal \
+            or predicate.domain_id in self.ancestors(concept)
+        
+    def ancestors(self, concept):
+        """
+        Returns the identifiers of the concept and all of its bases.
+        """
+        if not self._ancestors.has_key(concept.id):
+            remaining, done = [concept.id], set()
+            while remaining:
+                pk = remaining.pop()
+                done.add(pk)
+                for b in self._bases.get(pk, ()):
+                    if not b in done:
+                        remaining.append(b)
+            self._ancestors[concept.id] = done
+        return self._ancestors[concept.id]
+    
+    def egress(self, concept):
+        """
+        Yields the predicates leading from resources of the concept to resources 
+        of other concepts. 
+        """
+        for pk in self.ancestors(concept):
+            for p in self._egress.get(pk, ()):
+                yield p
+    
+    def shortest_path(self, start, target):
+        """
+        Returns the shortest list of predicates leading from the concept `start` 
+        to a concept that the predicate `target` applies to, or None if there 
+        is no such list. A breadth-first search, so cycles are harmless.
+        """
+        if self.applies(target, start):
+            return []
+        visited, queue = set([start.id]), [(start, [])]
+        while queue:
+            concept, path = queue.pop(0)
+            for p in self.egress(concept):
+                if p.range_id in visited:
+                    continue
+                visited.add(p.range_id)
+                range_ = self._concepts[p.range_id]
+                if self.applies(target, range_):
+                    return path + [p]
+                queue.append((range_, path + [p]))
+        return None
+
+
+_graph = None
+_paths = {}
+
+
+def resolve_path(concept, predicates):
+    """
+    Returns the complete list of predicates for a property path that starts at the 
+    parameter concept and passes through the parameter predicates, in order. Gaps 
+    between consecutive predicates are filled with the shortest connecting chain 
+    of predicates. Only the last predicate may have a literal range.
+    
+    Resolved paths are cached until the ontology changes.
+    """
+    global _graph
+    key = (concept.id,) + tuple([p.id for p in predicates])
+    if not _paths.has_key(key):
+        if _graph is None:
+            _graph = _PredicateGraph()
+        path, current = [], concept
+        for p in predicates:
+            if current is None or current.literal:
+                raise NoPath(current, p)
+            gap = _graph.shortest_path(current, p)
+            if gap is None:
+                raise NoPath(current, p)
+            path.extend(gap)
+            path.append(p)
+            current = _graph.concept(p.range_id) if not p.range_id is None else None
+        _paths[key] = tuple(path)
+    return list(_paths[key])
+
+
+def reset_paths():
+    """
+    Discards the predicate graph and the resolved paths. Connected to the 
+    predicate signals in rdf.models. 
+    """
+    global _graph
+    _graph = None
+    _paths.clear()
+
+
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.
 # 
@@ -3,7 +3,7 @@ from rdf.query.lex import lex, tokens
 
 
 def p_rdql(p):
-    'rdql : select from where using range'
+    'rdql : select from where using group order range'
     p[0] = p.parser
 
 
@@ -11,6 +11,11 @@ def p_select(p):
     'select : SELECT variable_and_predicate predicates'
     p[0] = p.parser.predicates
     
+def p_select_distinct(p):
+    'select : SELECT DISTINCT variable_and_predicate predicates'
+    p.parser.distinct = True
+    p[0] = p.parser.predicates
+    
 def p_select_all(p):
     'select : SELECT ASTERISK'
     # Can't figure out the right semantics... SQL semantics, or mandatory preds?
@@ -63,6 +68,100 @@ def p_using(p):
     'using : USING namespace namespaces'
     p[0] = p.parser.namespaces
     
+
+
+def p_empty_group(p):
+    'group : '
+    p[0] = None
+
+def p_group(p):
+    'group : GROUP BY group_key group_keys'
+    p[0] = p.parser.groupings
+
+def p_group_keys(p):
+    'group_keys : COMMA group_key group_keys'
+    p[0] = p.parser.groupings
+
+def p_no_group_keys(p):
+    'group_keys : '
+    p[0] = p.parser.groupings
+
+def p_group_key(p):
+    'group_key : variable_name DOT predicate_path'
+    p.parser.groupings.append(_key(p.parser, _reference(p[1], p[3])))
+    p[0] = p.parser.groupings
+
+def p_group_key_without_variable(p):
+    'group_key : predicate_name_or_code'
+    p[1].variable = p.parser.variables.DEFAULT
+    p.parser.groupings.append(_key(p.parser, p[1]))
+    p[0] = p.parser.groupings
+
+
+def p_empty_order(p):
+    'order : '
+    p[0] = None
+
+def p_order(p):
+    'order : ORDER BY ordering orderings'
+    p[0] = p.parser.orderings
+
+def p_orderings(p):
+    'orderings : COMMA ordering orderings'
+    p[0] = p.parser.orderings
+
+def p_no_orderings(p):
+    'orderings : '
+    p[0] = p.parser.orderings
+
+def p_ordering(p):
+    '''ordering : order_key
+                | order_key ASC'''
+    p.parser.orderings.append(ast.Ordering(p[1], position=p[1].position))
+    p[0] = p.parser.orderings
+
+def p_descending_ordering(p):
+    'ordering : order_key DESC'
+    p.parser.orderings.append(
+        ast.Ordering(p[1], descending=True, position=p[1].position))
+    p[0] = p.parser.orderings
+
+def p_order_key(p):
+    'order_key : variable_name DOT predicate_path'
+    p[0] = _key(p.parser, _reference(p[1], p[3]))
+
+def p_order_key_without_variable(p):
+    'order_key : predicate_name_or_code'
+    p[1].variable = p.parser.variables.DEFAULT
+    p[0] = _key(p.parser, p[1])
+
+def p_aggregate_order_key(p):
+    'order_key : aggregate LPAREN variable_name DOT predicate_path RPAREN'
+    reference = _reference(p[3], p[5])
+    reference.aggregate = p[1]
+    p[0] = _key(p.parser, reference)
+
+def _key(parser, reference):
+    """
+    Returns the selected predicate or group key the order or group key repeats, 
+    if any. Otherwise the reference is made optional unless the where clause 
+    constrains it, so that ordering and grouping don't restrict the results. 
+    """
+    key = _path_key(reference)
+    for selected in parser.predicates + parser.groupings:
+        if key == _path_key(selected):
+            return selected
+    for c in parser.constraints:
+        if key == (c.subject.name, [(c.predicate.namespace, c.predicate.name)], None):
+            return reference
+    reference.optional = True
+    return reference
+
+def _path_key(reference):
+    path = reference.path or [reference]
+    return reference.variable.name, [(s.namespace, s.name) for s in path], \
+        reference.aggregate
+
     
 def p_empty_range(p):
     'range : '
@@ -96,17 +195,53 @@ def p_offset(p):
 
 
 def p_variable_and_predicate(p):
-    'variable_and_predicate : variable_name DOT predicate_name_or_code'
-    p[3].variable = p.parser.variables[p[1]]
-    p.parser.predicates.append(p[3])
+    'variable_and_predicate : variable_name DOT predicate_path'
+    p.parser.predicates.append(_reference(p[1], p[3]))
+    p[0] = p.parser.predicates
+
+def _reference(variable, path):
+    if 1 == len(path):
+        reference = path[0]
+    else:
+        last = path[-1]
+        reference = ast.PredicateRef(
+            name=last.name, namespace=last.namespace, position=path[0].position, 
+            path=path)
+    reference.variable = variable
+    return reference
+    
+def p_optional_variable_and_predicate(p):
+    'variable_and_predicate : OPTIONAL variable_and_predicate'
+    p.parser.predicates[-1].optional = True
     p[0] = p.parser.predicates
     
+def p_aggregate_variable_and_predicate(p):
+    'variable_and_predicate : aggregate LPAREN variable_and_predicate RPAREN'
+    p.parser.predicates[-1].aggregate = p[1]
+    p[0] = p.parser.predicates
+
+def p_aggregate(p):
+    '''aggregate : COUNT
+                 | SUM
+                 | MIN
+                 | MAX
+                 | AVG'''
+    p[0] = p[1].lower()
+    
 def p_predicate_without_variable(p):
     'variable_and_predicate : predicate_name_or_code'
     p[1].variable = p.parser.variables.DEFAULT
     p.parser.predicates.append(p[1])
     p[0] = p.parser.predicates
     
+def p_predicate_path(p):
+    'predicate_path : predicate_name_or_code DOT predicate_path'
+    p[0] = [p[1]] + p[3]
+
+def p_predicate_path_end(p):
+    'predicate_path : predicate_name_or_code'
+    p[0] = [p[1]]
+    
 def p_predicate_name_or_code(p):
     'predicate_name_or_code : SYMBOL'
     name, namespace = p[1], None
@@ -159,15 +294,15 @@ def p_constant_not_variable_name(p):
     
 def p_string_constant(p):
     'constant : STRING'
-    p[0] = '"' + p[1] + '"'
+    p[0] = ast.Constant(p[1], position=(p.lineno(1), p.lexpos(1)))
     
 def p_decimal_constant(p):
     'constant : DECIMAL'
-    p[0] = p[1]
+    p[0] = ast.Constant(p[1], position=(p.lineno(1), p.lexpos(1)))
 
 def p_integer_constant(p):
     'constant : INTEGER'
-    p[0] = p[1]
+    p[0] = ast.Constant(p[1], position=(p.lineno(1), p.lexpos(1)))
 
 
 def p_constraint(p):
@@ -178,6 +313,64 @@ def p_constraint(p):
     p.parser.constraints.append(c)
     p[0] = c
 
+def p_closure_constraint(p):
+    'constraint : variable_name transitive_predicate variable_name'
+    c = ast.Constraint(
+        subject=p[1], predicate=p[2], object=p[3], 
+        position=(p.lineno(1), p.lexpos(1)))
+    p.parser.constraints.append(c)
+    p[0] = c
+
+def p_transitive_predicate(p):
+    '''transitive_predicate : predicate_name_or_code PLUS depth
+                            | predicate_name_or_code ASTERISK depth'''
+    p[1].closure, p[1].depth = p[2], p[3]
+    p[0] = p[1]
+
+def p_no_depth(p):
+    'depth : '
+    p[0] = None
+
+def p_depth(p):
+    'depth : LBRACE INTEGER RBRACE'
+    if 1 > p[2]:
+        raise SyntaxError(u'the maximum depth of a path must be positive, not %s' % p[2])
+    p[0] = p[2]
+
+def p_comparison_constraint(p):
+    'constraint : variable_name predicate_name_or_code comparison constant'
+    c = ast.Constraint(
+        subject=p[1], predicate=p[2], object=p[4], operator=p[3],
+        position=(p.lineno(1), p.lexpos(1)))
+    p.parser.constraints.append(c)
+    p[0] = c
+
+def p_in_constraint(p):
+    'constraint : variable_name predicate_name_or_code IN LPAREN constant constant_list RPAREN'
+    c = ast.Constraint(
+        subject=p[1], predicate=p[2], object=[p[5]] + p[6], operator='in',
+        position=(p.lineno(1), p.lexpos(1)))
+    p.parser.constraints.append(c)
+    p[0] = c
+
+def p_comparison(p):
+    '''comparison : EQ
+                  | NE
+                  | LT
+                  | LE
+                  | GT
+                  | GE
+                  | LIKE'''
+    p[0] = p[1].lower()
+
+def p_constant_list(p):
+    'constant_list : COMMA constant constant_list'
+    p[0] = [p[2]] + p[3]
+
+def p_no_constant_list(p):
+    'constant_list : '
+    p[0] = []
+
 
 def p_namespaces(p):
     'namespaces : COMMA namespace namespaces'
@@ -221,6 +414,9 @@ def Parser():
     _.variables = ast.Variables()
     _.predicates = ast.Predicates()
     _.constraints = ast.Constraints()
+    _.groupings = ast.Predicates()
+    _.orderings = ast.Orderings()
+    _.distinct = False
     return _
 
 
@@ -2,8 +2,10 @@ import re, sys, traceback
 from xml.etree.cElementTree import ElementTree, iterparse
 
 from django.db.models import Q
+from django.dispatch import dispatcher
 
-from ..models import Namespace, Resource
+from ..models import Concept, Namespace, Resource, bulk_post_save
+from ..shortcuts import get, lazy
 
 
 class _DFacade(object):
@@ -37,6 +39,33 @@ class _DFacade(object):
     graceful = property(__getgraceful, __setgraceful)
     
     
+class _Vocabulary(object):
+    '''
+    Holds the namespaces, concepts and tags a deserializer refers to. Every term 
+    is declared with lazy, so nothing is looked up until first use and importing 
+    a deserializer costs no queries. The cached terms are discarded whenever the 
+    ontology is bulk loaded.
+    '''
+    
+    def __init__(self):
+        dispatcher.connect(self.reset, signal=bulk_post_save)
+        
+    def reset(self):
+        self.__dict__.pop('_lazy', None)
+
+
+def _namespace(code):
+    return lazy(lambda self: get(Namespace, code))
+
+
+def _concept(namespace, name):
+    return lazy(lambda self: get(Concept, getattr(self, namespace), name))
+
+
+def _tag(namespace, name):
+    return lazy(lambda self: _JC(getattr(self, namespace).uri, name))
+
+
 _TAGSPLITTER = re.compile(r'{([^}]*)}(.*)')
 
 
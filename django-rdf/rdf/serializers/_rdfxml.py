@@ -2,51 +2,54 @@ from django.core.exceptions import ObjectDoesNotExist
 
 from rdf.models import Cardinality, Namespace, Ontology, Predicate, Resource, \
     Statement, Concept
-from rdf.shortcuts import get
+from rdf.serializers import _JC, _split_URI, _DXML, _Vocabulary, _concept, \
+    _namespace, _tag
 
-from rdf.serializers import _JC, _split_URI, _DXML 
 
+class _Terms(_Vocabulary):
+    
+    RDF = _namespace('rdf')
+    RDFS = _namespace('rdfs')
+    OWL = _namespace('owl')
+    DC = _namespace('dc')
+    DRDFS = _namespace('drdfs')
+    
+    RESOURCE = _concept('RDFS', 'Resource')
+    CONCEPT = _concept('RDFS', 'Class')
+    LITERAL = _concept('RDFS', 'Literal')
+    PREDICATE = _concept('RDF', 'Property')
+    
+    RDF_RDF = _tag('RDF', 'RDF')
+    RDF_DESCRIPTION = _tag('RDF', 'Description')
+    RDF_RESOURCE = _tag('RDF', 'resource')
+    RDF_ID = _tag('RDF', 'ID')
+    RDF_ABOUT = _tag('RDF', 'about')
+    RDF_PROPERTY = _tag('RDF', 'Property')
 
-RDF = get(Namespace, 'rdf')
-RDFS = get(Namespace, 'rdfs')
-OWL = get(Namespace, 'owl')
-DC = get(Namespace, 'dc')
-DRDFS = get(Namespace, 'drdfs')
-
-RESOURCE, CONCEPT, LITERAL, PREDICATE = get(
-    (Concept, RDFS, 'Resource'), 
-    (Concept, RDFS, 'Class'), 
-    (Concept, RDFS, 'Literal'), 
-    (Concept, RDF, 'Property'))
+    RDFS_CLASS = _tag('RDFS', 'Class')
+    RDFS_LITERAL = _tag('RDFS', 'Literal')
+    RDFS_DATATYPE = _tag('RDFS', 'Datatype')
+    RDFS_DOMAIN = _tag('RDFS', 'domain')
+    RDFS_RANGE = _tag('RDFS', 'range')
+    RDFS_LABEL = _tag('RDFS', 'label')
+    RDFS_COMMENT = _tag('RDFS', 'comment')
+    RDFS_ISDEFINEDBY = _tag('RDFS', 'isDefinedBy')
+    RDFS_SUBCLASSOF = _tag('RDFS', 'subClassOf')
+    RDFS_SUBPROPERTYOF = _tag('RDFS', 'subPropertyOf')
 
-RDF_RDF = _JC(RDF.uri, 'RDF')
-RDF_DESCRIPTION = _JC(RDF.uri, 'Description')
-RDF_RESOURCE = _JC(RDF.uri, 'resource')
-RDF_ID = _JC(RDF.uri, 'ID')
-RDF_ABOUT = _JC(RDF.uri, 'about')
-RDF_PROPERTY = _JC(RDF.uri, 'Property')
+    OWL_ONTOLOGY = _tag('OWL', 'Ontology')
+    OWL_CLASS = _tag('OWL', 'Class')
 
-RDFS_CLASS = _JC(RDFS.uri, 'Class')
-RDFS_LITERAL = _JC(RDFS.uri, 'Literal')
-RDFS_DATATYPE = _JC(RDFS.uri, 'Datatype')
-RDFS_DOMAIN = _JC(RDFS.uri, 'domain')
-RDFS_RANGE = _JC(RDFS.uri, 'range')
-RDFS_LABEL = _JC(RDFS.uri, 'label')
-RDFS_COMMENT = _JC(RDFS.uri, 'comment')
-RDFS_ISDEFINEDBY = _JC(RDFS.uri, 'isDefinedBy')
-RDFS_SUBCLASSOF = _JC(RDFS.uri, 'subClassOf')
-RDFS_SUBPROPERTYOF = _JC(RDFS.uri, 'subPropertyOf')
+    DC_TITLE = _tag('DC', 'title')
+    DC_DESCRIPTION = _tag('DC', 'description')
 
-OWL_ONTOLOGY = _JC(OWL.uri, 'Ontology')
-OWL_CLASS = _JC(OWL.uri, 'Class')
+    DRDFS_MODEL = _tag('DRDFS', 'model')
+    DRDFS_FIELD = _tag('DRDFS', 'field')
+    DRDFS_CARDINALITY = _tag('DRDFS', 'cardinality')
+    DRDFS_INTERNAL = _tag('DRDFS', 'internal')
 
-DC_TITLE = _JC(DC.uri, 'title')
-DC_DESCRIPTION = _JC(DC.uri, 'description')
 
-DRDFS_MODEL = _JC(DRDFS.uri, 'model')
-DRDFS_FIELD = _JC(DRDFS.uri, 'field')
-DRDFS_CARDINALITY = _JC(DRDFS.uri, 'cardinality')
-DRDFS_INTERNAL = _JC(DRDFS.uri, 'internal')
+_T = _Terms()
 
 
 class _Deserializer(_DXML):
@@ -54,13 +57,13 @@ class _Deserializer(_DXML):
     def __init__(self, ontology_path, **options):
         _DXML.__init__(self,
             ontology_path, # IGNORE:E1101
-            {RDF_RDF: self._trivial, # IGNORE:E1101
-             RDF_DESCRIPTION: self._trivial, # IGNORE:E1101 
-             OWL_ONTOLOGY: self._owl_ontology, 
-             RDFS_CLASS: self._rdfs_class, 
-             RDFS_LITERAL: self._rdfs_class, 
-             RDFS_DATATYPE: self._trivial, 
-             RDF_PROPERTY: self._rdf_property,},
+            {_T.RDF_RDF: self._trivial, # IGNORE:E1101
+             _T.RDF_DESCRIPTION: self._trivial, # IGNORE:E1101 
+             _T.OWL_ONTOLOGY: self._owl_ontology, 
+             _T.RDFS_CLASS: self._rdfs_class, 
+             _T.RDFS_LITERAL: self._rdfs_class, 
+             _T.RDFS_DATATYPE: self._trivial, 
+             _T.RDF_PROPERTY: self._rdf_property,},
              self._rdf_resource,
             **options)
         self._ontology = None
@@ -101,18 +104,18 @@ class _Deserializer(_DXML):
             t.save()
 
     def _owl_ontology(self, e):
-        ns_uri = e.get(RDF_ABOUT)
+        ns_uri = e.get(_T.RDF_ABOUT)
         namespace = Namespace.objects.get(resource__name=ns_uri)
-        title = e.find(DC_TITLE)
+        title = e.find(_T.DC_TITLE)
         if not title is None:
             title = title.text
         if title is None:
-            title = e.get(DC_TITLE)
+            title = e.get(_T.DC_TITLE)
         if title is None:
             title = namespace.uri
-        description = e.find(DC_DESCRIPTION)
+        description = e.find(_T.DC_DESCRIPTION)
         description = title if description is None else description.text
-        internal = e.find(DRDFS_INTERNAL)
+        internal = e.find(_T.DRDFS_INTERNAL)
         internal = True if internal == 'true' else False 
         match = Ontology.objects.filter(resource=namespace.resource) 
         ontology = None
@@ -132,8 +135,8 @@ class _Deserializer(_DXML):
                     
     def _rdfs_class(self, e):
         try:
-            label = e.find(RDFS_LABEL).text
-            literal = True if (RDFS_LITERAL == e.tag) else False 
+            label = e.find(_T.RDFS_LABEL).text
+            literal = True if (_T.RDFS_LITERAL == e.tag) else False 
             resource = self._rdfs_class_resource(e, label, literal)
             yield resource 
             concept = self._rdfs_class_concept(e, label, literal, resource)
@@ -143,9 +146,9 @@ class _Deserializer(_DXML):
 'Failed to parse concept, use --verbosity, --traceback and --graceful to diagnose.')
 
     def _rdfs_class_isdefinedby(self, e, label):
-        isdefinedby = e.find(RDFS_ISDEFINEDBY)
+        isdefinedby = e.find(_T.RDFS_ISDEFINEDBY)
         if not isdefinedby is None:
-            ns_uri = isdefinedby.get(RDF_RESOURCE)
+            ns_uri = isdefinedby.get(_T.RDF_RESOURCE)
         elif not self._ontology is None:
             ns_uri = self._ontology.namespace.uri # IGNORE:E1103
         else:
@@ -155,7 +158,7 @@ class _Deserializer(_DXML):
     def _rdfs_class_resource(self, e, label, literal):
         isdefinedby, ns_uri = self._rdfs_class_isdefinedby(e, label)
         namespace=Namespace.objects.get(resource__name=ns_uri)
-        about = e.get(RDF_ABOUT)
+        about = e.get(_T.RDF_ABOUT)
         if isdefinedby and about:
             assert ns_uri == about[:len(ns_uri)]
         name = about[len(ns_uri):] if about else label
@@ -164,16 +167,16 @@ class _Deserializer(_DXML):
             resource = Resource(
                 namespace=namespace, 
                 name=name,
-                type=LITERAL if literal else CONCEPT)
+                type=_T.LITERAL if literal else _T.CONCEPT)
         else:
             resource = match[0]
-            resource.type = LITERAL if literal else CONCEPT
+            resource.type = _T.LITERAL if literal else _T.CONCEPT
         return resource
     
     def _rdfs_class_concept(self, e, label, literal, resource): 
-        description = e.find(RDFS_COMMENT)
+        description = e.find(_T.RDFS_COMMENT)
         description = label.title() if description is None else description.text
-        model_name = e.find(DRDFS_MODEL)
+        model_name = e.find(_T.DRDFS_MODEL)
         if model_name is not None:
             model_name = model_name.text
         match = Concept.objects.filter(resource=resource)
@@ -197,16 +200,16 @@ class _Deserializer(_DXML):
         return concept
 
     def _rdfs_class_subclassof(self, e, concept):
-        b = e.find(RDFS_SUBCLASSOF)
+        b = e.find(_T.RDFS_SUBCLASSOF)
         if b is None: return
-        b = b.get(RDF_RESOURCE)
+        b = b.get(_T.RDF_RESOURCE)
         if b is None: return
         bns, bname = _split_URI(b)
         self._superconcepts.append((concept, bns, bname))                
 
     def _rdf_property(self, e):
         try: 
-            label = e.find(RDFS_LABEL).text
+            label = e.find(_T.RDFS_LABEL).text
             resource, create = self._rdf_property_resource(e, label)
             if create is True: yield resource
             domain, create = _rdf_property_domain(e)
@@ -241,26 +244,26 @@ class _Deserializer(_DXML):
     
     def _rdf_property_resource(self, e, label):
         create = False
-        ns_uri = e.find(RDFS_ISDEFINEDBY)
+        ns_uri = e.find(_T.RDFS_ISDEFINEDBY)
         if not ns_uri is None:
-            ns_uri = ns_uri.get(RDF_RESOURCE)
+            ns_uri = ns_uri.get(_T.RDF_RESOURCE)
         elif not self._ontology is None:
             ns_uri = self._ontology.namespace.uri # IGNORE:E1103
         namespace = Namespace.objects.get(resource__name=ns_uri)
-        about = e.get(RDF_ABOUT)
+        about = e.get(_T.RDF_ABOUT)
         name = about[len(ns_uri):] if about else label
         match = Resource.objects.filter(namespace=namespace, name=name)
         if 1 > match.count():
-            resource = Resource(namespace=namespace, name=name, type=PREDICATE)
+            resource = Resource(namespace=namespace, name=name, type=_T.PREDICATE)
             create = True
         else:
             resource = match[0]
         return resource, create
     
     def _rdf_property_subpropertyof(self, e, predicate):
-        b = e.find(RDFS_SUBPROPERTYOF)
+        b = e.find(_T.RDFS_SUBPROPERTYOF)
         if b is None: return
-        b = b.get(RDF_RESOURCE)
+        b = b.get(_T.RDF_RESOURCE)
         if b is None: return
         bns, bname = _split_URI(b)
         self._superpredicates.append((predicate, bns, bname))    
@@ -275,9 +278,9 @@ class _Deserializer(_DXML):
         if concept is None or not isinstance(concept, Concept):
             return
         
-        uri = e.get(RDF_ABOUT)
+        uri = e.get(_T.RDF_ABOUT)
         if uri is None:
-            uri = e.get(RDF_ID) # Either about or ID are required
+            uri = e.get(_T.RDF_ID) # Either about or ID are required
         RNS, rn = _split_URI(uri)
         if RNS is None:
             RNS = self._ontology.namespace # Best guess
@@ -298,32 +301,32 @@ class _Deserializer(_DXML):
                 
 def _rdf_property_domain(e):
     create = False
-    de = e.find(RDFS_DOMAIN)
+    de = e.find(_T.RDFS_DOMAIN)
     if de is None:
-        domain = RESOURCE
+        domain = _T.RESOURCE
     else:
-        dns, dn = _split_URI(de.get(RDF_RESOURCE))
+        dns, dn = _split_URI(de.get(_T.RDF_RESOURCE))
         try: 
             domain = Concept.objects.get(resource__namespace=dns, resource__name=dn)
         except Concept.DoesNotExist: # IGNORE:E1101
             r, _ = Resource.objects.get_or_create(
-                namespace=dns, name=dn, defaults=dict(type=CONCEPT))
+                namespace=dns, name=dn, defaults=dict(type=_T.CONCEPT))
             domain = Concept(resource=r, title=dn.title())
             create = True
     return domain, create
 
 def _rdf_property_range(e):
     create = False
-    re = e.find(RDFS_RANGE)
+    re = e.find(_T.RDFS_RANGE)
     if re is None:
-        range = RESOURCE
+        range = _T.RESOURCE
     else:
-        rns, rn = _split_URI(re.get(RDF_RESOURCE))
+        rns, rn = _split_URI(re.get(_T.RDF_RESOURCE))
         assert not rns is None
         assert '' != rn
         try:
             r, _ = Resource.objects.get_or_create(
-                namespace=rns, name=rn, defaults=dict(type=CONCEPT))
+                namespace=rns, name=rn, defaults=dict(type=_T.CONCEPT))
             range = Concept.objects.get(resource=r)
         except Concept.DoesNotExist: # IGNORE:E1101
             range = Concept(resource=r, title=rn.title())
@@ -331,13 +334,13 @@ def _rdf_property_range(e):
     return range, create
                 
 def _rdf_property_field_name(e):
-    field_name = e.find(DRDFS_FIELD)
+    field_name = e.find(_T.DRDFS_FIELD)
     if field_name is not None:
         field_name = field_name.text
     return field_name
                 
 def _rdf_property_cardinality(e):
-    cardinality = e.find(DRDFS_CARDINALITY)
+    cardinality = e.find(_T.DRDFS_CARDINALITY)
     if cardinality is None:
         cardinality = Cardinality.objects.get(domain='*', range='*')
     else:
@@ -347,7 +350,7 @@ def _rdf_property_cardinality(e):
     return cardinality
 
 def _rdf_property_dc_description(e, label):
-    description = e.find(RDFS_COMMENT)
+    description = e.find(_T.RDFS_COMMENT)
     description = label if description is None else description.text
     return description
                 
@@ -365,9 +368,9 @@ def _rdf_resource_map_custom_model(e, resource, concept):
 # function that handles any predicate (instead of just dc:title and dc:description)
             
 def _rdf_resource_dc_title(e, resource):
-    title = e.find(DC_TITLE)
+    title = e.find(_T.DC_TITLE)
     if title is None: return None
-    kw = dict(subject=resource, predicate=DC['title'])
+    kw = dict(subject=resource, predicate=_T.DC['title'])
     match = Statement.objects.filter(**kw)
     if 0 < match.count():
         assert match.object == title.text
@@ -376,9 +379,9 @@ def _rdf_resource_dc_title(e, resource):
     return Statement(**kw)
 
 def _rdf_resource_dc_description(e, resource):
-    description = e.find(DC_DESCRIPTION)
+    description = e.find(_T.DC_DESCRIPTION)
     if description is None: return None 
-    kw = dict(subject=resource, predicate=DC['description'])
+    kw = dict(subject=resource, predicate=_T.DC['description'])
     match = Statement.objects.filter(**kw)
     if 0 < match.count():
         assert match.object == description.text
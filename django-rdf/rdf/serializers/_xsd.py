@@ -1,19 +1,28 @@
 import sys, traceback
 
 from ..models import Namespace, Ontology, Resource, Concept
-from ..serializers import _DXML, _JC, _split_URI
-from ..shortcuts import get
+from ..serializers import _DXML, _split_URI, _Vocabulary, _concept, _namespace, \
+    _tag
 
 
-XS, RDF, RDFS = get((Namespace, 'xs'), (Namespace, 'rdf'), (Namespace, 'rdfs'))
+TARGETNAMESPACE = 'targetNamespace'
 
-LITERAL = RDFS['Literal']
 
-TARGETNAMESPACE = 'targetNamespace'
-XS_SCHEMA = _JC(XS.uri, 'schema')
-XS_SIMPLETYPE = _JC(XS.uri, 'simpleType')
-XS_COMPLEXTYPE = _JC(XS.uri, 'complexType')
-XS_RESTRICTION = _JC(XS.uri, 'restriction')
+class _Terms(_Vocabulary):
+    
+    XS = _namespace('xs')
+    RDF = _namespace('rdf')
+    RDFS = _namespace('rdfs')
+
+    LITERAL = _concept('RDFS', 'Literal')
+
+    XS_SCHEMA = _tag('XS', 'schema')
+    XS_SIMPLETYPE = _tag('XS', 'simpleType')
+    XS_COMPLEXTYPE = _tag('XS', 'complexType')
+    XS_RESTRICTION = _tag('XS', 'restriction')
+
+
+_T = _Terms()
 
 
 class _Deserializer(_DXML):
@@ -21,8 +30,8 @@ class _Deserializer(_DXML):
     def __init__(self, ontology_path, **options):
         _DXML.__init__(self, # IGNORE:W0142
             ontology_path, 
-            {XS_SCHEMA: self._xs_schema,
-             XS_SIMPLETYPE: self._xs_simpletype,},
+            {_T.XS_SCHEMA: self._xs_schema,
+             _T.XS_SIMPLETYPE: self._xs_simpletype,},
             **options)
         self._ontology = None
         self._bases = []
@@ -59,7 +68,7 @@ class _Deserializer(_DXML):
         t = None
         if 0 <  match.count():
             t = match[0]
-            t.resource.type = LITERAL
+            t.resource.type = _T.LITERAL
             yield t.resource
             t.model_name = 'rdf.models.String'
             t.literal = True
@@ -67,7 +76,7 @@ class _Deserializer(_DXML):
             r = Resource(
                 namespace=ns, 
                 name=name, 
-                type=LITERAL)
+                type=_T.LITERAL)
             yield r
             t = Concept(
                 resource=r,
@@ -76,11 +85,11 @@ class _Deserializer(_DXML):
                 model_name='rdf.models.String',
                 literal=True)
         yield t
-        r = e.find(XS_RESTRICTION)
+        r = e.find(_T.XS_RESTRICTION)
         r = r.get('base') if r else None
         if r is not None:
             bns, bname = _split_URI(r)
-            if not (XS == bns and 'anySimpleType' == bname):
+            if not (_T.XS == bns and 'anySimpleType' == bname):
                 self._bases.append((t, bns, bname))
 
 
@@ -1,9 +1,11 @@
 from __future__ import with_statement
 from urllib import quote
 from random import random
+from threading import Lock
 
 
-__all__ = ('create', 'get', 'get_or_create', 'create_statements', 'import_class')
+__all__ = ('create', 'get', 'get_or_create', 'create_statements', 'import_class', 
+    'import_field', 'lazy', 'lru')
 
 
 def create(*args, **kwargs):
@@ -54,11 +56,131 @@ def create_statements(argslist):
     return saved
 
 
+_classes = {} # Absolute class name -> class
+_fields = {} # Absolute field name -> model field
+
+
 def import_class(absolutename):
-    i = absolutename.rindex('.')
-    modulename, classname = absolutename[0:i], absolutename[i+1:]
-    module = __import__(modulename, globals(), locals(), (str(classname),))
-    return getattr(module, classname)
+    """
+    Returns the class with the absolute name, e.g. 'rdf.models.Resource'. Classes 
+    are resolved once and cached until the app registry changes.
+    """
+    if not _classes.has_key(absolutename):
+        i = absolutename.rindex('.')
+        modulename, classname = absolutename[0:i], absolutename[i+1:]
+        module = __import__(modulename, globals(), locals(), (str(classname),))
+        _classes[absolutename] = getattr(module, classname)
+    return _classes[absolutename]
+
+
+def import_field(absolutename):
+    """
+    Returns the model field with the absolute name, e.g. 
+    'django.contrib.auth.models.User.username'. Fields are resolved once and 
+    cached until the app registry changes.
+    """
+    if not _fields.has_key(absolutename):
+        from django.db.models import get_model
+        _ = absolutename.split('.')
+        app_label, model_name, field_name = _[-4].lower(), _[-2], _[-1]
+        _fields[absolutename] = \
+            get_model(app_label, model_name)._meta.get_field(field_name) # IGNORE:W0212
+    return _fields[absolutename]
+
+
+def reset_imports():
+    """
+    Discards the cached classes and fields. Connected to the class_prepared 
+    signal, which is sent whenever a model class is added to the app registry.
+    """
+    _classes.clear()
+    _fields.clear()
+
+
+class lazy(object):
+    """
+    Descriptor that calls the wrapped function with the instance on first access 
+    and caches the result on that instance. This is meant for ontology constants 
+    that would otherwise cost a query at import time, e.g.
+
+        class Terms(object):
+            RDF = lazy(lambda self: get(Namespace, 'rdf'))
+
+    Deleting the instance's `_lazy` attribute discards every cached value.
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        cache = instance.__dict__.setdefault('_lazy', {})
+        if not cache.has_key(self):
+            cache[self] = self.function(instance)
+        return cache[self]
+
+
+class lru(object):
+    """
+    Dictionary-like cache holding at most `size` items. Reading or writing an 
+    item makes it the most recently used, and adding an item to a full cache 
+    discards the least recently used one. Safe to share between threads.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = Lock()
+        self.clear()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._links = {} # Key -> [previous, next, key, value]
+            self._root = root = [] # Sentinel of the circular list, most recent first
+            root[:] = [root, root, None, None]
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, key, default=None):
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is None:
+                return default
+            self._unlink(link)
+            self._link(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is None:
+                if len(self._links) >= self.size:
+                    oldest = self._root[0]
+                    self._unlink(oldest)
+                    del self._links[oldest[2]]
+                link = self._links[key] = [None, None, key, value]
+            else:
+                self._unlink(link)
+                link[3] = value
+            self._link(link)
+        finally:
+            self._lock.release()
+
+    def _link(self, link):
+        root = self._root
+        link[0], link[1] = root, root[1]
+        root[1][0] = root[1] = link
+
+    def _unlink(self, link): # IGNORE:R0201
+        link[0][1], link[1][0] = link[1], link[0]
 
 
 def render_to_response(*args, **kwargs):
@@ -0,0 +1,275 @@
+"""
+Slow-query log for RDQL.
+
+An RDQL execution is slow when the time spent compiling the query, executing its 
+SQL and fetching the rows exceeds a threshold. Compilation is charged to the 
+execution that follows it, so queries served from the compiled query cache are 
+charged for execution only, and results served from the result cache for the 
+cache lookup only. Each slow execution is recorded with the normalized 
+RDQL (see rdf.instrumentation.normalize), the constants stripped from it, the 
+generated SQL, the row count, and the compile and execute times. Repeated 
+fingerprints are aggregated as call counts and total times. 
+
+The log is an instrument (see rdf.instrumentation), enabled in the project 
+settings:
+
+    RDF_INSTRUMENTS = ('rdf.slowlog.SlowQueryLog',)
+    RDF_SLOW_QUERY_THRESHOLD = 500 # milliseconds, defaults to 1000
+
+Records are aggregated in the SlowQuery model table, one row per fingerprint. 
+Alternatively each slow execution is appended to a rotating log file, and the 
+aggregates are kept in process (see SlowQueryLog.statistics):
+
+    RDF_SLOW_QUERY_FILE = '/var/log/django/rdql-slow.log'
+    RDF_SLOW_QUERY_FILE_SIZE = 10 * 1024 * 1024 # bytes, the default
+    RDF_SLOW_QUERY_FILE_COUNT = 5 # backups, the default
+"""
+
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from threading import local
+import logging
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connection, transaction
+from django.dispatch import dispatcher
+from django.utils import simplejson
+
+from rdf.instrumentation import Instrument, constants, normalized
+
+
+COMPILE_STAGES = ('lex', 'parse', 'bind', 'span', 'generalize', 'optimize', 'generate')
+EXECUTE_STAGES = ('execute', 'fetch', 'cache hit')
+
+
+class Record(object):
+    
+    def __init__(self, fingerprint, rdql, sql, params, rows, compile_time, execute_time):
+        self.fingerprint = fingerprint
+        self.rdql = rdql
+        self.sql = sql
+        self.params = params
+        self.rows = rows
+        self.compile_time, self.execute_time = compile_time, execute_time
+        self.total_time = compile_time + execute_time
+        self.time = datetime.now()
+        
+    def __unicode__(self):
+        return u'\t'.join([self.fingerprint] + \
+            [u'%.2f' % (1000 * _) for _ in \
+                (self.total_time, self.compile_time, self.execute_time)] + \
+            [unicode(self.rows), self.rdql, self.sql, simplejson.dumps(self.params)])
+    
+
+class Statistics(object):
+    
+    def __init__(self, fingerprint, rdql):
+        self.fingerprint, self.rdql = fingerprint, rdql
+        self.calls, self.rows = 0, 0
+        self.total_time, self.compile_time, self.execute_time = 0.0, 0.0, 0.0
+        self.max_time = 0.0
+        self.sql, self.params = None, None
+        
+    def add(self, record):
+        self.calls += 1
+        self.rows += record.rows or 0
+        self.total_time += record.total_time
+        self.compile_time += record.compile_time
+        self.execute_time += record.execute_time
+        self.max_time = max(self.max_time, record.total_time)
+        self.sql, self.params = record.sql, record.params
+        
+        
+class SlowQueryLog(Instrument):
+    
+    def __init__(self, threshold=None, filename=None):
+        """
+        The threshold is in milliseconds. Records go to the SlowQuery model table 
+        unless a file is named, here or in the settings.
+        """
+        if threshold is None:
+            threshold = getattr(settings, 'RDF_SLOW_QUERY_THRESHOLD', 1000)
+        self.threshold = threshold / 1000.0
+        if filename is None:
+            filename = getattr(settings, 'RDF_SLOW_QUERY_FILE', None)
+        self.logger = None if filename is None else _logger(filename)
+        self.statistics = {} # Fingerprint -> Statistics, for this process
+        self._local = local()
+        
+    def _pending(self):
+        """
+        Returns the compile and execute times accumulated by the current thread 
+        since the last execution, by fingerprint.
+        """
+        if not hasattr(self._local, 'pending'):
+            self._local.pending = {}
+        return self._local.pending
+
+    def end(self, measurement):
+        m = measurement
+        if m.fingerprint is None:
+            return
+        if m.stage in COMPILE_STAGES:
+            self._pending().setdefault(m.fingerprint, [0.0, 0.0])[0] += m.seconds
+        elif m.stage in EXECUTE_STAGES:
+            self._pending().setdefault(m.fingerprint, [0.0, 0.0])[1] += m.seconds
+            if m.stage in ('fetch', 'cache hit'):
+                compile_time, execute_time = self._pending().pop(m.fingerprint)
+                if self.threshold <= compile_time + execute_time:
+                    self.log(Record(m.fingerprint, normalized(m.fingerprint) or u'', 
+                        m.sql, constants(m.rdql or u''), m.rows, compile_time, execute_time))
+                    
+    def log(self, record):
+        if not self.statistics.has_key(record.fingerprint):
+            self.statistics[record.fingerprint] = \
+                Statistics(record.fingerprint, record.rdql)
+        self.statistics[record.fingerprint].add(record)
+        if self.logger is None:
+            _save(record)
+        else:
+            self.logger.info(unicode(record))
+            
+    def report(self):
+        """
+        Returns lines with the statistics of this process, by descending total time.
+        """
+        return [u'%s calls=%s rows=%s total=%.2fms max=%.2fms %s' % (
+            s.fingerprint, s.calls, s.rows, 1000 * s.total_time, 1000 * s.max_time, 
+            s.rdql) for s in sorted(self.statistics.values(), 
+                key=lambda s: s.total_time, reverse=True)]
+        
+        
+_connections = local() # Per thread: the connection records are saved with
+
+
+def _connection():
+    """
+    Returns the connection records are saved with, or None for the connection 
+    of the current thread. Records are saved on a connection of their own, so 
+    that they are committed whatever becomes of the transaction of the query 
+    they describe. SQLite allows a single writer at a time, so there the records 
+    share the connection of the thread and are committed unless a transaction 
+    is managed. The connection is closed at the end of each request, see _close.
+    """
+    if 'sqlite3' == settings.DATABASE_ENGINE:
+        return None
+    if not hasattr(_connections, 'connection'):
+        _connections.connection = connection.__class__(**settings.DATABASE_OPTIONS)
+    return _connections.connection
+
+
+def _close():
+    """
+    Closes the connection records are saved with by the current thread, if any, 
+    like Django closes the connection of the thread when a request finishes.
+    """
+    own = getattr(_connections, 'connection', None)
+    if own is not None:
+        del _connections.connection
+        own.close()
+
+dispatcher.connect(_close, signal=request_finished)
+
+
+def _save(record):
+    """
+    Adds the record to the row of its fingerprint in a single UPDATE, inserting 
+    the row if there is none, so concurrent slow executions are all counted.
+    """
+    from rdf.models import SlowQuery
+    own = _connection()
+    c = own or connection
+    qn, opts = c.ops.quote_name, SlowQuery._meta # IGNORE:W0212
+    cursor = c.cursor()
+    try:
+        if not _update(cursor, qn, opts, record):
+            try:
+                _insert(cursor, qn, opts, record)
+            except Exception: # IGNORE:W0703 - Inserted by another thread meanwhile
+                if own is None:
+                    transaction.rollback_unless_managed()
+                else:
+                    own._rollback() # IGNORE:W0212
+                cursor = c.cursor()
+                _update(cursor, qn, opts, record)
+    finally:
+        if own is None:
+            transaction.commit_unless_managed()
+        else:
+            own._commit() # IGNORE:W0212
+
+
+def _update(cursor, qn, opts, record):
+    """
+    Returns True if the fingerprint has a row, which is updated.
+    """
+    cursor.execute(
+        'UPDATE %s SET %s = %s + 1, %s = %s + %%s, %s = %s + %%s, %s = %s + %%s, ' 
+        '%s = %s + %%s, %s = CASE WHEN %s < %%s THEN %%s ELSE %s END, %s = %%s, ' 
+        '%s = %%s, %s = %%s WHERE %s = %%s' % ((qn(opts.db_table),) + 
+            (qn('calls'),) * 2 + (qn('rows'),) * 2 + (qn('total_time'),) * 2 + 
+            (qn('compile_time'),) * 2 + (qn('execute_time'),) * 2 + 
+            (qn('max_time'),) * 3 + (qn('sql'), qn('params'), qn('last_seen'), 
+             qn('fingerprint'))), 
+        [record.rows or 0, record.total_time, record.compile_time, 
+         record.execute_time, record.total_time, record.total_time, record.sql, 
+         simplejson.dumps(record.params), record.time, record.fingerprint])
+    return 0 < cursor.rowcount
+
+
+def _insert(cursor, qn, opts, record):
+    columns = ('fingerprint', 'rdql', 'sql', 'params', 'calls', 'rows', 'total_time', 
+        'compile_time', 'execute_time', 'max_time', 'first_seen', 'last_seen')
+    cursor.execute('INSERT INTO %s (%s) VALUES (%s)' % (qn(opts.db_table), 
+        ', '.join([qn(_) for _ in columns]), ', '.join(['%s'] * len(columns))),
+        [record.fingerprint, record.rdql, record.sql, simplejson.dumps(record.params), 
+         1, record.rows or 0, record.total_time, record.compile_time, 
+         record.execute_time, record.total_time, record.time, record.time])
+    
+    
+_loggers = {} # File name -> logger
+
+
+def _logger(filename):
+    if not _loggers.has_key(filename):
+        logger = logging.getLogger('rdf.slowlog.%s' % len(_loggers))
+        handler = RotatingFileHandler(filename, 
+            maxBytes=getattr(settings, 'RDF_SLOW_QUERY_FILE_SIZE', 10 * 1024 * 1024), 
+            backupCount=getattr(settings, 'RDF_SLOW_QUERY_FILE_COUNT', 5), 
+            encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s\t%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _loggers[filename] = logger
+    return _loggers[filename]
+
+
+# Copyright (c) 2008, Stefan B Sigurdsson
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice,
+#        this list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright
+#        notice, this list of conditions and the following disclaimer in the
+#        documentation and/or other materials provided with the distribution.
+#
+#     3. Neither the name of Django nor the names of its contributors may be used
+#        to endorse or promote products derived from this software without
+#        specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
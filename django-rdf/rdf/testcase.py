@@ -1,10 +1,175 @@
+"""
+Test case base classes for django-rdf and the projects using it.
+
+TestCase installs the ontology before each test. The ontology is synchronized 
+with syncvb before the first test only; the ontology tables (the rdf models, and 
+the content types and permissions provisioned for them) are then captured in a 
+snapshot, and restored from it before every later test. To synchronize before 
+every test instead, set in the project settings:
+
+    RDF_TEST_SNAPSHOT = False
+
+QueryCountMixin adds assertions that fail a test when a block of code issues 
+more database queries than its budget, to guard the hot paths against N+1 query 
+regressions. Budgets for the core operations are kept in a table, which projects 
+can override in the settings to check the operations against their own ontology:
+
+    RDF_QUERY_BUDGETS = {'compile': 40}
+"""
+
+from __future__ import with_statement
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import ContentType, Permission
 from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import get_app, get_models
+from django.dispatch import dispatcher
 from django.test.testcases import TestCase as DjangoTestCase
 
-class TestCase(DjangoTestCase):
+from rdf.models import bulk_post_save
+
+
+class QueryCounter(object):
+    """
+    The database queries issued within a count_queries context. 
+    """
+    
+    def __init__(self):
+        self._start, self._queries = len(connection.queries), None
+    
+    def __getqueries(self):
+        if self._queries is None:
+            return connection.queries[self._start:]
+        return self._queries
+    queries = property(__getqueries)
+    
+    def __getcount(self):
+        return len(self.queries)
+    count = property(__getcount)
+    
+    def close(self):
+        self._queries = connection.queries[self._start:]
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the database queries issued within the context. Yields a QueryCounter. 
+    Queries are only logged by Django when settings.DEBUG is true, so DEBUG is 
+    turned on for the duration of the context. 
+    """
+    debug = settings.DEBUG
+    settings.DEBUG = True
+    counter = QueryCounter()
+    try:
+        yield counter
+    finally:
+        counter.close()
+        settings.DEBUG = debug
+
+
+class QueryCountMixin(object):
+    
+    # The maximum number of queries for each core operation: 
+    QUERY_BUDGETS = {
+        'compile': 30, # Compile a query with a single predicate, with cold caches
+        'render': 10, # Render a page of query results, whatever the page size
+        'fragment': 25, # Load an ontology fragment, per element in the fragment
+        'describe': 10, # Describe resources, whatever the number of predicates
+    }
+    
+    def query_budget(self, operation):
+        budgets = getattr(settings, 'RDF_QUERY_BUDGETS', {})
+        return budgets.get(operation, self.QUERY_BUDGETS[operation])
+    
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        """
+        Fails unless the block issues at most `budget` database queries.
+        """
+        with count_queries() as counter:
+            yield counter
+        if budget < counter.count:
+            self.fail('%s queries issued, over the budget of %s:\n%s' % (
+                counter.count, budget, 
+                '\n'.join([q['sql'] for q in counter.queries])))
+    
+    def assertQueryBudget(self, operation, items=1):
+        """
+        Fails unless the block issues at most the budgeted number of queries for 
+        the operation, multiplied by the number of items where the budget is per 
+        item. 
+        """
+        return self.assertMaxQueries(self.query_budget(operation) * items)
+
+
+_snapshot = None # (table, columns, rows) for each table, captured after syncvb
+
+
+def _models():
+    return [ContentType, Permission] + get_models(get_app('rdf'))
+
+
+def _tables():
+    tables = []
+    for Model in _models():
+        tables.append(Model._meta.db_table) # IGNORE:W0212
+        tables.extend([f.m2m_db_table() for f in Model._meta.many_to_many]) # IGNORE:W0212
+    return tables
+
+
+def snapshot():
+    """
+    Returns the contents of the ontology tables.
+    """
+    qn = connection.ops.quote_name
+    cursor = connection.cursor() # IGNORE:E1101
+    tables = []
+    for table in _tables():
+        cursor.execute('SELECT * FROM %s' % qn(table))
+        columns = [d[0] for d in cursor.description]
+        tables.append((table, columns, cursor.fetchall()))
+    return tables
+
+
+def restore(snapshot):
+    """
+    Replaces the contents of the ontology tables with the snapshot, and discards 
+    the cached ontology elements by sending the bulk_post_save signal.
+    """
+    qn = connection.ops.quote_name
+    cursor = connection.cursor() # IGNORE:E1101
+    if 'mysql' == settings.DATABASE_ENGINE:
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+    for table, _, _ in reversed(snapshot):
+        cursor.execute('DELETE FROM %s' % qn(table))
+    for table, columns, rows in snapshot:
+        if rows:
+            cursor.executemany('INSERT INTO %s (%s) VALUES (%s)' % (
+                qn(table), ', '.join([qn(c) for c in columns]), 
+                ', '.join(['%s'] * len(columns))), rows)
+    if 'mysql' == settings.DATABASE_ENGINE:
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
+    for sql in connection.ops.sequence_reset_sql(no_style(), _models()):
+        cursor.execute(sql)
+    transaction.commit_unless_managed()
+    dispatcher.send(signal=bulk_post_save, changes={})
+
+
+class TestCase(QueryCountMixin, DjangoTestCase):
 
     def setUp(self):
-        call_command('syncvb', verbosity=0)   # Set up, synthesize and install ontology
+        global _snapshot # IGNORE:W0603
+        if not getattr(settings, 'RDF_TEST_SNAPSHOT', True):
+            call_command('syncvb', verbosity=0)   # Set up, synthesize and install ontology
+        elif _snapshot is None:
+            call_command('syncvb', verbosity=0)
+            _snapshot = snapshot()
+        else:
+            restore(_snapshot)
 
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.
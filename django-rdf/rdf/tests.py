@@ -1,11 +1,18 @@
+from __future__ import with_statement
 from django.contrib.auth.models import ContentType, Permission, User
 from django.test import Client
 
+from rdf import benchmark
+from rdf.instrumentation import Aggregator, fingerprint, register, unregister
 from rdf.models import \
-    Namespace, Predicate, Resource, Statement, String, Concept, Cardinality
-from rdf.query.query import SPARQLQuerySet 
+    Namespace, Predicate, Resource, Statement, String, Concept, Cardinality, SlowQuery
+from rdf.query.budget import RowLimitExceeded, budget
+from rdf.query.compiler import Compiler
+from rdf.query.query import Aggregate, SPARQLQuerySet 
+from rdf.query.resolve import DisconnectedJoin, NotGrouped, NotTransitive, TypeMismatch
 from rdf.shortcuts import create, get, get_or_create
-from rdf.testcase import TestCase
+from rdf.slowlog import SlowQueryLog
+from rdf.testcase import TestCase, count_queries, restore, snapshot
 
 
 U = u'http://code.google.com/p/django-rdf/'
@@ -164,6 +171,35 @@ class TestConcept(TestCase):
         for P in (M0, M1, M2, O0, O1):
             self.assertTrue(P in all)
             
+    def test_ancestors(self):
+        from rdf.query.resolve import _PredicateGraph
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        A, B, C = [create(Concept, TMP, n) for n in ('A', 'B', 'C')]
+        B.bases.add(A) # IGNORE:E1101
+        C.bases.add(B) # IGNORE:E1101
+        A.bases.add(C) # IGNORE:E1101
+        graph = _PredicateGraph()
+        # The bases are loaded with the graph, and walked in memory:
+        with self.assertMaxQueries(0):
+            self.assertEqual(set([A.id, B.id, C.id]), graph.ancestors(C))
+            self.assertEqual(set([A.id, B.id, C.id]), graph.ancestors(A))
+
+    def test_bases_reset_paths(self):
+        from rdf.query.resolve import NoPath, resolve_path
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        A, B = create((Concept, TMP, 'A'), (Concept, TMP, 'B'))
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=A, range=XS['string'], cardinality=one_one)
+        self.assertRaises(NoPath, resolve_path, B, [P])
+        # Changing the bases discards the cached predicate graph and paths:
+        B.bases.add(A) # IGNORE:E1101
+        self.assertEqual([P], resolve_path(B, [P]))
+        B.bases.remove(A) # IGNORE:E1101
+        self.assertRaises(NoPath, resolve_path, B, [P])
+        A.derived.add(B) # IGNORE:E1101
+        self.assertEqual([P], resolve_path(B, [P]))
+
     def test_mandatory(self):
         RDF, RDFS = get((Namespace, 'rdf'), (Namespace, 'rdfs'))
         pp = RDFS['Class'].mandatory_predicates
@@ -195,6 +231,31 @@ class TestPredicate(TestCase):
         self.assertEqual(T, P.domain)
         self.assertEqual(T, P.range)
 
+    def test_span(self):
+        from rdf.models import _SpanSegment
+        N = create(Namespace, 'n', 'http://example.com/namespace/')
+        C, D, E = create((Concept, N, 'c'), (Concept, N, 'd'), (Concept, N, 'e'))
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, N, 'p', domain=C, range=D, cardinality=one_one)
+        Q = create(Predicate, N, 'q', domain=D, range=E, cardinality=one_one)
+        S = create(Predicate, N, 's', domain=C, range=E, cardinality=one_one)
+        self.failIf(S.span)
+        self.assertEqual((), S.segments)
+        _SpanSegment.objects.create(span=S, predicate=Q, ordinal=1)
+        _SpanSegment.objects.create(span=S, predicate=P, ordinal=0)
+        S = Predicate.objects.get(pk=S.pk)
+        self.failUnless(S.span)
+        self.assertEqual((P, Q), S.segments)
+        self.failUnless(S.segments is Predicate.objects.get(pk=S.pk).segments)
+        # Spans can't contain spans:
+        f = lambda: _SpanSegment.objects.create(span=P, predicate=S, ordinal=0)
+        self.assertRaises(Exception, f)
+        for s in _SpanSegment.objects.filter(span=S):
+            s.delete()
+        S = Predicate.objects.get(pk=S.pk)
+        self.failIf(S.span)
+        self.assertEqual((), S.segments)
+
 
 class TestStatement(TestCase):
 
@@ -319,6 +380,25 @@ class TestStatement(TestCase):
         self.assertEqual(v['value'], t.object)
         self.assertEqual(String, type(t.object))
 
+    def test_prefetch_objects(self):
+        N = create(Namespace, 'n', 'http://example.com/namespace/')
+        T = create(Concept, N, 't')
+        r = create(Resource, N, 'r', T)
+        V = get(Namespace, code='xs')['string']
+        none_none = Cardinality.objects.get(domain='?', range='?') # IGNORE:E1101
+        for i in range(5):
+            p = create(Predicate, N, 's%s' % i, domain=T, range=V, cardinality=none_none)
+            create(Statement, r, p, u'value %s' % i)
+        p = create(Predicate, N, 'r', domain=T, range=T, cardinality=none_none)
+        create(Statement, r, p, r)
+        p = create(Predicate, N, 'n', domain=T, range=Namespace.objects.type, cardinality=none_none)
+        create(Statement, r, p, N)
+        expected = [s.object for s in Statement.objects.filter(subject=r).order_by('id')]
+        # Statements, predicates, ranges, and one query per range model:
+        with self.assertMaxQueries(6):
+            statements = Statement.objects.filter(subject=r).order_by('id').prefetch_objects()
+            self.assertEqual(expected, [s.object for s in statements])
+
 
 class TestShortcuts(TestCase):
 
@@ -354,6 +434,389 @@ class TestShortcuts(TestCase):
         self.assertEqual(s.subject, p.resource)
         self.assertEqual(s.object, DESCRIPTION)
 
+    def test_import_cache(self):
+        from django.db.models import signals
+        from django.dispatch import dispatcher
+        from rdf import shortcuts
+        self.assertEqual(Resource, shortcuts.import_class('rdf.models.Resource'))
+        self.failUnless(shortcuts._classes.has_key('rdf.models.Resource'))
+        username = shortcuts.import_field('django.contrib.auth.models.User.username')
+        self.assertEqual('username', username.name)
+        P = create(Predicate, get(Namespace, 'dc'), 'p', domain=get(Namespace, 'rdfs')['Resource'],
+            range=get(Namespace, 'xs')['string'],
+            cardinality=Cardinality.objects.get(domain='1', range='1'), # IGNORE:E1101
+            field_name='django.contrib.auth.models.User.username')
+        self.assertEqual(username, P.field)
+        self.assertEqual(User._meta.db_table, P.db_table) # IGNORE:W0212
+        # Adding a model to the app registry discards the cache:
+        dispatcher.send(signal=signals.class_prepared, sender=User)
+        self.assertEqual({}, shortcuts._classes)
+        self.assertEqual({}, shortcuts._fields)
+
+    def test_lru(self):
+        from rdf.shortcuts import lru
+        cache = lru(2)
+        cache['a'], cache['b'] = 0, 1
+        self.assertEqual(0, cache.get('a'))
+        cache['c'] = 2 # Discards b, the least recently used
+        self.assertEqual(2, len(cache))
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual((0, 2), (cache.get('a'), cache.get('c')))
+        cache.clear()
+        self.assertEqual((0, None), (len(cache), cache.get('a')))
+
+
+class TestBulkChanges(TestCase):
+    
+    def test_coalesced(self):
+        from django.dispatch import dispatcher
+        from rdf.models import bulk_changes, bulk_post_save
+        saved, coalesced = [], []
+        on_save = lambda instance: saved.append(instance)
+        on_bulk = lambda changes: coalesced.append(changes)
+        dispatcher.connect(on_save, sender=Namespace, signal=Namespace.post_save)
+        dispatcher.connect(on_bulk, signal=bulk_post_save)
+        try:
+            with bulk_changes():
+                TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+                with bulk_changes():
+                    T = create(Concept, TMP, 'T')
+                TMP.save()
+                self.assertEqual([], coalesced)
+            self.assertEqual([], saved)
+            self.assertEqual(1, len(coalesced))
+            self.assertEqual(set([TMP.pk]), coalesced[0][Namespace])
+            self.assertEqual(set([T.pk]), coalesced[0][Concept])
+            # Permissions are provisioned for the coalesced changes:
+            from rdf.permissions import _permission_code
+            self.assertEqual(1, Permission.objects.filter( # IGNORE:E1101
+                codename=_permission_code(T, 'r')).count())
+        finally:
+            dispatcher.disconnect(on_save, sender=Namespace, signal=Namespace.post_save)
+            dispatcher.disconnect(on_bulk, signal=bulk_post_save)
+    
+    def test_exception(self):
+        from django.dispatch import dispatcher
+        from rdf.models import bulk_active, bulk_aborted, bulk_changes, _bulk_state
+        aborted = []
+        on_aborted = lambda changes: aborted.append(changes)
+        dispatcher.connect(on_aborted, signal=bulk_aborted)
+        def f():
+            with bulk_changes():
+                create(Namespace, 'tmp', 'http://tmp/tmp#')
+                raise ValueError()
+        try:
+            self.assertRaises(ValueError, f)
+        finally:
+            dispatcher.disconnect(on_aborted, signal=bulk_aborted)
+        self.assertEqual(1, len(aborted))
+        self.assertFalse(bulk_active())
+        self.assertEqual({}, _bulk_state().changes)
+
+    def test_thread(self):
+        from threading import Thread
+        from rdf.models import bulk_active, bulk_changes
+        seen = []
+        with bulk_changes():
+            t = Thread(target=lambda: seen.append(bulk_active()))
+            t.start()
+            t.join()
+            self.assertTrue(bulk_active())
+        self.assertEqual([False], seen)
+
+    def test_result_cache(self):
+        from django.conf import settings
+        from rdf.models import bulk_changes
+        from rdf.query import cache
+        settings.RDF_QUERY_CACHE_TIMEOUT = 60
+        try:
+            TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+            T = create(Concept, TMP, 'T')
+            table = Resource._meta.db_table # IGNORE:W0212
+            version = cache.versions([table])[0]
+            with bulk_changes():
+                create(Resource, TMP, 'r0', T)
+                create(Resource, TMP, 'r1', T)
+                # Versions are bumped when the context exits:
+                self.assertEqual([version], cache.versions([table]))
+            self.assertNotEqual([version], cache.versions([table]))
+        finally:
+            settings.RDF_QUERY_CACHE_TIMEOUT = 0
+
+
+class TestSnapshot(TestCase):
+    
+    def test_restore(self):
+        s = snapshot()
+        RDF = get(Namespace, 'rdf')
+        create(Namespace, 'tmp', 'http://tmp/tmp#')
+        restore(s)
+        self.assertRaises(Namespace.DoesNotExist, get, Namespace, 'tmp') # IGNORE:E1101
+        self.assertEqual(RDF.pk, get(Namespace, 'rdf').pk)
+        # The sequences continue after the restored rows:
+        self.failUnless(RDF.pk < create(Namespace, 'tmq', 'http://tmq/tmq#').pk)
+
+
+class TestImport(TestCase):
+
+    def test_no_queries(self):
+        from rdf.management.commands import mirror
+        from rdf.serializers import _rdfxml, _xsd
+        with self.assertMaxQueries(0):
+            for module in (_rdfxml, _xsd, mirror):
+                reload(module)
+        # The terms are resolved on first use, and then cached:
+        with count_queries() as counter:
+            RDF = _rdfxml._T.RDF
+        self.failUnless(0 < counter.count)
+        with self.assertMaxQueries(0):
+            self.assertEqual(u'{%s}about' % RDF.uri, _rdfxml._T.RDF_ABOUT)
+
+
+class TestIdentityMap(TestCase):
+
+    def test_repeated_access(self):
+        from rdf.identity import identity_map
+        with identity_map():
+            P, Q = [Predicate.objects.get(resource__namespace__code='rdf',
+                resource__name='type') for _ in range(2)]
+            self.failIf(P is Q)
+            self.assertEqual(u'rdf:type', P.code)
+            self.assertEqual(P.uri, Q.uri)
+            self.failUnless(P.namespace is Q.namespace)
+            touch = lambda R: (R.code, R.mangled, R.uri, R.ontology,
+                R.resource.uri, R.namespace.uri, R.domain.namespace)
+            map(touch, (P, Q))
+            with self.assertMaxQueries(0):
+                map(touch, (P, Q))
+
+    def test_middleware(self):
+        from rdf import identity
+        m = identity.IdentityMapMiddleware()
+        m.process_request(None)
+        self.failIf(identity._current() is None)
+        self.assertEqual('response', m.process_response(None, 'response'))
+        self.failUnless(identity._current() is None)
+
+
+class TestInstrumentation(TestCase):
+    
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint(u'select c.tmp:P from tmp:C c where c tmp:P "a" limit 10'), 
+            fingerprint(u'select  c.tmp:P from tmp:C c\nwhere c tmp:P "b" limit 20'))
+        self.assertNotEqual(
+            fingerprint(u'select c.tmp:P from tmp:C c using tmp for "http://tmp/tmp#"'), 
+            fingerprint(u'select c.tmp:P from tmp:C c using tmp for "http://tmp/tmq#"'))
+    
+    def test_aggregator(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+        create(Statement, create(Resource, TMP, 'r0', T), P, 'zero')
+        aggregator = register(Aggregator())
+        try:
+            values = Concept.objects.values_for_predicates(P, domain=T)
+            self.assertEqual(1, len(list(values)))
+            f = values.compiled().fingerprint
+            for stage in ('lex', 'parse', 'bind', 'span', 'generalize', 'generate', 
+                'execute', 'first row', 'fetch'):
+                self.assertEqual(3, len(aggregator.percentiles(f, stage)))
+            self.assertEqual(1, aggregator.rows[(f, 'fetch')])
+        finally:
+            unregister(aggregator)
+
+    def test_slow_query_log(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+        create(Statement, create(Resource, TMP, 'r0', T), P, 'zero')
+        log = register(SlowQueryLog(threshold=0))
+        try:
+            values = Concept.objects.values_for_predicates(P, domain=T)
+            self.assertEqual(1, len(list(values._clone())))
+            self.assertEqual(1, len(list(values._clone())))
+        finally:
+            unregister(log)
+        q = SlowQuery.objects.get(fingerprint=values.compiled().fingerprint)
+        self.assertEqual(2, q.calls)
+        self.assertEqual(2, q.rows)
+        self.assertEqual(values.compiled().select, q.sql)
+        self.assertTrue(q.compile_time < q.total_time)
+
+    def test_slow_query_log_cache_hit(self):
+        from django.conf import settings
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+        create(Statement, create(Resource, TMP, 'r0', T), P, 'zero')
+        settings.RDF_QUERY_CACHE_TIMEOUT = 60
+        log = register(SlowQueryLog(threshold=0))
+        try:
+            values = Concept.objects.values_for_predicates(P, domain=T)
+            self.assertEqual(1, len(list(values._clone())))
+            self.assertEqual(1, len(list(values._clone()))) # From the result cache
+            # Cache hits end the execution, so no compile time is left pending:
+            self.assertEqual({}, log._pending()) # IGNORE:W0212
+        finally:
+            unregister(log)
+            settings.RDF_QUERY_CACHE_TIMEOUT = 0
+        q = SlowQuery.objects.get(fingerprint=values.compiled().fingerprint)
+        self.assertEqual(2, q.calls)
+        self.assertEqual(2, q.rows)
+
+
+class TestBenchmark(TestCase):
+    
+    def test_run(self):
+        report = benchmark.run(concepts=3, predicates=4, depth=2, resources=30, 
+            statements=50, rows=50, repeat=2)
+        results = report['results']
+        self.assertEqual(50, results['ingest.statements']['rows'])
+        for name in ('single', 'join', 'chain', 'path'):
+            self.assertEqual(2, results['compile.%s' % name]['n'])
+            self.assertEqual(2, results['execute.%s' % name]['n'])
+        self.assertTrue(results['stages'].has_key('generalize'))
+        # The synthetic ontology and data are gone:
+        self.assertRaises(Namespace.DoesNotExist, get, Namespace, 'bench') # IGNORE:E1101
+
+
+class TestQueryBudgets(TestCase):
+    
+    FRAGMENT = u'''<?xml version="1.0" encoding="UTF-8"?>
+<rdf:RDF
+   xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+   xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+   xmlns:owl="http://www.w3.org/2002/07/owl#" 
+   xmlns:dc="http://purl.org/dc/elements/1.1/"
+   xmlns:drdfs="http://.../django/schema#"
+   xmlns:tmp="http://tmp/tmp#">
+ <owl:Ontology rdf:about="http://tmp/tmp#">
+   <dc:title>tmp</dc:title>
+   <dc:description>tmp</dc:description>
+ </owl:Ontology>
+ <rdfs:Class rdf:about="http://tmp/tmp#C">
+  <rdfs:isDefinedBy rdf:resource="http://tmp/tmp#"/>
+  <rdfs:label>C</rdfs:label>
+  <rdfs:comment>C</rdfs:comment>
+  <rdfs:subClassOf rdf:resource="http://.../django/schema#Resource"/>
+  <drdfs:model>rdf.models.Resource</drdfs:model>
+ </rdfs:Class>
+ <rdf:Property rdf:about="http://tmp/tmp#P">
+  <rdfs:isDefinedBy rdf:resource="http://tmp/tmp#"/>
+  <rdfs:label>P</rdfs:label>
+  <rdfs:comment>P</rdfs:comment>
+  <rdfs:domain rdf:resource="http://tmp/tmp#C"/>
+  <rdfs:range rdf:resource="http://www.w3.org/2001/XMLSchema#string"/>
+  <drdfs:cardinality>1:1</drdfs:cardinality>
+ </rdf:Property>
+</rdf:RDF>'''
+    
+    def test_compile(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        create(Predicate, TMP, 'P', domain=C, range=XS['string'], cardinality=one_one)
+        with self.assertQueryBudget('compile'):
+            Compiler().compile(
+                u'select c.tmp:P from tmp:C c using tmp for "http://tmp/tmp#"')
+            
+    def test_render(self):
+        from rdf.shortcuts import render_to_response
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+        for i in range(0, 10):
+            create(Statement, create(Resource, TMP, 'r%s' % i, T), P, unicode(i))
+        values = Concept.objects.values_for_predicates(P, domain=T)
+        values.compiled()
+        counts = []
+        for n in (2, 10):
+            with self.assertQueryBudget('render') as counter:
+                render_to_response('resources.rdfxml', 
+                    dict(resources=values._clone()[:n], offset=0, limit=n, count=10))
+            counts.append(counter.count)
+        # Rendering more rows doesn't issue more queries:
+        self.assertEqual(counts[0], counts[1])
+        
+    def test_fragment(self):
+        import os, tempfile
+        from django.core import serializers
+        create(Namespace, 'tmp', 'http://tmp/tmp#')
+        fd, path = tempfile.mkstemp(suffix='.rdfxml')
+        try:
+            os.write(fd, self.FRAGMENT.encode('utf-8'))
+            os.close(fd)
+            with self.assertQueryBudget('fragment', items=3):
+                for o in serializers.deserialize('rdfxml', path):
+                    o.save()
+        finally:
+            os.remove(path)
+        self.assertEqual(u'tmp:P', get(Predicate, get(Namespace, 'tmp'), 'P').code)
+
+
+class TestDescribe(TestCase):
+    
+    def setUp(self):
+        super(TestDescribe, self).setUp()
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        none_none = Cardinality.objects.get(domain='?', range='?') # IGNORE:E1101
+        self.P = [create(Predicate, TMP, 'P%s' % i, domain=T, range=XS['string'], 
+            cardinality=none_none) for i in range(0, 6)]
+        self.Q = create(Predicate, TMP, 'Q', domain=T, range=T, cardinality=none_none)
+        self.r0 = create(Resource, TMP, 'r0', T)
+        self.r1 = create(Resource, TMP, 'r1', T)
+        for P in self.P[:2]:
+            create(Statement, self.r0, P, u'r0 %s' % P.name)
+        for P in self.P:
+            create(Statement, self.r1, P, u'r1 %s' % P.name)
+        create(Statement, self.r0, self.Q, self.r1)
+        create(Statement, self.r1, self.Q, self.r0)
+    
+    def test_describe(self):
+        from rdf.describe import describe, locate
+        r0, r1 = locate([u'http://tmp/tmp#r0', u'http://tmp/tmp#r1', u'http://tmp/tmp#r2'])
+        self.assertEqual([self.r0, self.r1], [r0, r1])
+        counts = []
+        for r in (r0, r1):
+            with self.assertQueryBudget('describe') as counter:
+                d, = describe([r])
+            counts.append(counter.count)
+        # Describing more predicates doesn't issue more queries:
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(u'http://tmp/tmp#r1', d.uri)
+        self.assertEqual(
+            [(u'TMP__P%s' % i, u'r1 P%s' % i) for i in range(0, 6)], 
+            [(p.name, p.literal) for p in d.properties if p.literal])
+        self.assertEqual(
+            [(u'TMP__Q', u'http://tmp/tmp#r0')], 
+            [(p.name, p.resource) for p in d.properties if p.resource])
+        
+    def test_cache(self):
+        from django.conf import settings
+        from rdf.describe import describe
+        settings.RDF_DESCRIBE_CACHE_TIMEOUT = 60
+        try:
+            self.assertEqual(3, len(describe([self.r0])[0].properties))
+            with self.assertMaxQueries(0):
+                self.assertEqual(3, len(describe([self.r0])[0].properties))
+            # Saving a statement about the resource invalidates its description:
+            create(Statement, self.r0, self.P[2], u'r0 P2')
+            self.assertEqual(4, len(describe([self.r0])[0].properties))
+        finally:
+            settings.RDF_DESCRIBE_CACHE_TIMEOUT = 0
+    
 
 class TestRDFS(TestCase):
 
@@ -432,10 +895,7 @@ class TestSPARQLQuerySet(TestCase):
         self.assertEqual(getattr(rqs, '_cached_query').count, count)
         self.assertEqual(0, len(rqs.filter())) # IGNORE:E1101
     
-    def XXXtest_empty_chain_length_2_shorthand(self):
-        """
-        This shorthand notation is not yet supported by the compiler and maybe never will.
-        """
+    def test_empty_path_length_2(self):
         TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
         C, D, E = create((Concept, TMP, 'C'), (Concept, TMP, 'D'), (Concept, TMP, 'E'))
         one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
@@ -446,12 +906,37 @@ class TestSPARQLQuerySet(TestCase):
             from tmp:C c
             using tmp for "http://tmp/tmp#",
                   rdf for "http://www.w3.org/1999/02/22-rdf-syntax-ns#"''')
-        select = u'''select c__tmp__P__o.name from rdf_resource c, rdf_statement c__tmp__P__s, rdf_resource c__tmp__P__o where c.type_id = %s and c__tmp__P__s.subject_id = c.id and c__tmp__P__s.predicate_id = %s and c__tmp__P__s.object_resource_id = c__tmp__P__o.id''' % (C.id, P.id)
-        count = u'''select count(*) from rdf_resource c, rdf_statement c__tmp__P__s, rdf_resource c__tmp__P__o where c.type_id = %s and c__tmp__P__s.subject_id = c.id and c__tmp__P__s.predicate_id = %s and c__tmp__P__s.object_resource_id = c__tmp__P__o.id''' % (C.id, P.id)
         self.assertEqual(0, rqs.count())
-        self.assertEqual(getattr(rqs, '_cached_query').select, select)
-        self.assertEqual(getattr(rqs, '_cached_query').count, count)
+        select = getattr(rqs, '_cached_query').select
+        self.assertTrue(select.startswith(
+            u'select c.name, c__tmp__P__tmp__Q__1.name from '))
+        self.assertTrue(u'c__tmp__P__s.predicate_id = %s' % P.id in select)
+        self.assertTrue(u'c__tmp__P__0__tmp__Q__s.predicate_id = %s' % Q.id in select)
+        self.assertTrue(u'c__tmp__P__tmp__Q__1.type_id = %s' % E.id in select)
         self.assertEqual(0, len(rqs.filter())) # IGNORE:E1101
+        # No spanning predicates are materialized:
+        self.assertRaises(Namespace.DoesNotExist, get, Namespace, 'tmp-spans') # IGNORE:E1101
+    
+    def test_empty_path_with_gap(self):
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C, D, E, F = create(
+            (Concept, TMP, 'C'), (Concept, TMP, 'D'), (Concept, TMP, 'E'), (Concept, TMP, 'F'))
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=C, range=D, cardinality=one_one)
+        Q = create(Predicate, TMP, 'Q', domain=D, range=E, cardinality=one_one)
+        R = create(Predicate, TMP, 'R', domain=E, range=F, cardinality=one_one)
+        rqs = SPARQLQuerySet().rdql(u'''
+            select c.tmp:P.tmp:R.rdf:about 
+            from tmp:C c
+            using tmp for "http://tmp/tmp#",
+                  rdf for "http://www.w3.org/1999/02/22-rdf-syntax-ns#"''')
+        self.assertEqual(0, rqs.count())
+        select = getattr(rqs, '_cached_query').select
+        # The path resolver fills the gap between tmp:P and tmp:R with tmp:Q:
+        self.assertTrue(select.startswith(
+            u'select c__tmp__P__tmp__Q__tmp__R__2.name from '))
+        self.assertTrue(u'.predicate_id = %s' % Q.id in select)
+        self.assertTrue(u'.predicate_id = %s' % R.id in select)
     
     def test_empty_chain_length_5(self):
         DC = get(Namespace, 'dc')
@@ -483,6 +968,234 @@ class TestSPARQLQuerySet(TestCase):
         self.assertEqual(getattr(rqs, '_cached_query').count, count)
         self.assertEqual(0, len(rqs.filter())) # IGNORE:E1101
     
+    def test_disconnected_join(self):
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C, D = create((Concept, TMP, 'C'), (Concept, TMP, 'D'))
+        rdql = u'''
+            select c.rdf:about, d.rdf:about 
+            from tmp:C c, tmp:D d
+            using tmp for "http://tmp/tmp#",
+                  rdf for "http://www.w3.org/1999/02/22-rdf-syntax-ns#"'''
+        self.assertRaises(DisconnectedJoin, SPARQLQuerySet().rdql(rdql).count)
+        self.assertEqual(0, SPARQLQuerySet().rdql(rdql, allow_cartesian=True).count())
+
+    def test_comparisons(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=C, range=XS['string'], cardinality=one_one)
+        N = create(Predicate, TMP, 'N', domain=C, range=XS['decimal'], cardinality=one_one)
+        for i, name in enumerate(['apple', 'banana', 'cherry']):
+            r = create(Resource, TMP, 'r%s' % i, C)
+            create(Statement, r, P, name)
+            create(Statement, r, N, '%s.5' % i)
+        def values(where):
+            return sorted([v[P] for v in SPARQLQuerySet().rdql(
+                u'select c.tmp:P from tmp:C c where %s using tmp for "http://tmp/tmp#"' % where)])
+        self.assertEqual([u'banana'], values(u'c tmp:P = "banana"'))
+        self.assertEqual([u'apple', u'cherry'], values(u'c tmp:P != "banana"'))
+        self.assertEqual([u'banana'], values(u'c tmp:P like "%an%"'))
+        self.assertEqual([u'banana', u'cherry'], values(u'c tmp:P >= "b" and c tmp:N >= 1'))
+        self.assertEqual([u'apple', u'cherry'], values(u'c tmp:P in ("apple", "cherry", "fig")'))
+        self.assertEqual([u'apple', u'banana'], values(u'c tmp:N < 2'))
+        self.assertEqual([u'banana'], values(u'c tmp:N > 0.5 and c tmp:N <= 1.5'))
+        compiled = SPARQLQuerySet().rdql(u'select c.tmp:P from tmp:C c where c tmp:N < 2 ' \
+            u'using tmp for "http://tmp/tmp#"').compiled()
+        self.assertTrue(u'c__tmp__N__o.value < %s' in compiled.select)
+        self.assertEqual([2], compiled.params)
+        for where in [u'c tmp:N < "2"', u'c tmp:N like "2%"', u'c tmp:P in (1, 2)']:
+            self.assertRaises(TypeMismatch, SPARQLQuerySet().rdql(
+                u'select c.tmp:P from tmp:C c where %s using tmp for "http://tmp/tmp#"' % where
+                ).count)
+
+    def test_constant_parameters(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=C, range=XS['string'], cardinality=one_one)
+        for i, name in enumerate([u'a\\', u'100%', u'b']):
+            create(Statement, create(Resource, TMP, 'r%s' % i, C), P, name)
+        def values(where):
+            return SPARQLQuerySet().rdql(u'select c.tmp:P from tmp:C c where %s ' \
+                u'using tmp for "http://tmp/tmp#"' % where)
+        self.assertEqual([u'a\\'], [v[P] for v in values(u'c tmp:P = "a\\"')])
+        self.assertEqual([u'100%'], [v[P] for v in values(u'c tmp:P = "100%"')])
+        # A trailing backslash doesn't escape the quote ending the constant:
+        rqs = values(u'c tmp:P = "\\" and c tmp:P = " or 1 = 1 -- "')
+        self.assertEqual([], list(rqs._clone()))
+        self.assertFalse(u'1 = 1' in rqs.compiled().select)
+        self.assertEqual([u'\\', u' or 1 = 1 -- '], rqs.compiled().params)
+
+    def test_order(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        one_none = Cardinality.objects.get(domain='1', range='?') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=C, range=XS['string'], cardinality=one_one)
+        N = create(Predicate, TMP, 'N', domain=C, range=XS['decimal'], cardinality=one_none)
+        for i, name in enumerate(['cherry', 'apple', 'banana', 'date']):
+            r = create(Resource, TMP, 'r%s' % i, C)
+            create(Statement, r, P, name)
+            if i < 3:
+                create(Statement, r, N, '%s.5' % i)
+        def values(order, where=u''):
+            return SPARQLQuerySet().rdql(u'select c.tmp:P from tmp:C c %s ' \
+                u'using tmp for "http://tmp/tmp#" order by %s' % (where, order))
+        self.assertEqual([u'apple', u'banana', u'cherry', u'date'],
+            [v[P] for v in values(u'c.tmp:P')])
+        self.assertEqual([u'date', u'cherry', u'banana', u'apple'],
+            [v[P] for v in values(u'c.tmp:P desc')])
+        # Unselected predicates are joined for the ordering, without restricting:
+        self.assertEqual(4, len(values(u'c.tmp:N desc')))
+        self.assertEqual([u'banana', u'apple', u'cherry'],
+            [v[P] for v in values(u'c.tmp:N desc', u'where c tmp:N > 0')])
+        top = values(u'c.tmp:P desc')[:2]
+        self.assertEqual([u'date', u'cherry'], [v[P] for v in top._clone()])
+        sql = top._get_sql_clause()
+        self.assertTrue(sql.index(u'order by') < sql.index(u'limit'))
+        # The keywords of the order by clause are only reserved within it:
+        ORDER = create(Concept, TMP, 'Order')
+        DESC = create(Predicate, TMP, 'desc', domain=ORDER, range=XS['string'], 
+            cardinality=one_one)
+        create(Statement, create(Resource, TMP, 'o', ORDER), DESC, u'by')
+        self.assertEqual([u'by'], [v[DESC] for v in SPARQLQuerySet().rdql(
+            u'select order.desc from Order order using "http://tmp/tmp#" ' \
+            u'order by order.desc desc')])
+
+    def test_aggregates(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        one_none = Cardinality.objects.get(domain='1', range='?') # IGNORE:E1101
+        G = create(Predicate, TMP, 'G', domain=C, range=XS['string'], cardinality=one_one)
+        N = create(Predicate, TMP, 'N', domain=C, range=XS['decimal'], cardinality=one_none)
+        for i, (g, n) in enumerate([('a', '1.5'), ('a', '2.5'), ('b', '5.0'), ('b', None)]):
+            r = create(Resource, TMP, 'r%s' % i, C)
+            create(Statement, r, G, g)
+            if not n is None:
+                create(Statement, r, N, n)
+        def query(select, order=u''):
+            return SPARQLQuerySet().rdql(u'select %s from tmp:C c ' \
+                u'using tmp for "http://tmp/tmp#" %s' % (select, order))
+        groups = query(u'c.tmp:G, count(c.tmp:G), optional max(c.tmp:N)', 
+            u'order by c.tmp:G')
+        self.assertTrue(u'group by' in groups.compiled().select)
+        self.assertEqual(2, groups._clone().count())
+        self.assertEqual([(u'a', 2, 2.5), (u'b', 2, 5.0)], 
+            [(v[G], v[Aggregate('count', G)], float(v[Aggregate('max', N)])) 
+             for v in groups._clone()])
+        self.assertEqual([(u'b', 5.0)], [(v[G], float(v[Aggregate('sum', N)])) 
+            for v in query(u'c.tmp:G, sum(c.tmp:N)', u'order by sum(c.tmp:N) desc')[:1]])
+        self.assertRaises(TypeMismatch, query(u'sum(c.tmp:G)').count)
+        self.assertRaises(NotGrouped, query(u'count(c.tmp:G)', u'order by c.tmp:N').count)
+        # The keywords of aggregates and the group by clause are only reserved there:
+        GROUP = create(Concept, TMP, 'Group')
+        COUNT = create(Predicate, TMP, 'count', domain=GROUP, range=XS['string'], 
+            cardinality=one_one)
+        create(Statement, create(Resource, TMP, 'g', GROUP), COUNT, u'max')
+        self.assertEqual([(u'max', 1)], [(v[COUNT], v[Aggregate('count', COUNT)]) 
+            for v in SPARQLQuerySet().rdql(u'select group.count, count(group.count) ' \
+                u'from Group group using "http://tmp/tmp#" group by group.count')])
+
+    def test_distinct(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        G = create(Predicate, TMP, 'G', domain=C, range=XS['string'], cardinality=one_one)
+        for i, g in enumerate(['a', 'a', 'b']):
+            create(Statement, create(Resource, TMP, 'r%s' % i, C), G, g)
+        rqs = SPARQLQuerySet().rdql(
+            u'select distinct c.tmp:G from tmp:C c using tmp for "http://tmp/tmp#"')
+        self.assertEqual(2, rqs._clone().count())
+        self.assertEqual([u'a', u'b'], sorted([v[G] for v in rqs._clone()]))
+        # Constraining a selected predicate doesn't repeat its joins:
+        select = SPARQLQuerySet().rdql(u'select c.tmp:G from tmp:C c where c tmp:G = "a" ' \
+            u'using tmp for "http://tmp/tmp#"').compiled().select
+        self.assertEqual(1, select.count(u'c__tmp__G__s.predicate_id'))
+
+    def test_join_elimination(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        Pm = create(Concept, TMP, 'Pm', 'django.contrib.auth.models.Permission')
+        Ct = create(Concept, TMP, 'Ct', 'django.contrib.contenttypes.models.ContentType')
+        N = create(Predicate, TMP, 'name', domain=Pm, range=XS['string'], 
+            cardinality=one_one, field_name='django.contrib.auth.models.Permission.name')
+        create(Predicate, TMP, 'content_type', domain=Pm, range=Ct, cardinality=one_one, 
+            field_name='django.contrib.auth.models.Permission.content_type')
+        rqs = SPARQLQuerySet().rdql(u'select p.tmp:name from tmp:Pm p, tmp:Ct t ' \
+            u'where p tmp:content_type t using tmp for "http://tmp/tmp#"')
+        self.assertFalse(ContentType._meta.db_table in rqs.compiled().select) # IGNORE:W0212
+        self.assertEqual(Permission.objects.count(), rqs._clone().count())
+        self.assertEqual(sorted([p.name for p in Permission.objects.all()]), 
+            sorted([v[N] for v in rqs._clone()]))
+
+    def test_join_kept_for_generic_predicate(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        one_many, _ = Cardinality.objects.get_or_create(domain='1', range='+') # IGNORE:E1101
+        C = create(Concept, TMP, 'C')
+        Ct = create(Concept, TMP, 'Ct', 'django.contrib.contenttypes.models.ContentType')
+        P = create(Predicate, TMP, 'P', domain=C, range=XS['string'], cardinality=one_one)
+        R = create(Predicate, TMP, 'R', domain=C, range=Ct, cardinality=one_many)
+        r = create(Resource, TMP, 'r', C)
+        create(Statement, r, P, 'r')
+        # A generic predicate may have any number of objects, so the join stays:
+        rqs = SPARQLQuerySet().rdql(u'select c.tmp:P from tmp:C c, tmp:Ct t ' \
+            u'where c tmp:R t using tmp for "http://tmp/tmp#"')
+        self.assertTrue(ContentType._meta.db_table in rqs.compiled().select) # IGNORE:W0212
+        self.assertEqual(0, rqs._clone().count())
+
+    def test_transitive(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        one_none = Cardinality.objects.get(domain='1', range='?') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=C, range=XS['string'], cardinality=one_one)
+        part_of = create(Predicate, TMP, 'partOf', domain=C, range=C, cardinality=one_none)
+        rr = []
+        for i in range(4):
+            rr.append(create(Resource, TMP, 'r%s' % i, C))
+            create(Statement, rr[i], P, 'r%s' % i)
+            if i:
+                create(Statement, rr[i], part_of, rr[i - 1])
+        def wholes(path):
+            return SPARQLQuerySet().rdql(u'select d.tmp:P from tmp:C c, tmp:C d ' \
+                u'where c %s d and c tmp:P = "r3" using tmp for "http://tmp/tmp#"' % path)
+        rqs = wholes(u'tmp:partOf+')
+        self.assertTrue(rqs.compiled().select.startswith(u'with recursive'))
+        with self.assertMaxQueries(1):
+            self.assertEqual([u'r0', u'r1', u'r2'], sorted([v[P] for v in rqs]))
+        self.assertEqual([u'r0', u'r1', u'r2', u'r3'], 
+            sorted([v[P] for v in wholes(u'tmp:partOf*')]))
+        self.assertEqual([u'r1', u'r2'], sorted([v[P] for v in wholes(u'tmp:partOf+{2}')]))
+        self.assertEqual(2, wholes(u'tmp:partOf*{1}').count())
+        # Cycles end the recursion:
+        create(Statement, rr[0], part_of, rr[3])
+        self.assertEqual(4, wholes(u'tmp:partOf+').count())
+        self.assertRaises(NotTransitive, wholes(u'tmp:P+').count)
+
+    def test_explain(self):
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        C = create(Concept, TMP, 'C')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=C, range=C, cardinality=one_one)
+        rqs = SPARQLQuerySet().rdql(
+            u'select c.tmp:P from tmp:C c using tmp for "http://tmp/tmp#"')[:5]
+        explanation = rqs.explain()
+        self.assertEqual(explanation.select, rqs._get_sql_clause())
+        self.assertEqual(['lex', 'parse', 'bind', 'span', 'generalize', 'optimize', 'generate'], 
+            [stage for stage, _ in explanation.timings])
+        self.assertTrue(u'c__tmp__P__s' in unicode(explanation))
+        self.assertTrue(u'%s' % P.code in unicode(explanation))
+    
     def test_offsets_and_limits(self):
         XS = get(Namespace, 'xs')
         TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
@@ -548,6 +1261,158 @@ class TestRDFManager(TestCase):
         r0_ = values[0]
         self.assertEqual(r0_[P], r1.name)
 
+    def test_result_cache(self):
+        from django.conf import settings
+        settings.RDF_QUERY_CACHE_TIMEOUT = 60
+        try:
+            XS = get(Namespace, 'xs')
+            TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+            T = create(Concept, TMP, 'T')
+            one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+            P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+            create(Statement, create(Resource, TMP, 'r0', T), P, 'zero')
+            values = Concept.objects.values_for_predicates(P, domain=T)
+            self.assertEqual([u'zero'], [v[P] for v in values._clone()])
+            self.assertEqual(1, values._clone().count())
+            with self.assertMaxQueries(0):
+                self.assertEqual([u'zero'], [v[P] for v in values._clone()])
+                self.assertEqual(1, values._clone().count())
+            # Saving a statement invalidates the cached results:
+            create(Statement, create(Resource, TMP, 'r1', T), P, 'one')
+            self.assertEqual(2, values._clone().count())
+            settings.RDF_QUERY_CACHE_MAX_ROWS = 1
+            self.assertEqual(2, len(list(values._clone())))
+            # Results over the row limit are streamed every time, not cached:
+            with self.assertMaxQueries(1) as counter:
+                self.assertEqual(2, len(list(values._clone())))
+            self.assertEqual(1, counter.count)
+        finally:
+            settings.RDF_QUERY_CACHE_TIMEOUT = 0
+            settings.RDF_QUERY_CACHE_MAX_ROWS = 1000
+
+    def test_result_cache_versions(self):
+        from rdf.query import cache
+        cache.bump('tmp_table') # Initializes the version if necessary
+        version = cache.versions(['tmp_table'])[0]
+        key = cache.rows_key('select 1', ['tmp_table'])
+        cache.bump('tmp_table')
+        self.assertTrue(version < cache.versions(['tmp_table'])[0])
+        self.assertNotEqual(key, cache.rows_key('select 1', ['tmp_table']))
+
+
+    def test_row_budget(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+        for i in range(0, 3):
+            create(Statement, create(Resource, TMP, 'r%s' % i, T), P, unicode(i))
+        values = Concept.objects.values_for_predicates(P, domain=T)
+        with budget(max_rows=2):
+            self.assertRaises(RowLimitExceeded, list, values._clone())
+            self.assertEqual(3, values._clone().count())
+            self.assertEqual(2, len(list(values._clone()[:2])))
+        with budget(timeout=60000, max_rows=3):
+            self.assertEqual(3, len(list(values._clone())))
+
+    def test_grouped(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        many_many, _ = Cardinality.objects.get_or_create(domain='*', range='*') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+        Q = create(Predicate, TMP, 'Q', domain=T, range=XS['string'], cardinality=many_many)
+        r0, r1 = create(Resource, TMP, 'r0', T), create(Resource, TMP, 'r1', T)
+        create(Statement, r0, P, 'zero')
+        create(Statement, r1, P, 'one')
+        for r, v in ((r0, 'a'), (r0, 'b'), (r1, 'c')):
+            create(Statement, r, Q, v)
+        self.assertEqual(3, Concept.objects.values_for_predicates(P, Q, domain=T).count())
+        values = Concept.objects.values_for_predicates(P, Q, domain=T, grouped=True)
+        self.assertEqual(2, values._clone().count())
+        self.assertEqual(
+            [(r0.id, u'zero', [u'a', u'b']), (r1.id, u'one', [u'c'])],
+            [(v.key, v[P], sorted(v[Q])) for v in values._clone()])
+        # Grouped query sets are sliced by subject:
+        self.assertEqual([r1.id], [v.key for v in values._clone()[1:2]])
+        self.assertEqual(1, values._clone()[1:2].count())
+        # ... in the database, so only the rows of the subjects on the page are fetched:
+        self.assertTrue(u'rdql_page' in values._clone()[1:2]._get_sql_clause())
+        with budget(max_rows=2):
+            self.assertEqual([(r0.id, [u'a', u'b'])], 
+                [(v.key, sorted(v[Q])) for v in values._clone()[:1]])
+
+    def test_optional(self):
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        T = create(Concept, TMP, 'T')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        one_none = Cardinality.objects.get(domain='1', range='?') # IGNORE:E1101
+        P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+        Q = create(Predicate, TMP, 'Q', domain=T, range=XS['string'], cardinality=one_none)
+        r0, r1 = create(Resource, TMP, 'r0', T), create(Resource, TMP, 'r1', T)
+        create(Statement, r0, P, 'zero')
+        create(Statement, r1, P, 'one')
+        create(Statement, r0, Q, 'optional')
+        self.assertEqual(1, Concept.objects.values_for_predicates(P, Q, domain=T).count())
+        values = Concept.objects.values_for_predicates(P, domain=T, optional=[Q])
+        self.assertTrue(u'left outer join' in values.compiled().select)
+        self.assertEqual(2, values._clone().count())
+        self.assertEqual([(u'one', None), (u'zero', u'optional')],
+            sorted([(v[P], v[Q]) for v in values._clone()]))
+        # Optional literals are selected by default, in a single query:
+        values = Concept.objects.values_for_concept(T)
+        values.compiled()
+        with self.assertMaxQueries(1):
+            values = list(values)
+        self.assertEqual([(u'one', None), (u'zero', u'optional')],
+            sorted([(v[P], v[Q]) for v in values]))
+
+
+class TestConditional(TestCase):
+
+    def test_etag(self):
+        from django.conf import settings
+        from django.http import HttpRequest, HttpResponse
+        from rdf.conditional import conditional, last_modified
+        settings.RDF_CONDITIONAL_GET = True
+        try:
+            XS = get(Namespace, 'xs')
+            TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+            T = create(Concept, TMP, 'T')
+            one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+            P = create(Predicate, TMP, 'P', domain=T, range=XS['string'], cardinality=one_one)
+            create(Statement, create(Resource, TMP, 'r0', T), P, 'zero')
+            qs = Concept.objects.values_for_predicates(P, domain=T)
+            rendered = []
+            def render():
+                rendered.append(True)
+                return HttpResponse('rendered')
+            request = HttpRequest()
+            response = conditional(request, qs._clone(), render)
+            self.assertEqual(200, response.status_code)
+            self.failUnless(response.has_header('Last-Modified'))
+            etag = response['ETag']
+            # A matching If-None-Match header gets a 304, without rendering:
+            request.META['HTTP_IF_NONE_MATCH'] = etag
+            response = conditional(request, qs._clone(), render)
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(1, len(rendered))
+            # A new statement changes the entity tag:
+            statement = create(Statement, create(Resource, TMP, 'r1', T), P, 'one')
+            response = conditional(request, qs._clone(), render)
+            self.assertEqual(200, response.status_code)
+            self.assertNotEqual(etag, response['ETag'])
+            self.assertEqual(2, len(rendered))
+            # Deleting the newest statement doesn't move Last-Modified back:
+            modified = last_modified(qs._clone())
+            statement.delete()
+            self.assertTrue(modified <= last_modified(qs._clone()))
+        finally:
+            settings.RDF_CONDITIONAL_GET = False
+
         
 class TestPermissions(TestCase):
     
@@ -566,6 +1431,40 @@ class TestPermissions(TestCase):
                 permission = Permission.objects.get(content_type=ct, codename=_permission_code(instance, code)) # IGNORE:E1101
                 self.assertEqual(_permission_name(instance, name), permission.name)
 
+    def test_deferred(self):
+        from rdf.permissions import _permission_code, deferred_permissions
+        ct = ContentType.objects.get(app_label='rdf', model='namespace')
+        exists = lambda N: 0 < Permission.objects.filter( # IGNORE:E1101
+            content_type=ct, codename=_permission_code(N, 'r')).count()
+        with deferred_permissions():
+            TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+            TMQ = create(Namespace, 'tmq', 'http://tmq/tmq#')
+            self.assertFalse(exists(TMP))
+            self.assertFalse(exists(TMQ))
+            TMQ.save() # Saving twice queues the codes once
+        self.assertTrue(exists(TMP))
+        self.assertTrue(exists(TMQ))
+        self.assertEqual(3, Permission.objects.filter( # IGNORE:E1101
+            content_type=ct, codename__startswith='tmq:').count())
+
+    def test_bulk_queries(self):
+        from rdf.permissions import update_bulk_permissions
+        XS = get(Namespace, 'xs')
+        TMP = create(Namespace, 'tmp', 'http://tmp/tmp#')
+        one_one = Cardinality.objects.get(domain='1', range='1') # IGNORE:E1101
+        concepts = [create(Concept, TMP, 'C%s' % i) for i in range(10)]
+        predicates = [create(Predicate, TMP, 'P%s' % i, domain=C, range=XS['string'], 
+            cardinality=one_one) for i, C in enumerate(concepts)]
+        Permission.objects.filter(codename__startswith='tmp:').delete() # IGNORE:E1101
+        changes = {Namespace: set([TMP.pk]), Concept: set([C.pk for C in concepts]), 
+            Predicate: set([P.pk for P in predicates])}
+        # The namespaces, then per model its instances, content type, existing 
+        # permission codes and the insert, whatever the number of instances:
+        with self.assertMaxQueries(13):
+            update_bulk_permissions(changes)
+        self.assertEqual(63, Permission.objects.filter( # IGNORE:E1101
+            codename__startswith='tmp:').count())
+
 
 class TestViews(TestCase):
     
@@ -576,6 +1475,14 @@ class TestViews(TestCase):
         self.user.save()
         self.client = Client()
         self.client.login(username='test', password='test')
+
+    def test_sparql_errors(self):
+        from django.http import HttpRequest
+        from rdf.views import sparql
+        for rdql in [u'select from', u'select c.tmp:P from tmp:C c using tmp for "http://tmp/tmp#"']:
+            request = HttpRequest()
+            request.user, request.POST['sparql'] = self.user, rdql
+            self.assertEqual(400, sparql(request).status_code)
     
         
          
@@ -1,9 +1,17 @@
+from __future__ import with_statement
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 
+from rdf import instrumentation
+from rdf.conditional import conditional
+from rdf.describe import describe as describe_resources, locate
 from rdf.models import Concept, Namespace, Ontology
+from rdf.query.budget import BudgetExceeded, budget
 from rdf.query.query import SPARQLQuerySet
+from rdf.query.resolve import ResolverError
 from rdf.shortcuts import render_as_rdf, render_to_response
 
 
@@ -11,20 +19,43 @@ from rdf.shortcuts import render_as_rdf, render_to_response
 def sparql(request):
     """
     Returns the results of the SPARQL query in the `sparql` POST parameter, formatted 
-    as RDF/XML.
+    as RDF/XML. Supports conditional GET, see rdf.conditional.
+    
+    The query runs within the budget set by settings.RDF_SPARQL_TIMEOUT (in 
+    milliseconds) and settings.RDF_SPARQL_MAX_ROWS, falling back on the defaults 
+    in rdf.query.budget. Queries that exceed the budget get a 503 response, and 
+    queries that can't be parsed or resolved, including queries whose variables 
+    aren't joined, get a 400 response.
     """
     offset = int(request['offset']) if request.has_key('offset') else 0
     limit = int(request['limit']) if request.has_key('limit') else 100
     sparql = request['sparql']
-    qs = SPARQLQuerySet().sparql(sparql)
-    return render_as_rdf(
-        resources=qs[offset:limit], count=qs.count(), limit=limit, offset=offset)
+    try:
+        qs = SPARQLQuerySet().rdql(sparql)
+        with budget(
+            timeout=getattr(settings, 'RDF_SPARQL_TIMEOUT', 
+                getattr(settings, 'RDF_QUERY_TIMEOUT', None)), 
+            max_rows=getattr(settings, 'RDF_SPARQL_MAX_ROWS', 
+                getattr(settings, 'RDF_QUERY_MAX_ROWS', None))):
+            return conditional(request, qs[offset:limit], 
+                lambda: _render(qs, offset, limit))
+    except (SyntaxError, ResolverError), x:
+        return _error(400, x)
+    except BudgetExceeded, x:
+        return _error(503, x)
+
+
+def _error(status, exception):
+    response = HttpResponse(unicode(exception), mimetype='text/plain')
+    response.status_code = status
+    return response
     
 
 @login_required
 def resources(request, ontology_code, concept_name):
     """
-    Returns resources for the given concept in RDF/XML format.
+    Returns resources for the given concept in RDF/XML format, one element per 
+    resource. Supports conditional GET, see rdf.conditional.
     """
     offset = int(request['offset']) if request.has_key('offset') else 0
     limit = int(request['limit']) if request.has_key('limit') else 100
@@ -32,9 +63,30 @@ def resources(request, ontology_code, concept_name):
         Concept, 
         resource__name=concept_name, 
         resource__namespace__code=ontology_code)
-    qs = Concept.objects.values_for_concept(concept=c)
-    return render_as_rdf(
-        resources=qs[offset:limit], offset=offset, limit=limit, count=qs.count())
+    qs = Concept.objects.values_for_concept(concept=c, grouped=True)
+    return conditional(request, qs[offset:limit], lambda: _render(qs, offset, limit))
+
+
+@login_required
+def describe(request):
+    """
+    Returns every triple about the resources identified by the `uri` parameters, 
+    formatted as RDF/XML. The number of queries doesn't depend on the number of 
+    predicates involved, and the descriptions are cached per resource, see 
+    rdf.describe. URIs that don't identify a resource are skipped, and a 404 
+    response is returned if none does. 
+    """
+    resources = locate(request.GET.getlist('uri'))
+    if not resources:
+        raise Http404
+    return render_to_response('describe.rdfxml', 
+        dict(descriptions=describe_resources(resources)), mimetype='application/rdf+xml')
+
+
+def _render(qs, offset, limit):
+    with instrumentation.stage('render', qs.compiled().fingerprint, rdql=qs._rdql):
+        return render_as_rdf(
+            resources=qs[offset:limit], count=qs.count(), limit=limit, offset=offset)
 
 # Copyright (c) 2008, Stefan B Sigurdsson
 # All rights reserved.